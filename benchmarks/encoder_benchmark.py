@@ -0,0 +1,123 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from scraper import image_editor
+from scraper.image_editor import IMAGE_ENCODERS, ImageEncoder
+
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+samples_path = os.path.join(app_dir, "image_sample")
+font_path = os.path.join(app_dir, "fonts", "SourceSerifPro-SemiBold.ttf")
+
+# Lossless reference of the rendered story
+REFERENCE_ENCODER = ImageEncoder("PNG", ".png")
+INSERT_TEXT = "AESOP\nResurrection Hand Balm\n$ 59.00\n$ 49.00"
+STRIKETHROUGH_LINE_INDEX = 2
+STRIKETHROUGH_TEXT = "$ 59.00"
+
+
+def render_story(sample_path: str, output_dir: str) -> Image.Image:
+    # Renders the sample as a story, like a downloaded product image
+    name = os.path.splitext(os.path.basename(sample_path))[0]
+    input_file_path = os.path.join(output_dir, f"{name}.png")
+    with Image.open(sample_path) as image:
+        image.convert("RGB").save(input_file_path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        story_path = image_editor.ig_story_image_processing(
+            input_file_path,
+            (255, 255, 255),
+            font_path,
+            INSERT_TEXT,
+            STRIKETHROUGH_LINE_INDEX,
+            STRIKETHROUGH_TEXT,
+            encoder=REFERENCE_ENCODER,
+        )
+    with Image.open(story_path) as image:
+        return image.convert("RGB")
+
+
+def psnr(reference: Image.Image, data: bytes) -> float:
+    with Image.open(io.BytesIO(data)) as image:
+        decoded = np.asarray(image.convert("RGB"), dtype=np.float64)
+    error = np.mean((np.asarray(reference, dtype=np.float64) - decoded) ** 2)
+    return float("inf") if error == 0 else 10 * np.log10(255**2 / error)
+
+
+def measure(image: Image.Image, encoder: ImageEncoder, min_time_sec: float):
+    def run() -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, encoder.image_format, **encoder.options)
+        return buffer.getvalue()
+
+    data = run()  # warm up
+    calls = 0
+    start_time = time.perf_counter()
+    while True:
+        run()
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time_sec:
+            break
+
+    return {
+        "encode_ms": round(elapsed / calls * 1000, 1),
+        "size_kib": round(len(data) / 1024, 1),
+        "psnr_db": round(psnr(image, data), 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the output formats of the story images"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="Minimum measuring time of each encoder in seconds",
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        help="Override the quality of every format, 0-100",
+    )
+    args = parser.parse_args()
+
+    encoders = {}
+    for name, encoder in IMAGE_ENCODERS.items():
+        if not encoder.is_available:
+            print(f"{name}: not supported by this Pillow build")
+            continue
+        if args.quality is not None:
+            encoder = encoder.with_quality(args.quality)
+        encoders[name] = encoder
+
+    with tempfile.TemporaryDirectory(prefix="bench_encoder_") as output_dir:
+        for sample in sorted(os.listdir(samples_path)):
+            story = render_story(os.path.join(samples_path, sample), output_dir)
+            print(f"\n{sample} ({story.width}x{story.height})")
+
+            baseline_size = None
+            for name, encoder in encoders.items():
+                result = measure(story, encoder, args.min_time)
+                if baseline_size is None:
+                    baseline_size = result["size_kib"]
+                print(
+                    f"  {name:<16} {result['encode_ms']:>8,.1f} ms "
+                    f"{result['size_kib']:>9,.1f} KiB "
+                    f"({result['size_kib'] / baseline_size - 1:+.0%})  "
+                    f"PSNR {result['psnr_db']:>5.1f} dB"
+                )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from scraper import catalog
+from scraper import common
+from scraper import image_editor
+from scraper.store import cettire_store
+from scraper.store import supply_store
+from scraper.store import upthere_store
+from scraper.store.store_info import OutputInfo
+from tests.helpers import load_page
+
+benchmarks_path = os.path.dirname(os.path.abspath(__file__))
+default_baseline_path = os.path.join(benchmarks_path, "parser_baseline.json")
+
+AUD_EXCHANGE_RATE = 20.61
+
+
+@contextlib.contextmanager
+def offline_image_pipeline():
+    # Product images are neither downloaded nor rendered
+    with (
+        mock.patch.object(common, "download_image_from_url"),
+        mock.patch.object(image_editor, "ig_story_image_processing"),
+        contextlib.redirect_stdout(io.StringIO()),
+    ):
+        yield
+
+
+def product_info_processor_benchmark(
+    store_module,
+    store_name: str,
+    page_name: str,
+    exchange_rate: float,
+    output_dir: str,
+):
+    page_source = load_page(store_name, page_name)
+    output_dir = os.path.join(output_dir, store_name)
+    os.makedirs(output_dir, exist_ok=True)
+    list_path = os.path.join(output_dir, "list.txt")
+
+    def run() -> int:
+        # Every run starts from an empty output, as a new section does
+        if os.path.exists(list_path):
+            os.remove(list_path)
+        output_info = OutputInfo(
+            store_name=store_name,
+            group="sale",
+            output_dir=output_dir,
+            font_path="",
+            catalog_path=os.path.join(output_dir, "catalog.csv"),
+        )
+        catalog.reset_catalog(output_info.catalog_path)
+        store_module.product_info_processor(
+            page_source, output_info, exchange_rate
+        )
+        # Products parsed from the page, accepted or not
+        return len(catalog.load_catalog([output_info.catalog_path]))
+
+    return run, "rows"
+
+
+def pagination_benchmark(parse_function, store_name: str, page_name: str):
+    page_source = load_page(store_name, page_name)
+
+    def run() -> int:
+        parse_function(page_source)
+        return 1
+
+    return run, "pages"
+
+
+def get_benchmarks(output_dir: str) -> dict:
+    return {
+        "upthere.product_info_processor[listing]": (
+            product_info_processor_benchmark(
+                upthere_store,
+                "upthere",
+                "listing.html",
+                AUD_EXCHANGE_RATE,
+                output_dir,
+            )
+        ),
+        "supply.product_info_processor[listing]": (
+            product_info_processor_benchmark(
+                supply_store,
+                "supply",
+                "listing.html",
+                AUD_EXCHANGE_RATE,
+                output_dir,
+            )
+        ),
+        "cettire.product_info_processor[listing]": (
+            product_info_processor_benchmark(
+                cettire_store, "cettire", "listing.html", 1, output_dir
+            )
+        ),
+        "upthere.parse_total_pages[listing]": pagination_benchmark(
+            upthere_store.parse_total_pages, "upthere", "listing.html"
+        ),
+        "supply.parse_max_page[listing]": pagination_benchmark(
+            supply_store.parse_max_page, "supply", "listing.html"
+        ),
+        "cettire.is_next_button_active[last_page]": pagination_benchmark(
+            cettire_store.is_next_button_active, "cettire", "last_page.html"
+        ),
+    }
+
+
+def measure(run, min_time_sec: float) -> dict:
+    items = run()  # warm up
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = 0
+    start_time = time.perf_counter()
+    while True:
+        run()
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time_sec:
+            break
+
+    return {
+        "rate": round(items * calls / elapsed, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare_with_baseline(
+    name: str,
+    result: dict,
+    baseline: dict,
+    rate_tolerance: float,
+    memory_tolerance: float,
+) -> list[str]:
+    if name not in baseline:
+        return []
+
+    regressions = []
+    expected = baseline[name]
+    if result["rate"] < expected["rate"] * (1 - rate_tolerance):
+        regressions.append(
+            f"{name}: rate {result['rate']:,} < baseline {expected['rate']:,}"
+        )
+    if result["peak_kib"] > expected["peak_kib"] * (1 + memory_tolerance):
+        regressions.append(
+            f"{name}: peak {result['peak_kib']:,} KiB "
+            f"> baseline {expected['peak_kib']:,} KiB"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the store page parsers"
+    )
+    parser.add_argument(
+        "-b", "--baseline", default=default_baseline_path, help="Baseline file"
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results as the new baseline",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="Minimum measuring time of each benchmark in seconds",
+    )
+    parser.add_argument(
+        "--rate-tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed throughput drop compared to the baseline",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.10,
+        help="Allowed peak memory growth compared to the baseline",
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory(prefix="bench_parser_") as output_dir:
+        for name, (run, unit) in get_benchmarks(output_dir).items():
+            with offline_image_pipeline():
+                result = measure(run, args.min_time)
+            results[name] = result
+
+            expected = baseline.get(name)
+            change = ""
+            if expected:
+                change = f"({result['rate'] / expected['rate'] - 1:+.1%})"
+            print(
+                f"{name:<42} {result['rate']:>10,.1f} {unit}/s {change:>9}  "
+                f"peak {result['peak_kib']:>8,.1f} KiB"
+            )
+            regressions += compare_with_baseline(
+                name,
+                result,
+                baseline,
+                args.rate_tolerance,
+                args.memory_tolerance,
+            )
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if regressions:
+        print("\nPerformance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
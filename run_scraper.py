@@ -1,8 +1,11 @@
 import argparse
 import atexit
+import functools
 import os
 import platform
+import shutil
 import sys
+import tempfile
 import time
 from enum import Enum
 from multiprocessing import Pool
@@ -10,9 +13,21 @@ from multiprocessing import Pool
 import psutil
 
 from scraper import common
+from scraper import daemon
+from scraper import image_editor
+from scraper import job_queue
+from scraper import journal
+from scraper import memory
+from scraper import metrics
+from scraper import perf
+from scraper import price_history
+from scraper import rate_limiter
+from scraper import revisit
+from scraper.cassette import RECORD, REPLAY, Cassette
 from scraper.chrome_driver import ChromeDriver
 from scraper.store import cettire_store
 from scraper.store import chemist_warehouse
+from scraper.store import sorted_listing
 from scraper.store import supply_store
 from scraper.store import upthere_store
 from scraper.store.store_info import StoreWebScraper
@@ -29,15 +44,7 @@ def handle_key_interrupt():
     print("Received KeyboardInterrupt, stop processing")
 
 
-def scrape_upthere_store(
-    enable_multiprocessing: bool,
-    chrome_driver: ChromeDriver,
-    root_dir: str,
-    font_path: str,
-) -> None:
-    upthere_scraper = StoreWebScraper(
-        upthere_store.web_scraper, chrome_driver, root_dir, font_path
-    )
+def get_upthere_urls() -> list[str]:
     brands_url = []
     brands = [
         "Needles",
@@ -73,6 +80,25 @@ def scrape_upthere_store(
     for brand in brands:
         brands_url.append(upthere_store.gen_store_sale_url(brand))
 
+    return brands_url
+
+
+def scrape_upthere_store(
+    enable_multiprocessing: bool,
+    chrome_driver: ChromeDriver,
+    root_dir: str,
+    font_path: str,
+    urls: list[str] = None,
+) -> None:
+    upthere_scraper = StoreWebScraper(
+        upthere_store.web_scraper,
+        chrome_driver,
+        root_dir,
+        font_path,
+        store_name=StoreCatalog.UPTHERE.value,
+    )
+    brands_url = get_upthere_urls() if urls is None else urls
+
     try:
         if enable_multiprocessing:
             with Pool(processes=2) as pool:
@@ -90,25 +116,39 @@ def scrape_upthere_store(
         raise
 
 
+def get_supply_urls() -> list[str]:
+    sections = [
+        "tops",
+        "bottoms",
+        "t-shirts",
+        "sweats",
+        "sale-jackets",
+        "sale-shirts",
+        "accessories",
+        "footwear",
+    ]
+    brands_url = [
+        supply_store.gen_store_sale_url(section) for section in sections
+    ]
+
+    return brands_url
+
+
 def scrape_supply_store(
     enable_multiprocessing: bool,
     chrome_driver: ChromeDriver,
     root_dir: str,
     font_path: str,
+    urls: list[str] = None,
 ) -> None:
     supply_scraper = StoreWebScraper(
-        supply_store.web_scraper, chrome_driver, root_dir, font_path
+        supply_store.web_scraper,
+        chrome_driver,
+        root_dir,
+        font_path,
+        store_name=StoreCatalog.SUPPLY.value,
     )
-    brands_url = [
-        "https://www.supplystore.com.au/sale/tops",
-        "https://www.supplystore.com.au/sale/bottoms",
-        "https://www.supplystore.com.au/sale/t-shirts",
-        "https://www.supplystore.com.au/sale/sweats",
-        "https://www.supplystore.com.au/sale/sale-jackets",
-        "https://www.supplystore.com.au/sale/sale-shirts",
-        "https://www.supplystore.com.au/sale/accessories",
-        "https://www.supplystore.com.au/sale/footwear",
-    ]
+    brands_url = get_supply_urls() if urls is None else urls
 
     try:
         if enable_multiprocessing:
@@ -127,16 +167,7 @@ def scrape_supply_store(
         raise
 
 
-def scrape_cettire_store(
-    enable_multiprocessing: bool,
-    chrome_driver: ChromeDriver,
-    root_dir: str,
-    font_path: str,
-) -> None:
-    cettire_scraper = StoreWebScraper(
-        cettire_store.web_scraper, chrome_driver, root_dir, font_path
-    )
-
+def get_cettire_urls() -> list[str]:
     # All category of products
     brands_url = [
         cettire_store.gen_store_sale_url("Stone Island"),
@@ -180,6 +211,25 @@ def scrape_cettire_store(
             cettire_store.gen_store_sale_url(brand, category_accessories)
         )
 
+    return brands_url
+
+
+def scrape_cettire_store(
+    enable_multiprocessing: bool,
+    chrome_driver: ChromeDriver,
+    root_dir: str,
+    font_path: str,
+    urls: list[str] = None,
+) -> None:
+    cettire_scraper = StoreWebScraper(
+        cettire_store.web_scraper,
+        chrome_driver,
+        root_dir,
+        font_path,
+        store_name=StoreCatalog.CETTIRE.value,
+    )
+    brands_url = get_cettire_urls() if urls is None else urls
+
     try:
         if enable_multiprocessing:
             with Pool(processes=2) as pool:
@@ -197,6 +247,17 @@ def scrape_cettire_store(
         raise
 
 
+def get_chemist_warehouse_urls() -> list[str]:
+    brands_url = [
+        common.get_site_url(
+            "https://www.chemistwarehouse.com.au/"
+            "buy/122444/neutrogena-rapid-wrinkle-repair-retinol-pro-night-cream-48g"
+        ),
+    ]
+
+    return brands_url
+
+
 def scrape_chemist_warehouse(
     enable_multiprocessing: bool,
     chrome_driver: ChromeDriver,
@@ -208,12 +269,10 @@ def scrape_chemist_warehouse(
         chrome_driver,
         root_dir,
         font_path,
+        store_name=StoreCatalog.CHEMIST_WAREHOUSE.value,
         headless=False,
     )
-    brands_url = [
-        "https://www.chemistwarehouse.com.au/"
-        "buy/122444/neutrogena-rapid-wrinkle-repair-retinol-pro-night-cream-48g",
-    ]
+    brands_url = get_chemist_warehouse_urls()
 
     try:
         if enable_multiprocessing:
@@ -232,7 +291,115 @@ def scrape_chemist_warehouse(
         raise
 
 
-def main(sites: list[str], root_dir: str = None) -> None:
+def scrape_chemist_watch_list(
+    watch_list_path: str,
+    enable_multiprocessing: bool,
+    chrome_driver: ChromeDriver,
+    root_dir: str,
+    font_path: str,
+) -> None:
+    # Static fetches in threads, neither Chrome nor the pool is needed
+    chemist_warehouse.watch_list_scraper(watch_list_path)
+
+
+def get_store_targets(
+    chrome_driver: ChromeDriver, root_dir: str, font_path: str
+) -> dict[str, daemon.StoreTarget]:
+    # The browser is kept open between the jobs
+    targets = {}
+    for store, store_module, get_urls in [
+        (StoreCatalog.UPTHERE, upthere_store, get_upthere_urls),
+        (StoreCatalog.SUPPLY, supply_store, get_supply_urls),
+        (StoreCatalog.CETTIRE, cettire_store, get_cettire_urls),
+    ]:
+        store_scraper = StoreWebScraper(
+            store_module.web_scraper,
+            chrome_driver,
+            root_dir,
+            font_path,
+            store_name=store.value,
+            keep_driver=True,
+        )
+        # Only their sale pages are scraped, not single products
+        targets[store.value] = daemon.StoreTarget(
+            store.value,
+            common.get_site_url(store_module.STORE_URL)
+            + store_module.SALE_PATH,
+            get_urls,
+            store_scraper.execute_scraper,
+        )
+
+    # Product pages are checked without Chrome
+    targets[StoreCatalog.CHEMIST_WAREHOUSE.value] = daemon.StoreTarget(
+        StoreCatalog.CHEMIST_WAREHOUSE.value,
+        common.get_site_url(chemist_warehouse.STORE_URL),
+        get_chemist_warehouse_urls,
+        chemist_warehouse.check_product_url,
+    )
+    return targets
+
+
+def get_store_urls(site: str) -> list[str]:
+    store_urls = {
+        StoreCatalog.UPTHERE.value: get_upthere_urls,
+        StoreCatalog.SUPPLY.value: get_supply_urls,
+        StoreCatalog.CETTIRE.value: get_cettire_urls,
+        StoreCatalog.CHEMIST_WAREHOUSE.value: get_chemist_warehouse_urls,
+    }
+    return store_urls[site]()
+
+
+def plan_revisits(
+    sites: list[str], root_dir: str, budget_per_day: float
+) -> dict[str, list[str]]:
+    # Sale pages due for a visit, the chemist warehouse product is checked
+    # every run
+    store_urls = {
+        site: get_store_urls(site)
+        for site in sites
+        if site != StoreCatalog.CHEMIST_WAREHOUSE.value
+    }
+    schedule_path = revisit.get_schedule_path(root_dir)
+    # Inherited by the pool workers, which record their visits
+    os.environ[revisit.REVISIT_DB_ENV] = schedule_path
+    with revisit.RevisitScheduler(schedule_path) as scheduler:
+        due_urls = scheduler.plan(store_urls, budget_per_day)
+    for site, urls in store_urls.items():
+        print(f"Revisit {site}: {len(due_urls[site])} of {len(urls)} pages due")
+    return due_urls
+
+
+def enqueue_jobs(queue_path: str, sites: list[str]) -> None:
+    # Coordinator of the workers on all hosts, the URLs of every store are
+    # queued as jobs of their own
+    with job_queue.SQLiteJobQueue(queue_path) as queue:
+        for site in sites:
+            urls = get_store_urls(site)
+            queued = queue.enqueue(site, urls)
+            print(f"Queued {queued} of {len(urls)} {site} jobs")
+        print(f"Job queue {queue_path}: {queue.counts()}")
+
+
+def start_history_run(history_path: str) -> None:
+    # Every daemon job is a run of its own in the price history
+    with price_history.PriceHistory(history_path) as history:
+        os.environ[price_history.RUN_ID_ENV] = str(history.start_run())
+
+
+def main(
+    sites: list[str],
+    root_dir: str = None,
+    cassette: Cassette = None,
+    trace_path: str = None,
+    metrics_path: str = None,
+    memory_timeline_path: str = None,
+    rate_limit: bool = True,
+    watch_list_path: str = None,
+    daemon_address: str = None,
+    queue_path: str = None,
+    worker_id: str = None,
+    revisit_budget: float = None,
+) -> None:
     if root_dir is None:
         if getattr(sys, "frozen", False):
             root_dir = os.path.dirname(sys.executable)  # pyinstaller executable
@@ -254,25 +421,143 @@ def main(sites: list[str], root_dir: str = None) -> None:
         print(f"Font file not found: {font_path_candidates}")
         return
 
+    if queue_path:
+        # Every worker writes its output, journal and price history into a
+        # directory of its own
+        worker_id = worker_id or job_queue.get_worker_id()
+        root_dir = job_queue.get_node_dir(root_dir, worker_id)
+        print(f"Worker {worker_id}, output directory: {root_dir}")
+
+    if journal.is_resuming():
+        print(f"Resume from the journal: {journal.get_journal_dir(root_dir)}")
+    else:
+        journal.reset_journal(root_dir)
+
+    # Every product price seen in this run is appended to the history, a
+    # resumed run goes on with the run it continues
+    history_path = price_history.get_history_path(root_dir)
+    with price_history.PriceHistory(history_path) as history:
+        run_id = history.get_last_run_id() if journal.is_resuming() else None
+        if run_id is None:
+            run_id = history.start_run()
+    os.environ[price_history.RUN_ID_ENV] = str(run_id)
+
     atexit.register(ChromeDriver.terminate_chromedriver_orphans)
     enable_multiprocessing = True
 
+    if cassette is not None:
+        cassette.start()
+        print(f"Cassette {cassette.mode}: {cassette.path}")
+
+    # Stage timings of all pool workers are collected in here
+    perf_dir = tempfile.mkdtemp(prefix="scraper_perf_")
+    os.environ[perf.PERF_DIR_ENV] = perf_dir
+
+    # Shared by the pool workers to pace the requests to every host
+    if rate_limit:
+        rate_limit_db = os.path.join(perf_dir, "rate_limiter.sqlite")
+        os.environ[rate_limiter.RATE_LIMIT_DB_ENV] = rate_limit_db
+
+    perf.start_tracemalloc()
+    memory_sampler = memory.MemorySampler(timeline_path=memory_timeline_path)
+    memory_sampler.start()
+
+    metrics_exporter = None
+    if metrics_path:
+        metrics_dir = os.path.join(perf_dir, "metrics")
+        os.environ[metrics.METRICS_DIR_ENV] = metrics_dir
+        metrics_exporter = metrics.MetricsExporter(metrics_dir, metrics_path)
+        metrics_exporter.start()
+        print(f"Metrics textfile: {metrics_path}")
+
     function_map = {
         StoreCatalog.UPTHERE.value: scrape_upthere_store,
         StoreCatalog.SUPPLY.value: scrape_supply_store,
         StoreCatalog.CETTIRE.value: scrape_cettire_store,
         StoreCatalog.CHEMIST_WAREHOUSE.value: scrape_chemist_warehouse,
     }
+    if watch_list_path:
+        function_map[StoreCatalog.CHEMIST_WAREHOUSE.value] = functools.partial(
+            scrape_chemist_watch_list, watch_list_path
+        )
+    if revisit_budget:
+        due_urls = plan_revisits(sites, root_dir, revisit_budget)
+        for site, urls in due_urls.items():
+            function_map[site] = functools.partial(
+                function_map[site], urls=urls
+            )
 
-    with ChromeDriver(
-        cache_dir=os.path.join(root_dir, "chrome_cache")
-    ) as chrome_driver:
-        for site in sites:
-            if site in function_map:
-                scrape_function = function_map[site]
-                scrape_function(
-                    enable_multiprocessing, chrome_driver, root_dir, font_path
+    try:
+        with ChromeDriver(
+            cache_dir=os.path.join(root_dir, "chrome_cache"),
+            cassette=cassette,
+        ) as chrome_driver:
+            if daemon_address:
+                scraper_daemon = daemon.ScraperDaemon(
+                    get_store_targets(chrome_driver, root_dir, font_path),
+                    before_job=lambda job: start_history_run(history_path),
                 )
+                try:
+                    daemon.serve(
+                        scraper_daemon, *daemon.parse_address(daemon_address)
+                    )
+                finally:
+                    chrome_driver.quit()
+            elif queue_path:
+                try:
+                    with job_queue.SQLiteJobQueue(queue_path) as queue:
+                        job_queue.run_worker(
+                            queue,
+                            get_store_targets(
+                                chrome_driver, root_dir, font_path
+                            ),
+                            worker_id,
+                            output_dir=root_dir,
+                        )
+                finally:
+                    chrome_driver.quit()
+            else:
+                for site in sites:
+                    if site in function_map:
+                        scrape_function = function_map[site]
+                        scrape_function(
+                            enable_multiprocessing,
+                            chrome_driver,
+                            root_dir,
+                            font_path,
+                        )
+    finally:
+        if cassette is not None:
+            cassette.finalize()
+
+        if metrics_exporter is not None:
+            metrics_exporter.stop()
+
+        memory_sampler.stop()
+        print()
+        memory_sampler.display_report()
+
+        with price_history.PriceHistory(history_path) as history:
+            drops = history.get_price_drops(run_id)
+        print(f"Price drops since the previous run: {len(drops)}")
+        for drop in drops[:10]:
+            print(
+                f"  {drop.previous_price:>7,} -> {drop.sale_price:>7,} "
+                f"(-{drop.drop_percentage:.1f}%)  {drop.product_url}"
+            )
+
+        limiter = rate_limiter.get_rate_limiter()
+        if limiter is not None:
+            for host, rate in sorted(limiter.rates().items()):
+                print(f"Request rate of {host}: {rate:.2f}/s")
+
+        perf.flush()
+        records = perf.load_records(perf_dir)
+        print("\nStage timings:")
+        perf.display_report(perf.summarize(records))
+        if trace_path:
+            perf.write_chrome_trace(records, trace_path)
+        shutil.rmtree(perf_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -302,6 +587,143 @@ if __name__ == "__main__":
         default=[store.value for store in StoreCatalog],
     )  # Default to all sites
 
+    # Add options for recording and replaying HTTP responses and page sources
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Record all HTTP responses and page sources into a zip archive",
+    )
+    cassette_group.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Replay a recorded archive, without network and Chrome",
+    )
+
+    # Add option for continuing an interrupted run
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the previous run from its journal, "
+        "skipping the finished sections, pages and products",
+    )
+
+    # Add option for serving scrape jobs
+    parser.add_argument(
+        "--daemon",
+        metavar="[HOST:]PORT",
+        help="Keep running and scrape the jobs submitted to a local HTTP API, "
+        "e.g., --daemon 8765",
+    )
+
+    # Add option for leaving the price sorted listings early
+    parser.add_argument(
+        "--sorted-pagination",
+        action="store_true",
+        help="Walk the listings of the stores supporting it sorted by price, "
+        "and stop once no product can meet the minimum profit",
+    )
+
+    # Add options for the format of the story images
+    parser.add_argument(
+        "--image-format",
+        choices=[
+            name
+            for name, encoder in image_editor.IMAGE_ENCODERS.items()
+            if encoder.is_available
+        ],
+        help="Save the story images as tuned JPEG, WebP or AVIF instead of "
+        "JPEG with the Pillow defaults, compare them with "
+        "python -m benchmarks.encoder_benchmark",
+    )
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        metavar="QUALITY",
+        help="Override the quality of the image format, 0-100",
+    )
+
+    # Add option for skipping the sale pages which rarely change
+    parser.add_argument(
+        "--revisit",
+        metavar="PAGES_PER_DAY",
+        type=float,
+        help="Only scrape the sale pages due for a visit, with intervals "
+        "learned from how often every page changed, within a budget of "
+        "page visits per day, e.g., --revisit 200",
+    )
+
+    # Add options for distributing the jobs over several hosts
+    queue_group = parser.add_mutually_exclusive_group()
+    queue_group.add_argument(
+        "--enqueue",
+        metavar="QUEUE",
+        help="Queue the URLs of the selected sites as jobs in a shared job "
+        "queue and exit, e.g., --enqueue /mnt/shared/jobs.sqlite",
+    )
+    queue_group.add_argument(
+        "--worker",
+        metavar="QUEUE",
+        help="Scrape the jobs of a shared job queue until it is drained",
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="Name of the worker in the job queue and of its output "
+        "directory, nodes/<hostname>-<pid> by default",
+    )
+
+    # Add option for checking a list of chemist warehouse products
+    parser.add_argument(
+        "--watch-list",
+        metavar="PATH",
+        help="Check the prices of the chemist warehouse product URLs in a "
+        "file, one per line, instead of the default product",
+    )
+
+    # Add option for disabling the adaptive request pacing
+    parser.add_argument(
+        "--no-rate-limit",
+        action="store_true",
+        help="Send requests as fast as possible, without pacing every host",
+    )
+
+    # Add option for scraping a local mock storefront
+    parser.add_argument(
+        "--mock-store",
+        metavar="URL",
+        help="Scrape the scraper.mock_storefront server at URL instead, "
+        "e.g., http://127.0.0.1:8000",
+    )
+
+    # Add option for exporting metrics during the run
+    parser.add_argument(
+        "--metrics-file",
+        metavar="PATH",
+        help="Keep Prometheus metrics of the run up to date in a textfile, "
+        "e.g., /var/lib/node_exporter/textfile/scraper.prom",
+    )
+
+    # Add options for memory accounting
+    parser.add_argument(
+        "--memory-timeline",
+        metavar="PATH",
+        help="Save the memory samples of all scraper, chromedriver and "
+        "Chrome processes to a CSV file",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Trace the Python heap and report its peak per stage",
+    )
+
+    # Add option for exporting a timeline of the run
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Write a Chrome trace JSON file of all scraper processes, "
+        "open it in Perfetto or chrome://tracing",
+    )
+
     args = parser.parse_args()
 
     if args.root_dir:
@@ -311,8 +733,53 @@ if __name__ == "__main__":
 
     print(f"Selected sites for scraping: {args.sites}")
 
+    if args.mock_store:
+        # Inherited by the pool workers
+        os.environ[common.MOCK_STORE_URL_ENV] = args.mock_store
+        print(f"Mock storefront: {args.mock_store}")
+
+    if args.resume:
+        # Inherited by the pool workers
+        os.environ[journal.RESUME_ENV] = "1"
+
+    if args.sorted_pagination:
+        # Inherited by the pool workers
+        os.environ[sorted_listing.SORTED_PAGINATION_ENV] = "1"
+
+    if args.image_format:
+        # Inherited by the pool workers
+        os.environ[image_editor.IMAGE_FORMAT_ENV] = args.image_format
+    if args.image_quality is not None:
+        os.environ[image_editor.IMAGE_QUALITY_ENV] = str(args.image_quality)
+
+    if args.tracemalloc:
+        # Inherited by the pool workers
+        os.environ[perf.TRACEMALLOC_ENV] = "1"
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(RECORD, os.path.abspath(args.record))
+    elif args.replay:
+        cassette = Cassette(REPLAY, os.path.abspath(args.replay))
+
     try:
-        main(args.sites, args.root_dir)
+        if args.enqueue:
+            enqueue_jobs(args.enqueue, args.sites)
+        else:
+            main(
+                args.sites,
+                args.root_dir,
+                cassette,
+                args.trace,
+                args.metrics_file,
+                args.memory_timeline,
+                not args.no_rate_limit,
+                args.watch_list,
+                args.daemon,
+                args.worker,
+                args.worker_id,
+                args.revisit,
+            )
     except KeyboardInterrupt:
         print("Exiting main process due to KeyboardInterrupt")
     except Exception as e:
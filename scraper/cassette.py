@@ -0,0 +1,355 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+
+import attr
+import requests
+from bs4 import BeautifulSoup
+from requests.structures import CaseInsensitiveDict
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    WebDriverException,
+)
+from selenium.webdriver.common.by import By
+
+RECORD = "record"
+REPLAY = "replay"
+
+# The stored content is already decoded
+DROPPED_HEADERS = ("Content-Encoding", "Content-Length", "Transfer-Encoding")
+
+
+class CassetteError(Exception):
+    pass
+
+
+def _url_key(*parts: str) -> str:
+    return hashlib.sha1(" ".join(parts).encode("utf-8")).hexdigest()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    # Several pool workers record at the same time, write atomically
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+@attr.s(
+    slots=True,
+    frozen=False,
+    repr=False,
+    eq=False,
+    hash=False,
+    getstate_setstate=False,
+)
+class Cassette:
+    """
+    Record every HTTP response and page source the scraper sees into a
+    compressed archive, and serve them back without network and Chrome.
+
+    While recording, each process writes its entries to '<path>.parts',
+    finalize() packs them into the zip archive at 'path'.
+    """
+
+    mode: str = attr.ib(validator=attr.validators.in_([RECORD, REPLAY]))
+    path: str = attr.ib()
+    _archive: zipfile.ZipFile = attr.ib(default=None, init=False)
+    _page_index: dict = attr.ib(factory=dict, init=False)
+
+    def __getstate__(self):
+        # Pool workers open the archive by themselves
+        return {"mode": self.mode, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["mode"], state["path"])
+
+    @property
+    def spool_dir(self) -> str:
+        return self.path + ".parts"
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def start(self) -> None:
+        if self.mode == RECORD:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            os.makedirs(self.spool_dir)
+        elif not os.path.isfile(self.path):
+            raise CassetteError(f"Cassette not found: {self.path}")
+
+    def finalize(self) -> None:
+        if self.mode != RECORD or not os.path.isdir(self.spool_dir):
+            return
+
+        temp_path = self.path + ".tmp"
+        with zipfile.ZipFile(
+            temp_path, "w", compression=zipfile.ZIP_DEFLATED
+        ) as archive:
+            for folder_path, _, file_names in os.walk(self.spool_dir):
+                for file_name in file_names:
+                    file_path = os.path.join(folder_path, file_name)
+                    name = os.path.relpath(file_path, self.spool_dir)
+                    archive.write(file_path, name.replace(os.sep, "/"))
+        os.replace(temp_path, self.path)
+        shutil.rmtree(self.spool_dir)
+        print(f"Cassette saved: {self.path}")
+
+    def _read(self, name: str) -> bytes | None:
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.path)
+        try:
+            return self._archive.read(name)
+        except KeyError:
+            return None
+
+    def _list(self, prefix: str) -> list[str]:
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.path)
+        return sorted(
+            name for name in self._archive.namelist() if name.startswith(prefix)
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if self.mode == REPLAY:
+            return self.replay_response(method, url)
+
+        response = requests.request(method, url, **kwargs)
+        self.record_response(method, url, response)
+        return response
+
+    def record_response(
+        self, method: str, url: str, response: requests.Response
+    ) -> None:
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name not in DROPPED_HEADERS
+        }
+        meta = {
+            "method": method,
+            "url": url,
+            "status_code": response.status_code,
+            "reason": response.reason,
+            "encoding": response.encoding,
+            "headers": headers,
+        }
+        name = os.path.join(self.spool_dir, "http", _url_key(method, url))
+        _write_file(name + ".body", response.content)
+        _write_file(name + ".json", json.dumps(meta).encode("utf-8"))
+
+    def replay_response(self, method: str, url: str) -> requests.Response:
+        name = "http/" + _url_key(method, url)
+        meta = self._read(name + ".json")
+        if meta is None:
+            raise requests.exceptions.ConnectionError(
+                f"Not recorded in cassette: {method} {url}"
+            )
+        meta = json.loads(meta)
+
+        response = requests.Response()
+        response.status_code = meta["status_code"]
+        response.reason = meta["reason"]
+        response.encoding = meta["encoding"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.url = url
+        response.request = requests.Request(method, url).prepare()
+        response._content = self._read(name + ".body")
+        response._content_consumed = True
+        return response
+
+    def record_page_source(self, url: str, page_source: str) -> None:
+        key = _url_key(url)
+        snapshot = f"{time.time_ns()}-{os.getpid()}.html"
+        _write_file(
+            os.path.join(self.spool_dir, "pages", key + ".json"),
+            json.dumps({"url": url}).encode("utf-8"),
+        )
+        _write_file(
+            os.path.join(self.spool_dir, "pages", key, snapshot),
+            page_source.encode("utf-8"),
+        )
+
+    def replay_page_sources(self, url: str) -> list[str]:
+        key = _url_key(url)
+        if key not in self._page_index:
+            self._page_index[key] = self._list(f"pages/{key}/")
+
+        return [
+            self._read(name).decode("utf-8") for name in self._page_index[key]
+        ]
+
+
+_active_cassette: Cassette | None = None
+
+
+def activate(cassette: Cassette | None) -> None:
+    global _active_cassette
+    _active_cassette = cassette
+
+
+def get_active_cassette() -> Cassette | None:
+    return _active_cassette
+
+
+class RecordingDriver:
+    # Proxy of a Chrome WebDriver recording every page source read per URL
+
+    def __init__(self, driver, cassette: Cassette):
+        self._driver = driver
+        self._cassette = cassette
+        self._url = None
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def get(self, url: str) -> None:
+        self._url = url
+        self._driver.get(url)
+
+    @property
+    def page_source(self) -> str:
+        page_source = self._driver.page_source
+        if self._url is not None:
+            self._cassette.record_page_source(self._url, page_source)
+        return page_source
+
+
+def _to_css_selector(by: str, value: str) -> str:
+    if by == By.CSS_SELECTOR or by == By.TAG_NAME:
+        return value
+    if by == By.CLASS_NAME:
+        return "." + value
+    if by == By.ID:
+        return "#" + value
+    if by == By.NAME:
+        return f'[name="{value}"]'
+    raise WebDriverException(f"Locator is not supported in replay: {by}")
+
+
+class ReplayElement:
+    # Read-only WebElement on top of a recorded page source
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    @property
+    def tag_name(self) -> str:
+        return self._tag.name
+
+    @property
+    def text(self) -> str:
+        return self._tag.get_text()
+
+    def get_attribute(self, name: str) -> str | None:
+        value = self._tag.get(name)
+        if isinstance(value, list):
+            return " ".join(value)
+        return value
+
+    get_dom_attribute = get_attribute
+
+    def is_selected(self) -> bool:
+        return self._tag.has_attr("selected") or self._tag.has_attr("checked")
+
+    def is_enabled(self) -> bool:
+        return not self._tag.has_attr("disabled")
+
+    def click(self) -> None:
+        # Selecting an option is the only interaction the stores use
+        if self._tag.name == "option":
+            select = self._tag.find_parent("select")
+            if select is not None:
+                for option in select.find_all("option"):
+                    option.attrs.pop("selected", None)
+            self._tag["selected"] = "selected"
+
+    def find_element(self, by=By.ID, value=None):
+        return _find_element(self._tag, by, value)
+
+    def find_elements(self, by=By.ID, value=None):
+        return _find_elements(self._tag, by, value)
+
+
+def _find_element(tag, by, value) -> ReplayElement:
+    element = tag.select_one(_to_css_selector(by, value))
+    if element is None:
+        raise NoSuchElementException(f"Element not found: {by}={value}")
+    return ReplayElement(element)
+
+
+def _find_elements(tag, by, value) -> list[ReplayElement]:
+    return [
+        ReplayElement(element)
+        for element in tag.select(_to_css_selector(by, value))
+    ]
+
+
+class ReplayDriver:
+    # Stand-in for the Chrome WebDriver serving the recorded page sources
+
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+        self._url = None
+        self._page_sources = []
+        self._index = 0
+        self._soup = None
+
+    @property
+    def current_url(self) -> str:
+        return self._url
+
+    def get(self, url: str) -> None:
+        page_sources = self._cassette.replay_page_sources(url)
+        if not page_sources:
+            raise WebDriverException(f"Not recorded in cassette: {url}")
+
+        self._url = url
+        self._page_sources = page_sources
+        self._index = 0
+        self._soup = None
+
+    def _current_page_source(self) -> str:
+        if self._url is None:
+            return "<html><head></head><body></body></html>"
+        return self._page_sources[self._index]
+
+    @property
+    def page_source(self) -> str:
+        # Page sources are served in the order they were read when recorded
+        page_source = self._current_page_source()
+        if self._index < len(self._page_sources) - 1:
+            self._index += 1
+            self._soup = None
+        return page_source
+
+    def _get_soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            self._soup = BeautifulSoup(
+                self._current_page_source(), "html.parser"
+            )
+        return self._soup
+
+    def find_element(self, by=By.ID, value=None) -> ReplayElement:
+        return _find_element(self._get_soup(), by, value)
+
+    def find_elements(self, by=By.ID, value=None) -> list[ReplayElement]:
+        return _find_elements(self._get_soup(), by, value)
+
+    def execute_script(self, script: str, *args):
+        if "document.readyState" in script:
+            return "complete"
+        if "window.scrollY" in script:
+            return 0
+        return None
+
+    def implicitly_wait(self, time_to_wait: float) -> None:
+        pass
+
+    def quit(self) -> None:
+        pass
@@ -0,0 +1,99 @@
+import csv
+import glob
+import os
+
+import attr
+import numpy as np
+
+CATALOG_FIELDS = (
+    "store",
+    "section",
+    "product_url",
+    "original_price",
+    "sale_price",
+    "exchange_rate",
+)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class CatalogEntry:
+    store: str = attr.ib()
+    section: str = attr.ib()
+    product_url: str = attr.ib()
+    # Prices as listed by the store, in the store currency
+    original_price: int = attr.ib()
+    sale_price: int = attr.ib()
+    exchange_rate: float = attr.ib()
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class Catalog:
+    store: np.ndarray = attr.ib()
+    section: np.ndarray = attr.ib()
+    product_url: np.ndarray = attr.ib()
+    original_price: np.ndarray = attr.ib()
+    sale_price: np.ndarray = attr.ib()
+    exchange_rate: np.ndarray = attr.ib()
+
+    def __len__(self):
+        return len(self.original_price)
+
+    def select(self, mask) -> "Catalog":
+        return Catalog(
+            **{name: getattr(self, name)[mask] for name in CATALOG_FIELDS}
+        )
+
+    def filter_store(self, store_name: str) -> "Catalog":
+        return self.select(self.store == store_name)
+
+
+def get_catalog_path(root_dir: str, store_name: str, section: str) -> str:
+    return os.path.join(
+        root_dir, "output", "catalog", store_name, f"{section}.csv"
+    )
+
+
+def reset_catalog(catalog_path: str) -> None:
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    with open(catalog_path, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerow(CATALOG_FIELDS)
+
+
+def append_catalog_entries(
+    catalog_path: str, entries: list[CatalogEntry]
+) -> None:
+    if not entries:
+        return
+
+    with open(catalog_path, "a", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        for entry in entries:
+            writer.writerow(attr.astuple(entry))
+
+
+def find_catalog_files(path: str) -> list[str]:
+    if os.path.isdir(path):
+        return sorted(
+            glob.glob(os.path.join(path, "**", "*.csv"), recursive=True)
+        )
+    return [path]
+
+
+def load_catalog(paths: list[str]) -> Catalog:
+    columns = {name: [] for name in CATALOG_FIELDS}
+
+    for path in paths:
+        for file_path in find_catalog_files(path):
+            with open(file_path, newline="", encoding="utf-8") as file:
+                for row in csv.DictReader(file):
+                    for name in CATALOG_FIELDS:
+                        columns[name].append(row[name])
+
+    return Catalog(
+        store=np.array(columns["store"], dtype=str),
+        section=np.array(columns["section"], dtype=str),
+        product_url=np.array(columns["product_url"], dtype=str),
+        original_price=np.array(columns["original_price"], dtype=np.int64),
+        sale_price=np.array(columns["sale_price"], dtype=np.int64),
+        exchange_rate=np.array(columns["exchange_rate"], dtype=np.float64),
+    )
@@ -1,6 +1,7 @@
 import os
 import shutil
 import time
+from typing import Callable
 
 import attr
 import psutil
@@ -11,6 +12,12 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
 
+from scraper import cassette
+from scraper import perf
+from scraper import rate_limiter
+from scraper import retry
+from scraper.cassette import Cassette, RecordingDriver, ReplayDriver
+
 
 class ChromeDriverError(Exception):
     pass
@@ -20,6 +27,7 @@ class ChromeDriverError(Exception):
 class ChromeDriver:
     cache_dir: str = attr.ib(default="chrome_cache")
     driver: webdriver = attr.ib(default=None)
+    cassette: Cassette = attr.ib(default=None)
 
     def __enter__(self):
         self.initial()
@@ -29,7 +37,8 @@ class ChromeDriver:
         self.cleanup()
 
     def initial(self):
-        ChromeDriverManager().install()
+        if self.cassette is None or not self.cassette.is_replaying:
+            ChromeDriverManager().install()
         if not os.path.exists(self.cache_dir):
             os.mkdir(self.cache_dir)
 
@@ -47,14 +56,30 @@ class ChromeDriver:
                     self.terminate_chromedriver_orphans()
                     shutil.rmtree(self.cache_dir)
 
+    def is_alive(self) -> bool:
+        if self.driver is None:
+            return False
+        if isinstance(self.driver, ReplayDriver):
+            return True
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
     def quit(self):
         if self.driver:
             self.driver.quit()
             self.driver = None
 
-    def create(
-        self, headless=True, max_retries=3, retry_delay_sec=3
-    ) -> webdriver:
+    @perf.timed("driver_create")
+    def create(self, headless=True) -> webdriver:
+        # Runs first in every pool worker, activate the cassette there too
+        cassette.activate(self.cassette)
+        if self.cassette is not None and self.cassette.is_replaying:
+            self.driver = ReplayDriver(self.cassette)
+            return self.driver
+
         user_data_dir = os.path.join(self.cache_dir, f"pid_{os.getpid()}")
 
         chrome_options = Options()
@@ -71,30 +96,32 @@ class ChromeDriver:
             user_data_dir, "chromedriver"
         )
 
-        for retry in range(max_retries):
-            try:
-                chrome_service = ChromeService()
-                chrome_service.silent = (
-                    True  # Set silent to True to disable logging
-                )
-                driver = webdriver.Chrome(
-                    service=chrome_service, options=chrome_options
-                )
-                driver.implicitly_wait(20)
-                self.driver = driver
-                return driver
-            except (
-                WebDriverException,
-                requests.exceptions.ConnectionError,
-            ) as e:
-                print(
-                    f"Error: {e}. attempt {retry + 1}/{max_retries}, retrying..."
-                )
-                time.sleep(retry_delay_sec)
-        else:
-            raise ChromeDriverError(
-                f"Failed to create Chrome WebDriver after {max_retries} attempts."
+        def start_chrome() -> webdriver:
+            chrome_service = ChromeService()
+            chrome_service.silent = (
+                True  # Set silent to True to disable logging
+            )
+            driver = webdriver.Chrome(
+                service=chrome_service, options=chrome_options
             )
+            driver.implicitly_wait(20)
+            return driver
+
+        try:
+            driver = retry.call(retry.DRIVER_CREATE, start_chrome)
+        except (
+            WebDriverException,
+            requests.exceptions.ConnectionError,
+            retry.CircuitOpenError,
+        ) as e:
+            raise ChromeDriverError(
+                f"Failed to create Chrome WebDriver: {e}"
+            ) from e
+
+        if self.cassette is not None:
+            driver = RecordingDriver(driver, self.cassette)
+        self.driver = driver
+        return driver
 
     @staticmethod
     def terminate_chromedriver_orphans():
@@ -123,17 +150,46 @@ class ChromeDriver:
 class WebDriverAction:
 
     @staticmethod
+    @perf.timed("navigate")
+    def navigate(driver: webdriver, url: str):
+        if isinstance(driver, ReplayDriver):
+            driver.get(url)
+            return
+
+        # The status code is unknown to WebDriver, only the latency is used
+        rate_limiter.acquire(url)
+        start_time = time.perf_counter()
+        driver.get(url)
+        rate_limiter.report(url, time.perf_counter() - start_time)
+
+    @staticmethod
+    def load_page(
+        driver: webdriver,
+        url: str,
+        wait_for_page_load: Callable[[webdriver], None],
+    ):
+        # A page that fails to load is loaded again, instead of giving up on
+        # the whole section
+        def load():
+            WebDriverAction.navigate(driver, url)
+            wait_for_page_load(driver)
+
+        retry.call(retry.PAGE_LOAD, load, key=rate_limiter.get_host(url))
+
+    @staticmethod
+    @perf.timed("scroll")
     def scroll_to_bottom(driver: webdriver, wait_time=1):
-        if driver is None:
+        if driver is None or isinstance(driver, ReplayDriver):
             return
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         time.sleep(wait_time)
 
     @staticmethod
+    @perf.timed("scroll")
     def scroll_page_by_step(
         driver: webdriver, scroll_step=1000, scroll_total=30, wait_time=1
     ):
-        if driver is None:
+        if driver is None or isinstance(driver, ReplayDriver):
             return
         current_scroll_position = 0
         for _ in range(scroll_total):
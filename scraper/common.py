@@ -1,15 +1,37 @@
 import math
 import os
 import random
+import threading
+import urllib.parse
 from datetime import timedelta
-from time import sleep
+from time import monotonic, perf_counter
 
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
-from requests.exceptions import RequestException, HTTPError
+from requests.exceptions import RequestException
 from urllib3.exceptions import IncompleteRead
 
-from scraper.exceptions import InvalidInputError
+from scraper import cassette
+from scraper import metrics
+from scraper import perf
+from scraper import rate_limiter
+from scraper import retry
+from scraper.exceptions import ImageTooLarge, InvalidInputError
+
+# Base URL of a local mock storefront (scraper.mock_storefront), when set all
+# store websites and the exchange rate page are requested from there instead
+MOCK_STORE_URL_ENV = "SCRAPER_MOCK_STORE_URL"
+
+# A stalled CDN connection must not hang a pool worker, and a huge or
+# endless response must not fill up the disk
+IMAGE_CONNECT_TIMEOUT_SEC = 5
+IMAGE_READ_TIMEOUT_SEC = 30
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_CHUNK_BYTES = 64 * 1024
+
+EXCHANGE_RATE_TTL_SEC = 10 * 60
+_exchange_rates: dict[str, tuple[float, float]] = {}
 
 
 def convert_seconds_to_time(sec):
@@ -36,10 +58,73 @@ def get_random_user_agent():
     return random.choice(user_agents)
 
 
+def get_site_url(url: str) -> str:
+    mock_store_url = os.environ.get(MOCK_STORE_URL_ENV)
+    if not mock_store_url:
+        return url
+
+    # https://host/path?query -> <mock store url>/host/path?query
+    parts = urllib.parse.urlsplit(url)
+    site_url = f"{mock_store_url.rstrip('/')}/{parts.netloc}{parts.path}"
+    if parts.query:
+        site_url += "?" + parts.query
+    return site_url
+
+
+# Keep-alive connections are reused by the requests of a thread, pool
+# workers must not share the connections of their parent
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.session = requests.Session()
+        _local.pid = os.getpid()
+    return _local.session
+
+
+def send_request(method: str, url: str, **kwargs) -> requests.Response:
+    # Every HTTP request of the scraper goes through here, so that it can be
+    # recorded or replayed by the active cassette
+    active_cassette = cassette.get_active_cassette()
+    if active_cassette is not None and active_cassette.is_replaying:
+        return active_cassette.request(method, url, **kwargs)
+
+    # Requests to the same host are paced across all processes
+    rate_limiter.acquire(url)
+    start_time = perf_counter()
+    if active_cassette is not None:
+        response = active_cassette.request(method, url, **kwargs)
+    else:
+        response = get_session().request(method, url, **kwargs)
+    rate_limiter.report(
+        url,
+        perf_counter() - start_time,
+        response.status_code,
+        response.headers.get("Retry-After"),
+    )
+    return response
+
+
 # Helper function to get the exchange rate for Australian Dollar (AUD)
 # from Bank of Taiwan
 def get_aud_exchange_rate() -> float:
-    url = "https://rate.bot.com.tw/xrt?Lang=en-US"
+    url = get_site_url("https://rate.bot.com.tw/xrt?Lang=en-US")
+
+    # Fetched once per process and period, not for every section. Not
+    # cached while recording or replaying, so that cassettes are complete.
+    cached = _exchange_rates.get(url)
+    use_cache = cassette.get_active_cassette() is None
+    if use_cache and cached and monotonic() - cached[0] < EXCHANGE_RATE_TTL_SEC:
+        return cached[1]
+
+    exchange_rate = fetch_aud_exchange_rate(url)
+    if use_cache and exchange_rate is not None:
+        _exchange_rates[url] = (monotonic(), exchange_rate)
+    return exchange_rate
+
+
+def fetch_aud_exchange_rate(url: str) -> float | None:
     try:
         soup = BeautifulSoup(get_static_html_content(url), "html.parser")
 
@@ -60,15 +145,21 @@ def get_aud_exchange_rate() -> float:
         raise req
 
 
+@perf.timed("fetch_static")
 def get_static_html_content(url):
     headers = {"User-Agent": get_random_user_agent()}
-    try:
-        response = requests.get(url, headers=headers)
+
+    def fetch():
+        response = send_request("GET", url, headers=headers)
         if not response.ok:
             print("HTTP response status code:", response.status_code)
         response.raise_for_status()
-        html_content = response.text
-        return html_content
+        return response.text
+
+    try:
+        return retry.call(
+            retry.STATIC_FETCH, fetch, key=rate_limiter.get_host(url)
+        )
     except requests.exceptions.RequestException as e:
         print("Error:", e)
         raise
@@ -140,6 +231,70 @@ def calculate_profit_margin(
     return selling_price, profit, profit_margin
 
 
+def calculate_profitable_price_batch(
+    cost,
+    profit_rate=0.08,
+    original_price=None,
+    max_profit=False,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Vectorized calculate_profitable_price(), all arguments are broadcast
+    # against each other. Returns the selling prices and a mask of the
+    # entries that have one, selling price is 0 where the scalar returns None.
+    cost = np.asarray(cost, dtype=np.int64)
+    profit_rate = np.asarray(profit_rate, dtype=np.float64)
+
+    increment = np.maximum(
+        (cost // 2000) * 100 + 330, np.ceil(cost * profit_rate)
+    )
+
+    if original_price is not None:
+        original_price = np.asarray(original_price, dtype=np.int64)
+        price_diff = original_price - cost
+
+        # Only adjust if original price is higher and leaving room for profit
+        adjust = np.asarray(max_profit, dtype=bool) & (price_diff > increment)
+        proportion_factor = 0.3
+        adjusted_increment = np.minimum(
+            increment + price_diff * proportion_factor, price_diff * 0.5
+        )
+        increment = np.where(adjust, adjusted_increment, increment)
+
+    selling_price = cost + increment
+
+    profitable = np.ones(selling_price.shape, dtype=bool)
+    if original_price is not None:
+        profitable = np.asarray(selling_price <= original_price)
+
+    # Round to the next higher multiple of 20
+    selling_price = np.where(
+        profitable, np.ceil(selling_price / 20) * 20, 0
+    ).astype(np.int64)
+
+    return selling_price, profitable
+
+
+def calculate_profit_margin_batch(
+    cost,
+    original_price=None,
+    profit_rate=0.068,
+    max_profit=False,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Vectorized calculate_profit_margin(), returns the selling prices,
+    # profits, profit margins and a mask of the profitable entries.
+    # Unprofitable entries are set to 0 in the first three arrays.
+    cost = np.asarray(cost, dtype=np.int64)
+    selling_price, profitable = calculate_profitable_price_batch(
+        cost, profit_rate, original_price=original_price, max_profit=max_profit
+    )
+
+    profit = np.where(profitable, selling_price - cost, 0)
+    profit_margin = np.zeros(selling_price.shape, dtype=np.float64)
+    np.divide(profit, selling_price, out=profit_margin, where=profitable)
+    profit_margin *= 100
+
+    return selling_price, profit, profit_margin, profitable
+
+
 def calculate_discount_percentage(original_price, discount_price):
     discount_percentage: float = (
         (original_price - discount_price) / original_price
@@ -149,7 +304,7 @@ def calculate_discount_percentage(original_price, discount_price):
 
 def check_url_validity(url: str) -> bool:
     try:
-        response = requests.head(url)
+        response = send_request("HEAD", url, allow_redirects=False)
         if response.status_code == requests.codes.ok:
             return True
         else:
@@ -160,7 +315,8 @@ def check_url_validity(url: str) -> bool:
         return False
 
 
-def download_image_from_url(url, output_path, max_retries=3, retry_delay_sec=3):
+@perf.timed("image_download")
+def download_image_from_url(url, output_path, max_bytes=IMAGE_MAX_BYTES):
     if not isinstance(output_path, str) or not output_path:
         raise InvalidInputError(
             f"Invalid output_path parameter: '{output_path}' "
@@ -173,32 +329,61 @@ def download_image_from_url(url, output_path, max_retries=3, retry_delay_sec=3):
             f"'{url}' in function '{download_image_from_url.__name__}'"
         )
 
-    for retry in range(max_retries):
-        try:
-            response = requests.get(url)
+    # Streamed in chunks into a temporary file, renamed once complete, so
+    # that an interrupted download never leaves a truncated image behind
+    temp_path = f"{output_path}.{os.getpid()}.part"
+
+    def download() -> int:
+        with send_request(
+            "GET",
+            url,
+            stream=True,
+            timeout=(IMAGE_CONNECT_TIMEOUT_SEC, IMAGE_READ_TIMEOUT_SEC),
+        ) as response:
             # Verify download success, raise exception on error.
             response.raise_for_status()
 
-            print(f"Image download to path: {output_path}")
-            with open(output_path, "wb") as file:
-                file.write(response.content)
-            print("Image download completed")
-            break
-
-        except IncompleteRead as e:
-            print(f"IncompleteRead Error: {e}")
-            print(f"Retrying download ({retry + 1}/{max_retries})...")
-            sleep(retry_delay_sec)
-
-        except HTTPError as e:
-            print(f"HTTP Error: {e}")
-            raise e
+            content_length = response.headers.get("Content-Length", "")
+            if content_length.isdigit() and int(content_length) > max_bytes:
+                raise ImageTooLarge(
+                    f"Image of {content_length} bytes exceeds "
+                    f"{max_bytes} bytes: {url}"
+                )
+
+            size = 0
+            try:
+                with open(temp_path, "wb") as file:
+                    for chunk in response.iter_content(IMAGE_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise ImageTooLarge(
+                                f"Image exceeds {max_bytes} bytes: {url}"
+                            )
+                        file.write(chunk)
+                os.replace(temp_path, output_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            return size
+
+    print(f"Image download to path: {output_path}")
+    try:
+        size = retry.call(
+            retry.IMAGE_DOWNLOAD, download, key=rate_limiter.get_host(url)
+        )
+    except (
+        IncompleteRead,
+        RequestException,
+        ImageTooLarge,
+        retry.CircuitOpenError,
+    ) as e:
+        print(f"Download failed({type(e).__name__}): {e}")
+        raise
 
-        except RequestException as e:
-            print(f"Request Error: {e}")
-            raise e
-    else:
-        print(f"Download failed after {max_retries} retries")
+    print("Image download completed")
+    metrics.inc(metrics.IMAGES_DOWNLOADED)
+    metrics.inc(metrics.IMAGE_BYTES, size)
 
 
 def abort_scraping_msg(url: str) -> str:
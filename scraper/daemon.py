@@ -0,0 +1,310 @@
+import io
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import attr
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class StoreTarget:
+    name: str = attr.ib()
+    # URLs starting with it can be scraped, e.g. the sale pages of a store
+    url_prefix: str = attr.ib()
+    # Sale pages scraped by a job for the whole store
+    get_urls: Callable[[], list[str]] = attr.ib()
+    # Scrapes a URL of the store, True on success
+    scrape_url: Callable[[str], bool] = attr.ib()
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class Job:
+    job_id: int = attr.ib()
+    store: str = attr.ib()
+    urls: list[str] = attr.ib()
+    status: str = attr.ib(default=QUEUED)
+    results: dict[str, bool] = attr.ib(factory=dict)
+    created: float = attr.ib(factory=time.time)
+    finished: float = attr.ib(default=None)
+    # Log lines and results, streamed to the clients as they happen
+    events: list[dict] = attr.ib(factory=list)
+    _condition: threading.Condition = attr.ib(factory=threading.Condition)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def add_event(self, event: dict) -> None:
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def wait_events(self, start: int, timeout: float = 1.0) -> list[dict]:
+        with self._condition:
+            if len(self.events) <= start and not self.is_finished:
+                self._condition.wait(timeout)
+            return self.events[start:]
+
+    def finish(self, status: str) -> None:
+        self.finished = time.time()
+        with self._condition:
+            self.status = status
+            self.events.append({"event": "finished", "status": status})
+            self._condition.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.job_id,
+            "store": self.store,
+            "urls": self.urls,
+            "status": self.status,
+            "results": dict(self.results),
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobOutput(io.TextIOBase):
+    # Replaces sys.stdout while the daemon runs. The output of the worker
+    # thread is teed into the events of its running job, the other threads
+    # only write to the stream.
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def set_job(self, job: Job | None) -> None:
+        buffer = getattr(self.local, "buffer", "")
+        if buffer and self.local.job is not None:
+            self.local.job.add_event({"event": "log", "line": buffer})
+        self.local.job = job
+        self.local.buffer = ""
+
+    def write(self, text: str) -> int:
+        self.stream.write(text)
+        job = getattr(self.local, "job", None)
+        if job is not None:
+            self.local.buffer += text
+            *lines, self.local.buffer = self.local.buffer.split("\n")
+            for line in lines:
+                job.add_event({"event": "log", "line": line})
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class ScraperDaemon:
+    # Runs the submitted jobs one at a time in a worker thread, which keeps
+    # the browser, HTTP connections and caches of the process warm between
+    # them
+
+    targets: dict[str, StoreTarget] = attr.ib()
+    # Called before every job, e.g. to start a new price history run
+    before_job: Callable[[Job], None] = attr.ib(default=None)
+    jobs: dict[int, Job] = attr.ib(factory=dict, init=False)
+    _queue: queue.Queue = attr.ib(factory=queue.Queue, init=False)
+    _job_ids: itertools.count = attr.ib(
+        factory=lambda: itertools.count(1), init=False
+    )
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+    _thread: threading.Thread = attr.ib(default=None, init=False)
+    _output: JobOutput = attr.ib(default=None, init=False)
+
+    def find_target(self, url: str) -> StoreTarget | None:
+        for target in self.targets.values():
+            if url.startswith(target.url_prefix):
+                return target
+        return None
+
+    def submit(self, request: dict) -> Job:
+        # {"store": name} scrapes all sale pages of a store, {"url": url}
+        # a single sale page, or a chemist warehouse product
+        if request.get("url"):
+            url = request["url"]
+            target = self.find_target(url)
+            if target is None:
+                raise ValueError(
+                    f"Neither a sale page nor a product of a supported "
+                    f"store: {url}"
+                )
+            urls = [url]
+        elif request.get("store") in self.targets:
+            target = self.targets[request["store"]]
+            urls = target.get_urls()
+        else:
+            raise ValueError(
+                f"Either 'url' or 'store' of {sorted(self.targets)} is required"
+            )
+
+        with self._lock:
+            job = Job(next(self._job_ids), target.name, urls)
+            self.jobs[job.job_id] = job
+        self._queue.put(job)
+        return job
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # The jobs already queued are run first
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+        if self._output is not None and sys.stdout is self._output:
+            sys.stdout = self._output.stream
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self.run_job(job)
+
+    def run_job(self, job: Job) -> None:
+        job.status = RUNNING
+        target = self.targets[job.store]
+        if not isinstance(sys.stdout, JobOutput):
+            # Installed once, the other threads keep writing to the stream
+            self._output = JobOutput(sys.stdout)
+            sys.stdout = self._output
+        output = sys.stdout
+        output.set_job(job)
+        try:
+            if self.before_job is not None:
+                self.before_job(job)
+            for url in job.urls:
+                result = bool(target.scrape_url(url))
+                job.results[url] = result
+                job.add_event({"event": "result", "url": url, "ok": result})
+            status = DONE if all(job.results.values()) else FAILED
+        except Exception as e:
+            print(f"Job {job.job_id} failed({type(e).__name__}): {e}")
+            status = FAILED
+        finally:
+            # The last line of output comes before the finished event
+            output.set_job(None)
+        job.finish(status)
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    server_version = "ScraperDaemon/1.0"
+
+    @property
+    def daemon(self) -> ScraperDaemon:
+        return self.server.daemon
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_job(self, job_id: str) -> Job | None:
+        job = self.daemon.jobs.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            self.send_json(404, {"error": f"Unknown job: {job_id}"})
+        return job
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path).path.strip("/").split("/")
+        if parts == ["health"]:
+            self.send_json(
+                200, {"status": "ok", "stores": list(self.daemon.targets)}
+            )
+        elif parts == ["jobs"]:
+            self.send_json(
+                200, [job.to_dict() for job in list(self.daemon.jobs.values())]
+            )
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.get_job(parts[1])
+            if job is not None:
+                self.send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self.get_job(parts[1])
+            if job is not None:
+                self.stream_events(job)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path.strip("/")
+        if path == "shutdown":
+            self.send_json(200, {"status": "shutting down"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if path != "jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job = self.daemon.submit(request)
+        except (ValueError, AttributeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(202, job.to_dict())
+
+    def stream_events(self, job: Job) -> None:
+        # One JSON event per line until the job is finished, the connection
+        # is closed at the end
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        sent = 0
+        while True:
+            events = job.wait_events(sent)
+            for event in events:
+                self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            sent += len(events)
+            if events and events[-1]["event"] == "finished":
+                break
+
+
+def create_server(
+    daemon: ScraperDaemon, host: str = "127.0.0.1", port: int = 8765
+) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.daemon_threads = True
+    server.daemon = daemon
+    return server
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    # "PORT" or "HOST:PORT"
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def serve(daemon: ScraperDaemon, host: str, port: int) -> None:
+    server = create_server(daemon, host, port)
+    daemon.start()
+    print(f"Scraper daemon listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Received KeyboardInterrupt, stop the daemon")
+    finally:
+        server.server_close()
+        daemon.stop()
@@ -4,3 +4,7 @@ class InvalidInputError(Exception):
 
 class ElementNotFound(Exception):
     pass
+
+
+class ImageTooLarge(Exception):
+    pass
@@ -1,14 +1,177 @@
+import functools
+import math
 import os
 
+import attr
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from scraper import metrics
+from scraper import perf
+
 
 class ImageProcessingError(Exception):
     pass
 
 
+# Width of the rendered IG story images, larger product images are scaled down
+IG_STORY_MAX_WIDTH = 1080
+
+# Output format of the rendered stories, set by run_scraper.py and inherited
+# by the pool workers. JPEG with the Pillow defaults when it is not set.
+IMAGE_FORMAT_ENV = "SCRAPER_IMAGE_FORMAT"
+IMAGE_QUALITY_ENV = "SCRAPER_IMAGE_QUALITY"
+
+# Let Pillow decode at a reduced scale (JPEG draft mode / reduce()) while
+# keeping at least this factor of extra resolution for the final resampling
+DOWNSCALE_REDUCING_GAP = 1.5
+
+
+# Only a few (font, size) pairs occur in a run because the text size comes
+# from the image width, so loaded fonts and measured strings are cached.
+FONT_CACHE_SIZE = 32
+TEXT_LENGTH_CACHE_SIZE = 1024
+# The text of a product is the same on all of its images, so its layer is
+# rendered once and composited onto each of them.
+TEXT_LAYER_CACHE_SIZE = 16
+# Room around the text layer for glyphs reaching over their origin
+TEXT_LAYER_MARGIN = 8
+TEXT_LINE_GAP = 4
+STRIKETHROUGH_WIDTH = 5
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    # The font file is only checked and read from disk on a cache miss
+    if not os.path.exists(font_path):
+        raise FileNotFoundError(f"Error processing font file: {font_path}")
+    return ImageFont.truetype(font_path, size)
+
+
+@functools.lru_cache(maxsize=TEXT_LENGTH_CACHE_SIZE)
+def get_text_length(font_path: str, size: int, text: str) -> float:
+    # Same result as ImageDraw.textlength() on an RGB image (font mode "L")
+    return load_font(font_path, size).getlength(text, mode="L")
+
+
+@functools.lru_cache(maxsize=TEXT_LAYER_CACHE_SIZE)
+def render_text_layer(
+    font_path: str,
+    size: int,
+    text: str,
+    strikethrough_line_index: int = None,
+    strikethrough_text: str = None,
+) -> Image.Image:
+    # Alpha mask of the text and of its strikethrough line, with the text
+    # origin at (TEXT_LAYER_MARGIN, TEXT_LAYER_MARGIN). Must not be modified,
+    # it is shared by the images of a product.
+    font = load_font(font_path, size)
+    margin = TEXT_LAYER_MARGIN
+
+    measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+    _, _, right, bottom = measure.multiline_textbbox(
+        (margin, margin), text, font=font, spacing=TEXT_LINE_GAP
+    )
+    width, height = right + margin, bottom + margin
+
+    line = None
+    if strikethrough_line_index is not None:
+        start_y = (
+            margin
+            + (size + TEXT_LINE_GAP) * strikethrough_line_index
+            + size // 2
+        )
+        end_x = margin + get_text_length(font_path, size, strikethrough_text)
+        line = [(margin, start_y), (end_x, start_y)]
+        width = max(width, math.ceil(end_x) + margin)
+        height = max(height, start_y + margin)
+
+    mask = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.text(
+        (margin, margin), text, font=font, fill=255, spacing=TEXT_LINE_GAP
+    )
+    if line is not None:
+        draw.line(line, fill=255, width=STRIKETHROUGH_WIDTH)
+    return mask
+
+
+def composite_text_layer(
+    image: Image.Image,
+    mask: Image.Image,
+    position: tuple[int, int],
+    fill: tuple[int, int, int] = (0, 0, 0),
+) -> None:
+    # Same pixels as drawing the text onto the image
+    image.paste(
+        fill,
+        (position[0] - TEXT_LAYER_MARGIN, position[1] - TEXT_LAYER_MARGIN),
+        mask,
+    )
+
+
+def font_cache_info() -> dict:
+    return {
+        "font": load_font.cache_info(),
+        "text_length": get_text_length.cache_info(),
+        "text_layer": render_text_layer.cache_info(),
+    }
+
+
+def clear_font_cache() -> None:
+    load_font.cache_clear()
+    get_text_length.cache_clear()
+    render_text_layer.cache_clear()
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class ImageEncoder:
+    # Pillow format name and save() options
+    image_format: str = attr.ib()
+    extension: str = attr.ib()
+    options: dict = attr.ib(factory=dict)
+
+    @property
+    def is_available(self) -> bool:
+        # WebP and AVIF depend on the libraries Pillow was built with
+        Image.init()
+        return self.image_format in Image.SAVE
+
+    def with_quality(self, quality: int) -> "ImageEncoder":
+        return attr.evolve(self, options={**self.options, "quality": quality})
+
+
+IMAGE_ENCODERS = {
+    "jpeg": ImageEncoder("JPEG", ".jpg"),
+    "jpeg-optimized": ImageEncoder(
+        "JPEG", ".jpg", {"quality": 80, "optimize": True, "progressive": True}
+    ),
+    "webp": ImageEncoder("WEBP", ".webp", {"quality": 80, "method": 2}),
+    "avif": ImageEncoder("AVIF", ".avif", {"quality": 60, "speed": 8}),
+}
+
+
+def get_image_encoder() -> ImageEncoder:
+    encoder = IMAGE_ENCODERS[os.environ.get(IMAGE_FORMAT_ENV) or "jpeg"]
+    quality = os.environ.get(IMAGE_QUALITY_ENV)
+    return encoder.with_quality(int(quality)) if quality else encoder
+
+
+def save_image(
+    image: Image.Image,
+    path: str,
+    dpi: tuple = None,
+    encoder: ImageEncoder = None,
+) -> None:
+    # The format comes from the file extension without an encoder
+    options = {} if dpi is None else {"dpi": dpi}
+    if encoder is None:
+        image.save(path, **options)
+    else:
+        image.save(path, encoder.image_format, **encoder.options, **options)
+
+
 def add_text_to_image_with_strikethrough(
     in_file_path: str,
     out_file_path: str,
@@ -18,6 +181,7 @@ def add_text_to_image_with_strikethrough(
     text_position,
     strikethrough_line_index: int,
     strikethrough_text: str,
+    encoder: ImageEncoder = None,
 ):
     # Check if the output directory exists
     output_directory = os.path.dirname(out_file_path)
@@ -26,8 +190,13 @@ def add_text_to_image_with_strikethrough(
             f"Output directory does not exist: {output_directory}"
         )
 
-    if not os.path.exists(font_path):
-        raise FileNotFoundError(f"Error processing font file: {font_path}")
+    text_layer = render_text_layer(
+        font_path,
+        text_size,
+        text,
+        strikethrough_line_index,
+        strikethrough_text,
+    )
 
     try:
         # Open the image and ensure the file is properly closed using a context manager
@@ -38,40 +207,10 @@ def add_text_to_image_with_strikethrough(
             # Get the DPI value
             dpi = image.info.get("dpi")
 
-            # Create a drawing object to add text
-            draw = ImageDraw.Draw(image)
-            font = ImageFont.truetype(font_path, text_size)
-            line_gap = 4
-
-            # lines = text.splitlines()
-            # strike_through_width = draw.textlength(
-            #     lines[strike_through_line_index], font=font
-            # )
-            strikethrough_width = draw.textlength(strikethrough_text, font=font)
-            text_height = text_size
-
-            draw.text(
-                text_position, text, font=font, fill=(0, 0, 0), spacing=line_gap
-            )
-
-            # position (x, y)
-            start_y = (
-                text_position[1]
-                + (text_height + line_gap) * strikethrough_line_index
-                + text_size // 2
-            )
-            start_pos = (
-                text_position[0],
-                start_y,
-            )
-            end_pos = (
-                text_position[0] + strikethrough_width,
-                start_y,
-            )
-            draw.line([start_pos, end_pos], fill=(0, 0, 0), width=5)
+            composite_text_layer(image, text_layer, text_position)
 
             # Save the modified image
-            image.save(out_file_path, dpi=dpi)
+            save_image(image, out_file_path, dpi, encoder)
             print(f"Saved modified image as: {out_file_path}")
 
     except (OSError, IOError, SyntaxError) as e:
@@ -86,6 +225,7 @@ def add_text_to_image(
     text: str,
     size,
     position,
+    encoder: ImageEncoder = None,
 ):
     # Check if the output directory exists
     output_directory = os.path.dirname(out_file_path)
@@ -94,8 +234,7 @@ def add_text_to_image(
             f"Output directory does not exist: {output_directory}"
         )
 
-    if not os.path.exists(font_path):
-        raise FileNotFoundError(f"Error processing font file: {font_path}")
+    text_layer = render_text_layer(font_path, size, text)
 
     try:
         # Open the image and ensure the file is properly closed using a context manager
@@ -106,15 +245,11 @@ def add_text_to_image(
             # Get the DPI value
             dpi = image.info.get("dpi")
 
-            # Create a drawing object to add text
-            draw = ImageDraw.Draw(image)
-            font = ImageFont.truetype(font_path, size)
-
             # Draw text on the image
-            draw.text(position, text, font=font, fill=(0, 0, 0))
+            composite_text_layer(image, text_layer, position)
 
             # Save the modified image
-            image.save(out_file_path, dpi=dpi)
+            save_image(image, out_file_path, dpi, encoder)
             print(f"Saved modified image as: {out_file_path}")
 
     except (FileNotFoundError, OSError, IOError, SyntaxError) as e:
@@ -146,19 +281,8 @@ def delete_image(image_path):
 
 
 def change_file_extension(file_path, new_extension) -> str:
-    # Get the directory path and filename from the file path
-    directory, filename = os.path.split(file_path)
-
-    # Get the original file extension
-    _, old_extension = os.path.splitext(filename)
-
-    # Replace the original file extension with the new extension
-    new_filename = filename.replace(old_extension, new_extension)
-
-    # Combine the new filename with the directory path
-    new_file_path = os.path.join(directory, new_filename)
-
-    return str(new_file_path)
+    # Only the suffix, the product titles may contain an extension too
+    return str(os.path.splitext(file_path)[0] + new_extension)
 
 
 def expand_and_center_image(
@@ -166,7 +290,8 @@ def expand_and_center_image(
     output_path,
     new_size: tuple[int, int],
     background_color: tuple[int, int, int] = (255, 255, 255),
-    min_dpi=300,
+    min_dpi=None,
+    image_size: tuple[int, int] = None,
 ):
     """
     Expand the image to the new size with a specified background color and center the original image.
@@ -177,7 +302,11 @@ def expand_and_center_image(
         new_size (tuple): New size of the image in the format (width, height).
         background_color (tuple, optional): Background color as an RGB tuple
                                             (default is white - (255, 255, 255)).
-        min_dpi (int): minimum DPI for output file (default is 300)
+        min_dpi (int, optional): Minimum DPI for output file, the DPI of
+                                 the original image is kept by default.
+        image_size (tuple, optional): Maximum size of the original image on the
+                                      new image, larger images are scaled down
+                                      keeping the aspect ratio (default is None).
 
     Raises:
         ImageProcessingError: If there are any errors during image processing.
@@ -186,13 +315,26 @@ def expand_and_center_image(
     try:
         # Open the original image using a context manager
         with Image.open(image_path) as image:
+            # Get the DPI value and ensure it meets the minimum requirement
+            dpi = image.info.get("dpi")
+            if min_dpi is not None:
+                dpi = dpi or (min_dpi, min_dpi)
+                dpi = (max(dpi[0], min_dpi), max(dpi[1], min_dpi))
+
+            if image_size is not None and (
+                image.width > image_size[0] or image.height > image_size[1]
+            ):
+                # Must run before the image is loaded, so that oversized JPEGs
+                # are decoded at a reduced resolution
+                image.thumbnail(
+                    image_size,
+                    Image.Resampling.LANCZOS,
+                    reducing_gap=DOWNSCALE_REDUCING_GAP,
+                )
+
             # Convert the image to RGB mode if it is in RGBA format (PNG file)
             image = image.convert("RGB")
 
-            # Get the DPI value and ensure it meets the minimum requirement
-            dpi = image.info.get("dpi", (min_dpi, min_dpi))
-            dpi = (max(dpi[0], min_dpi), max(dpi[1], min_dpi))
-
             # Get the size of the original image and the new image
             original_size = image.size
             new_width, new_height = new_size
@@ -210,7 +352,7 @@ def expand_and_center_image(
             new_image.paste(image, offset)
 
             # Save the new image
-            new_image.save(output_path, dpi=dpi)
+            save_image(new_image, output_path, dpi)
 
     except FileNotFoundError:
         raise ImageProcessingError(f"Invalid image path: {image_path}")
@@ -218,8 +360,11 @@ def expand_and_center_image(
         raise ImageProcessingError(f"Error processing image: {e}")
 
 
+@perf.timed("resize")
 def resize_for_ig_story(
-    input_file_path: str, image_background_color: tuple[int, int, int]
+    input_file_path: str,
+    image_background_color: tuple[int, int, int],
+    max_width: int = None,
 ):
     width, height = get_image_size(input_file_path)
     aspect_ratio = width / height
@@ -240,12 +385,25 @@ def resize_for_ig_story(
         new_width = 800
         new_height = int(new_width / target_aspect_ratio)
 
+    image_size = None
+    if max_width is not None and new_width > max_width:
+        # Scale the story and the original image down by the same factor,
+        # so the image keeps its place on the story
+        scale = max_width / new_width
+        new_width = max_width
+        new_height = int(new_width / target_aspect_ratio)
+        image_size = (
+            max(1, round(width * scale)),
+            max(1, round(height * scale)),
+        )
+
     try:
         expand_and_center_image(
             input_file_path,
             input_file_path,
             (new_width, new_height),
             image_background_color,
+            image_size=image_size,
         )
     except (FileNotFoundError, OSError, ImageProcessingError) as e:
         print(f"Resize the image error: {e}")
@@ -254,14 +412,19 @@ def resize_for_ig_story(
     return new_width, new_height
 
 
+@perf.timed("insert_text")
 def insert_text_to_ig_story(
     input_file_path: str,
     font_path: str,
     insert_text: str,
     strikethrough_line_index: int = None,
     strikethrough_text: str = None,
+    output_file_path: str = None,
+    encoder: ImageEncoder = None,
 ):
     width, height = get_image_size(input_file_path)
+    if output_file_path is None:
+        output_file_path = input_file_path
 
     image_width_to_text_ratio = 29
     text_size = round(width / image_width_to_text_ratio)
@@ -276,22 +439,24 @@ def insert_text_to_ig_story(
         if strikethrough_line_index is None:
             add_text_to_image(
                 input_file_path,
-                input_file_path,
+                output_file_path,
                 font_path,
                 insert_text,
                 text_size,
                 text_position,
+                encoder,
             )
         else:
             add_text_to_image_with_strikethrough(
                 input_file_path,
-                input_file_path,
+                output_file_path,
                 font_path,
                 insert_text,
                 text_size,
                 text_position,
                 strikethrough_line_index,
                 strikethrough_text,
+                encoder,
             )
 
     except (FileNotFoundError, ImageProcessingError) as e:
@@ -299,6 +464,7 @@ def insert_text_to_ig_story(
         raise
 
 
+@perf.timed("render")
 def ig_story_image_processing(
     input_file_path: str,
     image_background_color: tuple[int, int, int],
@@ -306,19 +472,32 @@ def ig_story_image_processing(
     insert_text: str,
     strikethrough_line_index: int = None,
     strikethrough_text: str = None,
-):
+    max_width: int = IG_STORY_MAX_WIDTH,
+    encoder: ImageEncoder = None,
+) -> str:
     print("IG Story Image processing")
 
-    resize_for_ig_story(input_file_path, image_background_color)
+    if encoder is None:
+        encoder = get_image_encoder()
+    # The downloaded image is replaced by the story in the output format
+    output_file_path = change_file_extension(input_file_path, encoder.extension)
+
+    resize_for_ig_story(input_file_path, image_background_color, max_width)
     insert_text_to_ig_story(
         input_file_path,
         font_path,
         insert_text,
         strikethrough_line_index,
         strikethrough_text,
+        output_file_path,
+        encoder,
     )
+    if output_file_path != input_file_path:
+        os.remove(input_file_path)
 
+    metrics.inc(metrics.RENDERS)
     print("IG Story Image processing completed")
+    return output_file_path
 
 
 # Example usage
@@ -0,0 +1,385 @@
+import argparse
+import os
+import platform
+import sqlite3
+import threading
+import time
+
+import attr
+
+from scraper.daemon import StoreTarget
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# A leased job goes back to the queue when its worker stops renewing the
+# lease, e.g. when the host died
+LEASE_SEC = 300
+HEARTBEAT_SEC = 60
+MAX_ATTEMPTS = 3
+# Wait for the jobs leased by the other workers before leaving
+POLL_SEC = 10
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "job_id INTEGER PRIMARY KEY, store TEXT NOT NULL, "
+    "url TEXT NOT NULL UNIQUE, status TEXT NOT NULL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, "
+    "output_dir TEXT, error TEXT, updated REAL)",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, job_id)",
+)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class QueuedJob:
+    job_id: int = attr.ib()
+    store: str = attr.ib()
+    url: str = attr.ib()
+    attempts: int = attr.ib(default=0)
+    worker: str = attr.ib(default=None)
+    error: str = attr.ib(default=None)
+
+
+def get_node_dir(root_dir: str, worker_id: str) -> str:
+    # Output, journal and price history of a worker node
+    return os.path.join(root_dir, "nodes", worker_id)
+
+
+def get_worker_id() -> str:
+    return f"{platform.node()}-{os.getpid()}"
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class SQLiteJobQueue:
+    # Queue shared by the workers of all hosts, in a SQLite database on a
+    # shared disk. The rollback journal is kept, WAL does not work over
+    # network file systems.
+
+    path: str = attr.ib()
+    lease_sec: float = attr.ib(default=LEASE_SEC)
+    max_attempts: int = attr.ib(default=MAX_ATTEMPTS)
+    # A connection per thread, the leases are renewed in another thread
+    _local: threading.local = attr.ib(factory=threading.local, init=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.path)), exist_ok=True
+            )
+            connection = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None
+            )
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def enqueue(self, store: str, urls: list[str]) -> int:
+        # Finished jobs are queued again, pending and leased ones are kept.
+        # Returns the number of jobs queued.
+        connection = self._connect()
+        before = connection.total_changes
+        connection.executemany(
+            "INSERT INTO jobs (store, url, status, updated) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET store = excluded.store, "
+            "status = excluded.status, attempts = 0, worker = NULL, "
+            "lease_until = NULL, output_dir = NULL, error = NULL, "
+            "updated = excluded.updated "
+            "WHERE jobs.status IN (?, ?)",
+            [(store, url, PENDING, time.time(), DONE, FAILED) for url in urls],
+        )
+        return connection.total_changes - before
+
+    def lease(self, worker: str) -> QueuedJob | None:
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases of the jobs out of attempts are given up
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "Lease expired", now, LEASED, now, self.max_attempts),
+            )
+            row = connection.execute(
+                "SELECT job_id, store, url, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY job_id LIMIT 1",
+                (PENDING, LEASED, now),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                    (LEASED, worker, now + self.lease_sec, now, row[0]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        job_id, store, url, attempts = row
+        return QueuedJob(job_id, store, url, attempts + 1, worker)
+
+    def _update_leased(self, job: QueuedJob, assignments: str, params) -> bool:
+        # False when the lease was lost, e.g. expired and taken by another
+        # worker
+        cursor = self._connect().execute(
+            f"UPDATE jobs SET {assignments}, updated = ? "
+            "WHERE job_id = ? AND worker = ? AND status = ?",
+            (*params, time.time(), job.job_id, job.worker, LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job: QueuedJob) -> bool:
+        return self._update_leased(
+            job, "lease_until = ?", (time.time() + self.lease_sec,)
+        )
+
+    def complete(self, job: QueuedJob, output_dir: str = None) -> bool:
+        return self._update_leased(
+            job, "status = ?, output_dir = ?", (DONE, output_dir)
+        )
+
+    def fail(self, job: QueuedJob, error: str) -> bool:
+        # Retried by the next lease until out of attempts
+        status = PENDING if job.attempts < self.max_attempts else FAILED
+        return self._update_leased(
+            job, "status = ?, error = ?", (status, error)
+        )
+
+    def counts(self) -> dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        )
+        return dict(rows)
+
+    def is_drained(self) -> bool:
+        counts = self.counts()
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+    def get_jobs(self, status: str) -> list[QueuedJob]:
+        rows = self._connect().execute(
+            "SELECT job_id, store, url, attempts, worker, error FROM jobs "
+            "WHERE status = ? ORDER BY job_id",
+            (status,),
+        )
+        return [QueuedJob(*row) for row in rows]
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class MemoryJobQueue:
+    # Local stand-in for SQLiteJobQueue, for the workers of a single process
+
+    lease_sec: float = attr.ib(default=LEASE_SEC)
+    max_attempts: int = attr.ib(default=MAX_ATTEMPTS)
+    # job_id -> [job, status, lease_until, output_dir]
+    _jobs: dict[int, list] = attr.ib(factory=dict, init=False)
+    _urls: dict[str, int] = attr.ib(factory=dict, init=False)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock, init=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def enqueue(self, store: str, urls: list[str]) -> int:
+        queued = 0
+        with self._lock:
+            for url in urls:
+                job_id = self._urls.get(url)
+                if job_id is not None and self._jobs[job_id][1] in (
+                    PENDING,
+                    LEASED,
+                ):
+                    continue
+                if job_id is None:
+                    job_id = len(self._urls) + 1
+                    self._urls[url] = job_id
+                self._jobs[job_id] = [
+                    QueuedJob(job_id, store, url),
+                    PENDING,
+                    None,
+                    None,
+                ]
+                queued += 1
+        return queued
+
+    def lease(self, worker: str) -> QueuedJob | None:
+        now = time.time()
+        with self._lock:
+            for entry in self._jobs.values():
+                job, status, lease_until, _ = entry
+                if status == LEASED and lease_until < now:
+                    if job.attempts >= self.max_attempts:
+                        entry[0] = attr.evolve(job, error="Lease expired")
+                        entry[1] = FAILED
+                        continue
+                elif status != PENDING:
+                    continue
+                entry[0] = attr.evolve(
+                    job, attempts=job.attempts + 1, worker=worker
+                )
+                entry[1] = LEASED
+                entry[2] = now + self.lease_sec
+                return entry[0]
+        return None
+
+    def _update_leased(self, job: QueuedJob, **changes) -> bool:
+        with self._lock:
+            entry = self._jobs.get(job.job_id)
+            if entry is None or entry[1] != LEASED:
+                return False
+            if entry[0].worker != job.worker:
+                return False
+            if "error" in changes:
+                entry[0] = attr.evolve(entry[0], error=changes["error"])
+            for index, name in enumerate(
+                ("status", "lease_until", "output_dir"), 1
+            ):
+                if name in changes:
+                    entry[index] = changes[name]
+            return True
+
+    def heartbeat(self, job: QueuedJob) -> bool:
+        return self._update_leased(
+            job, lease_until=time.time() + self.lease_sec
+        )
+
+    def complete(self, job: QueuedJob, output_dir: str = None) -> bool:
+        return self._update_leased(job, status=DONE, output_dir=output_dir)
+
+    def fail(self, job: QueuedJob, error: str) -> bool:
+        status = PENDING if job.attempts < self.max_attempts else FAILED
+        return self._update_leased(job, status=status, error=error)
+
+    def counts(self) -> dict[str, int]:
+        counts = {}
+        with self._lock:
+            for _, status, _, _ in self._jobs.values():
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def is_drained(self) -> bool:
+        counts = self.counts()
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+    def get_jobs(self, status: str) -> list[QueuedJob]:
+        with self._lock:
+            return [
+                entry[0] for entry in self._jobs.values() if entry[1] == status
+            ]
+
+
+def renew_lease(
+    queue, job: QueuedJob, interval_sec: float, stop: threading.Event
+) -> None:
+    while not stop.wait(interval_sec):
+        if not queue.heartbeat(job):
+            print(f"Lost the lease of job {job.job_id}: {job.url}")
+            return
+
+
+def run_worker(
+    queue,
+    targets: dict[str, StoreTarget],
+    worker_id: str,
+    output_dir: str = None,
+    heartbeat_sec: float = HEARTBEAT_SEC,
+    poll_sec: float = POLL_SEC,
+) -> dict[str, int]:
+    # Scrapes the leased jobs until the queue is drained. A worker that is
+    # interrupted keeps its lease until it expires, and the job is retried
+    # by another one.
+    finished = {DONE: 0, FAILED: 0}
+    while True:
+        job = queue.lease(worker_id)
+        if job is None:
+            if queue.is_drained():
+                break
+            time.sleep(poll_sec)
+            continue
+
+        print(
+            f"Job {job.job_id} ({job.store}, attempt {job.attempts}): {job.url}"
+        )
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=renew_lease,
+            args=(queue, job, heartbeat_sec, stop),
+            daemon=True,
+        )
+        heartbeat.start()
+        error = None
+        try:
+            target = targets.get(job.store)
+            if target is None:
+                error = f"Unknown store: {job.store}"
+            elif not target.scrape_url(job.url):
+                error = "Scraper failed"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if error is None:
+            recorded = queue.complete(job, output_dir)
+        else:
+            print(f"Job {job.job_id} failed: {error}")
+            recorded = queue.fail(job, error)
+        if recorded:
+            finished[DONE if error is None else FAILED] += 1
+        else:
+            # The lease expired and another worker took over the job
+            print(f"Lost the lease of job {job.job_id}: {job.url}")
+
+    print(
+        f"Worker {worker_id} finished {finished[DONE]} jobs, "
+        f"{finished[FAILED]} failed"
+    )
+    return finished
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Show the state of a shared scrape job queue"
+    )
+    parser.add_argument(
+        "queue", help="Job queue, e.g., /mnt/shared/jobs.sqlite"
+    )
+    parser.add_argument(
+        "--failed", action="store_true", help="List the failed jobs"
+    )
+    args = parser.parse_args()
+
+    with SQLiteJobQueue(args.queue) as queue:
+        counts = queue.counts()
+        for status in (PENDING, LEASED, DONE, FAILED):
+            print(f"{status:<8} {counts.get(status, 0):>6,}")
+        if args.failed:
+            for job in queue.get_jobs(FAILED):
+                print(f"{job.store:<8} {job.worker}  {job.error}  {job.url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import shutil
+
+import attr
+
+# Set by run_scraper.py --resume, inherited by the pool workers
+RESUME_ENV = "SCRAPER_RESUME"
+
+
+def get_journal_dir(root_dir: str) -> str:
+    return os.path.join(root_dir, "output", ".journal")
+
+
+def is_resuming() -> bool:
+    return bool(os.environ.get(RESUME_ENV))
+
+
+def reset_journal(root_dir: str) -> None:
+    shutil.rmtree(get_journal_dir(root_dir), ignore_errors=True)
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class JournalEntry:
+    # Checkpoint of a scraped URL, saved after every page and product
+
+    path: str = attr.ib()
+    url: str = attr.ib()
+    completed: bool = attr.ib(default=False)
+    last_page: int = attr.ib(default=0)
+    product_count: int = attr.ib(default=0)
+    rendered: set[str] = attr.ib(factory=set)
+
+    def save(self) -> None:
+        data = {
+            "url": self.url,
+            "completed": self.completed,
+            "last_page": self.last_page,
+            "product_count": self.product_count,
+            "rendered": sorted(self.rendered),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.path)
+
+    @property
+    def has_progress(self) -> bool:
+        return self.last_page > 0 or bool(self.rendered)
+
+    def is_rendered(self, product_url: str) -> bool:
+        return product_url in self.rendered
+
+    def mark_rendered(self, product_url: str, product_count: int) -> None:
+        self.rendered.add(product_url)
+        self.product_count = product_count
+        self.save()
+
+    def complete_page(self, page: int, product_count: int) -> None:
+        self.last_page = page
+        self.product_count = product_count
+        self.save()
+
+    def complete(self) -> None:
+        self.completed = True
+        self.save()
+
+
+def open_entry(root_dir: str, url: str) -> JournalEntry:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    path = os.path.join(get_journal_dir(root_dir), f"{key}.json")
+
+    if is_resuming() and os.path.isfile(path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            return JournalEntry(
+                path,
+                url,
+                completed=data["completed"],
+                last_page=data["last_page"],
+                product_count=data["product_count"],
+                rendered=set(data["rendered"]),
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Unable to read the journal of {url}: {e}")
+
+    return JournalEntry(path, url)
@@ -0,0 +1,165 @@
+import csv
+import os
+import threading
+import time
+
+import attr
+import psutil
+
+MAIN = "main"
+WORKER = "worker"
+CHROMEDRIVER = "chromedriver"
+CHROME = "chrome"
+OTHER = "other"
+PROCESS_KINDS = (MAIN, WORKER, CHROMEDRIVER, CHROME, OTHER)
+
+TIMELINE_FIELDS = ("timestamp", "pid", "kind", "rss", "pss")
+
+
+def classify_process(process: psutil.Process, root_pid: int) -> str:
+    if process.pid == root_pid:
+        return MAIN
+
+    name = process.name().lower()
+    if "chromedriver" in name:
+        return CHROMEDRIVER
+    if "chrome" in name or "chromium" in name:
+        return CHROME
+    if "python" in name:
+        return WORKER
+    return OTHER
+
+
+def read_process_memory(process: psutil.Process) -> tuple[int, int | None]:
+    # PSS splits the pages shared by the Chrome processes fairly, but it is
+    # only available on Linux, and needs the same user
+    try:
+        memory_info = process.memory_full_info()
+        return memory_info.rss, getattr(memory_info, "pss", None)
+    except psutil.AccessDenied:
+        return process.memory_info().rss, None
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class ProcessMemory:
+    pid: int = attr.ib()
+    kind: str = attr.ib()
+    peak_rss: int = attr.ib(default=0)
+    peak_pss: int = attr.ib(default=0)
+    samples: int = attr.ib(default=0)
+
+    def update(self, rss: int, pss: int | None) -> None:
+        self.peak_rss = max(self.peak_rss, rss)
+        if pss is not None:
+            self.peak_pss = max(self.peak_pss, pss)
+        self.samples += 1
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class MemorySampler:
+    # Periodically walks the process tree of the scraper, including the pool
+    # workers, chromedriver and Chrome processes
+
+    root_pid: int = attr.ib(factory=os.getpid)
+    interval_sec: float = attr.ib(default=1.0)
+    timeline_path: str = attr.ib(default=None)
+    processes: dict[int, ProcessMemory] = attr.ib(factory=dict, init=False)
+    # Peak of the sum over the processes of a kind, sampled at the same time
+    kind_peak_rss: dict[str, int] = attr.ib(factory=dict, init=False)
+    kind_peak_pss: dict[str, int] = attr.ib(factory=dict, init=False)
+    tree_peak_rss: int = attr.ib(default=0, init=False)
+    tree_peak_pss: int = attr.ib(default=0, init=False)
+    _stop_event: threading.Event = attr.ib(factory=threading.Event, init=False)
+    _thread: threading.Thread = attr.ib(default=None, init=False)
+
+    def start(self) -> None:
+        if self.timeline_path:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.timeline_path)),
+                exist_ok=True,
+            )
+            with open(
+                self.timeline_path, "w", newline="", encoding="utf-8"
+            ) as file:
+                csv.writer(file).writerow(TIMELINE_FIELDS)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            self.sample()
+            if self._stop_event.wait(self.interval_sec):
+                break
+
+    def sample(self) -> None:
+        try:
+            root = psutil.Process(self.root_pid)
+            tree = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+
+        timestamp = time.time()
+        rows = []
+        kind_rss = dict.fromkeys(PROCESS_KINDS, 0)
+        kind_pss = dict.fromkeys(PROCESS_KINDS, 0)
+
+        for process in tree:
+            try:
+                kind = classify_process(process, self.root_pid)
+                rss, pss = read_process_memory(process)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                continue
+
+            if process.pid not in self.processes:
+                self.processes[process.pid] = ProcessMemory(process.pid, kind)
+            self.processes[process.pid].update(rss, pss)
+
+            kind_rss[kind] += rss
+            kind_pss[kind] += pss or 0
+            rows.append((round(timestamp, 3), process.pid, kind, rss, pss))
+
+        for kind in PROCESS_KINDS:
+            self.kind_peak_rss[kind] = max(
+                self.kind_peak_rss.get(kind, 0), kind_rss[kind]
+            )
+            self.kind_peak_pss[kind] = max(
+                self.kind_peak_pss.get(kind, 0), kind_pss[kind]
+            )
+        self.tree_peak_rss = max(self.tree_peak_rss, sum(kind_rss.values()))
+        self.tree_peak_pss = max(self.tree_peak_pss, sum(kind_pss.values()))
+
+        if self.timeline_path and rows:
+            with open(
+                self.timeline_path, "a", newline="", encoding="utf-8"
+            ) as file:
+                csv.writer(file).writerows(rows)
+
+    def display_report(self) -> None:
+        mib = 1024 * 1024
+        print(
+            f"Memory peak of the process tree: "
+            f"RSS {self.tree_peak_rss / mib:,.1f} MB, "
+            f"PSS {self.tree_peak_pss / mib:,.1f} MB"
+        )
+        for kind in PROCESS_KINDS:
+            processes = [
+                process
+                for process in self.processes.values()
+                if process.kind == kind
+            ]
+            if not processes:
+                continue
+
+            largest = max(process.peak_rss for process in processes)
+            print(
+                f"  {kind:<13} {len(processes):>4} processes, "
+                f"peak total RSS {self.kind_peak_rss[kind] / mib:>9,.1f} MB, "
+                f"PSS {self.kind_peak_pss[kind] / mib:>9,.1f} MB, "
+                f"largest process RSS {largest / mib:>8,.1f} MB"
+            )
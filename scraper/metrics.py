@@ -0,0 +1,226 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+import attr
+
+from scraper import perf
+
+# Directory of the per-process counter snapshots, inherited by pool workers.
+# Counters are not recorded when it is not set.
+METRICS_DIR_ENV = "SCRAPER_METRICS_DIR"
+
+# Minimum time between two snapshots of the same process
+SNAPSHOT_INTERVAL_SEC = 1.0
+
+PAGES = "scraper_pages_total"
+PRODUCTS_SEEN = "scraper_products_seen_total"
+PRODUCTS_ACCEPTED = "scraper_products_accepted_total"
+IMAGES_DOWNLOADED = "scraper_images_downloaded_total"
+IMAGE_BYTES = "scraper_image_bytes_total"
+RENDERS = "scraper_renders_total"
+TASKS = "scraper_tasks_total"
+TASK_SECONDS = "scraper_task_seconds_total"
+RETRIES = "scraper_retries_total"
+FAILURES = "scraper_failures_total"
+THROTTLED = "scraper_throttled_total"
+EARLY_STOPS = "scraper_early_stops_total"
+
+COUNTERS = {
+    PAGES: "Listing pages processed",
+    PRODUCTS_SEEN: "Products found on the listing pages",
+    PRODUCTS_ACCEPTED: "Profitable products written to the output",
+    IMAGES_DOWNLOADED: "Product images downloaded",
+    IMAGE_BYTES: "Bytes of the downloaded product images",
+    RENDERS: "IG story images rendered",
+    TASKS: "Scraped sections, by result",
+    TASK_SECONDS: "Time spent scraping sections",
+    RETRIES: "Retried operations",
+    FAILURES: "Failed sections and operations",
+    THROTTLED: "Responses asking to slow down, 429 or 503",
+    EARLY_STOPS: "Price sorted listings left before their last page",
+}
+
+_counters: dict[tuple, float] = {}
+
+
+def _new_snapshot_id() -> str:
+    # A pool worker may get the PID of an earlier worker of the same run
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+_state = {
+    "pid": os.getpid(),
+    "snapshot_id": _new_snapshot_id(),
+    "last_snapshot": 0.0,
+}
+
+
+def is_enabled() -> bool:
+    return bool(os.environ.get(METRICS_DIR_ENV))
+
+
+def _check_process() -> None:
+    if _state["pid"] != os.getpid():
+        # Forked pool worker, the counters belong to the parent process
+        _counters.clear()
+        _state["pid"] = os.getpid()
+        _state["snapshot_id"] = _new_snapshot_id()
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if not is_enabled():
+        return
+
+    _check_process()
+
+    # Counters are labeled with the store being scraped by this process
+    labels.setdefault("store", perf.get_scope()[0] or "none")
+    key = (name, tuple(sorted(labels.items())))
+    _counters[key] = _counters.get(key, 0) + value
+
+    if time.monotonic() - _state["last_snapshot"] >= SNAPSHOT_INTERVAL_SEC:
+        flush()
+
+
+def _write_file(path: str, data: str) -> None:
+    # The readers never see a partially written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+def flush() -> None:
+    # Counters are cumulative, the snapshot of a process is overwritten
+    _check_process()
+    metrics_dir = os.environ.get(METRICS_DIR_ENV)
+    _state["last_snapshot"] = time.monotonic()
+    if not metrics_dir or not _counters:
+        return
+
+    os.makedirs(metrics_dir, exist_ok=True)
+    snapshot = [
+        [name, dict(labels), value]
+        for (name, labels), value in _counters.items()
+    ]
+    _write_file(
+        os.path.join(metrics_dir, f"{_state['snapshot_id']}.json"),
+        json.dumps(snapshot),
+    )
+
+
+def load_counters(metrics_dir: str) -> dict[tuple, float]:
+    counters = {}
+    for file_path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            with open(file_path, encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+
+        for name, labels, value in snapshot:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+    return counters
+
+
+def _escape(value) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def format_textfile(counters: dict[tuple, float], gauges: dict) -> str:
+    # Prometheus text format, read by the node-exporter textfile collector
+    lines = []
+    for name, help_text in COUNTERS.items():
+        samples = sorted(
+            (labels, value)
+            for (counter_name, labels), value in counters.items()
+            if counter_name == name
+        )
+        if not samples:
+            continue
+
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in samples:
+            lines.append(
+                f"{name}{_format_labels(labels)} {_format_value(value)}"
+            )
+
+    for name, (help_text, value) in gauges.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class MetricsExporter:
+    # Merges the snapshots of all processes into a textfile periodically
+
+    metrics_dir: str = attr.ib()
+    textfile_path: str = attr.ib()
+    interval_sec: float = attr.ib(default=5.0)
+    _start_time: float = attr.ib(factory=time.time, init=False)
+    _stop_event: threading.Event = attr.ib(factory=threading.Event, init=False)
+    _thread: threading.Thread = attr.ib(default=None, init=False)
+
+    def start(self) -> None:
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.textfile_path)), exist_ok=True
+        )
+        self.export(running=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        flush()
+        self.export(running=False)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval_sec):
+            self.export(running=True)
+
+    def export(self, running: bool) -> None:
+        now = time.time()
+        gauges = {
+            "scraper_running": (
+                "Whether a scraper run is in progress",
+                running,
+            ),
+            "scraper_run_start_timestamp_seconds": (
+                "Start time of the scraper run",
+                self._start_time,
+            ),
+            "scraper_last_update_timestamp_seconds": (
+                "Time of the last metrics update",
+                now,
+            ),
+        }
+        text = format_textfile(load_counters(self.metrics_dir), gauges)
+        _write_file(self.textfile_path, text)
@@ -0,0 +1,458 @@
+import argparse
+import functools
+import html
+import io
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import attr
+from PIL import Image
+
+# Hosts emulated by the server, requested as http://<server>/<host>/<path>
+FX_HOST = "rate.bot.com.tw"
+UPTHERE_HOST = "uptherestore.com"
+SUPPLY_HOST = "www.supplystore.com.au"
+CETTIRE_HOST = "www.cettire.com"
+CHEMIST_WAREHOUSE_HOST = "www.chemistwarehouse.com.au"
+
+UPTHERE_PAGE_SIZE = 48
+SUPPLY_PAGE_SIZE = 36
+CETTIRE_PAGE_SIZE = 48
+
+AUD_SPOT_SELLING_RATE = 20.61
+IMAGE_SIZE = (800, 1000)
+
+PRODUCT_ITEMS = (
+    "Track Pant",
+    "Pocket T-Shirt",
+    "Bedford Jacket",
+    "Fleece Crew",
+    "Cruiser Jacket",
+    "Loose Pant",
+    "Wool Cardigan",
+    "Oxford Shirt",
+    "Rib Knit Beanie",
+    "Wide Leg Trouser",
+    "Puffer Vest",
+    "Shoulder Bag",
+    "Card Holder",
+    "Leather Belt",
+)
+DISCOUNTS = (0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class StorefrontConfig:
+    # Number of products of every listing
+    products: int = attr.ib(default=500)
+    latency_ms: float = attr.ib(default=0)
+    jitter_ms: float = attr.ib(default=0)
+    # Fraction of requests answered with 503 Service Unavailable
+    failure_rate: float = attr.ib(default=0)
+    seed: int = attr.ib(default=0)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class MockProduct:
+    handle: str = attr.ib()
+    brand: str = attr.ib()
+    title: str = attr.ib()
+    original_price: int = attr.ib()
+    sale_price: int = attr.ib()
+
+
+@functools.lru_cache(maxsize=64)
+def generate_products(
+    listing: str, brand: str, count: int, price_range: tuple, seed: int
+) -> tuple[MockProduct, ...]:
+    # The same listing always gets the same catalog
+    rng = random.Random(zlib.crc32(listing.encode("utf-8")) ^ seed)
+    low, high = price_range
+    products = []
+    for index in range(count):
+        title = rng.choice(PRODUCT_ITEMS)
+        handle = f"{brand}-{title}-{index}".lower().replace(" ", "-")
+        original_price = rng.randrange(low, high, 5)
+        sale_price = round(original_price * (1 - rng.choice(DISCOUNTS)))
+        products.append(
+            MockProduct(handle, brand, title, original_price, sale_price)
+        )
+    return tuple(products)
+
+
+@functools.lru_cache(maxsize=1)
+def render_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", IMAGE_SIZE, (238, 236, 232)).save(
+        buffer, "JPEG", quality=85
+    )
+    return buffer.getvalue()
+
+
+def page_count(product_count: int, page_size: int) -> int:
+    return max(1, -(-product_count // page_size))
+
+
+def html_page(title: str, body: str) -> str:
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        f"<title>{html.escape(title)}</title></head><body>{body}</body></html>"
+    )
+
+
+def render_exchange_rate_page() -> str:
+    rows = [
+        ("American Dollar (USD)", 32.58),
+        ("Australian Dollar (AUD)", AUD_SPOT_SELLING_RATE),
+        ("Japanese Yen (JPY)", 0.2178),
+    ]
+    body = "".join(
+        '<tr><td class="currency"><div class="visible-phone print_hide">'
+        f'{name}</div></td><td data-table="Spot Selling">{rate}</td></tr>'
+        for name, rate in rows
+    )
+    return html_page("Exchange Rate", f"<table><tbody>{body}</tbody></table>")
+
+
+def render_upthere_listing(
+    base_url: str, products: tuple, page: int, total_pages: int
+) -> str:
+    items = []
+    for product in products:
+        image_path = f"/{UPTHERE_HOST}/cdn/shop/files/{product.handle}"
+        items.append(
+            f'<a class="product" href="/products/{product.handle}">'
+            '<div class="product__media">'
+            f'<img src="{image_path}-1.jpg" alt="{product.title}">'
+            f'<img src="{image_path}-2.jpg" alt="{product.title}"></div>'
+            '<div class="product__info"><div class="product__subtitle">'
+            f"<span>{product.brand}\n"
+            '<span class="product__colour">Black</span></span></div>'
+            f'<div class="product__title">{product.title}</div>'
+            '<div class="product__price price">'
+            f'<del class="price__amount">${product.original_price:,}.00</del> '
+            f'<ins class="price__amount">${product.sale_price:,}.00</ins>'
+            "</div></div></a>"
+        )
+
+    paging = ""
+    if total_pages > 1:
+        pages = "".join(
+            f'<li class="{"is-active" if number == page else ""}">'
+            f'<a href="?page={number}">{number}</a></li>'
+            for number in range(1, total_pages + 1)
+        )
+        paging = (
+            f'<div class="paging"><ul class="paging__list">{pages}'
+            '<li class="paging__next"><span>&rarr;</span></li></ul></div>'
+        )
+
+    return html_page(
+        "Sale - Up There",
+        '<main><select name="currency">'
+        '<option value="AUD" selected="selected">AUD</option>'
+        '<option value="USD">USD</option></select>'
+        f'<section class="product-grid">{"".join(items)}</section>{paging}'
+        "</main>",
+    )
+
+
+def render_supply_listing(
+    base_url: str, products: tuple, page: int, total_pages: int
+) -> str:
+    items = []
+    for product in products:
+        items.append(
+            '<form method="post" data-role="tocart-form">'
+            '<div class="product-item-photo"><img class="object-contain" '
+            f'src="{base_url}/{SUPPLY_HOST}/media/catalog/product/'
+            f'{product.handle}.jpg" alt="{product.title}"></div>'
+            f'<div class="product-itme-brand">{product.brand}</div>'
+            '<div class="product-item-name"><a class="product-item-link" '
+            f'href="{base_url}/{SUPPLY_HOST}/{product.handle}.html">'
+            f"{product.brand} {product.title}</a></div>"
+            '<div class="price-box"><span class="special-price">'
+            '<span class="price-label">As low as</span> '
+            f'<span class="price">${product.sale_price:,}.00</span></span>'
+            '<span class="old-price">'
+            '<span class="price-label">Regular Price</span> '
+            f'<span class="price">${product.original_price:,}.00</span>'
+            "</span></div></form>"
+        )
+
+    # Only the pages next to the current one are listed
+    labels = []
+    for number in range(max(1, page - 2), min(total_pages, page + 2) + 1):
+        if number == page:
+            labels.append(
+                '<li class="item current"><span class="sr-only label">'
+                "You're currently reading page</span>"
+                f'<span class="line-through">{number}</span></li>'
+            )
+        else:
+            labels.append(
+                f'<li class="item"><a href="?p={number}">'
+                '<span class="sr-only label">Page</span>'
+                f"<span>{number}</span></a></li>"
+            )
+
+    return html_page(
+        "Sale | Supply Store",
+        f'<main><section class="list-section">{"".join(items)}</section>'
+        '<div class="pages"><ul class="items pages-items">'
+        f'{"".join(labels)}</ul></div></main>',
+    )
+
+
+def render_cettire_listing(
+    base_url: str, products: tuple, page: int, total_pages: int
+) -> str:
+    items = []
+    for product in products:
+        items.append(
+            '<div class="_8T7q2GDqmgeWgJYhbInA1">'
+            f'<a href="/tw/products/{product.handle}">'
+            '<div><img class="_3P4L7mmfV3qp3D432lVyQu" '
+            f'src="{base_url}/{CETTIRE_HOST}/images/{product.handle}.jpg" '
+            f'alt="{product.title}"></div>'
+            f'<div class="_1tt3LMOZ50TX6rWCuwNDjK">{product.brand}</div>'
+            '<div class="_1EqhXd6FUIED0ndyLYSncV">'
+            f"{product.brand} {product.title}</div>"
+            '<div><span class="_2Jxa7Rj1Kswy2fPVXbctjY">'
+            f"${product.sale_price:,}</span>"
+            '<s class="E0_8CVj5Lnq3QKTQFJFQU">'
+            f"${product.original_price:,}</s></div></a></div>"
+        )
+
+    next_class = "button" if page < total_pages else "button button-disabled"
+    return html_page(
+        "Sale | Cettire",
+        f'<main><div>{"".join(items)}</div><ul class="pagination">'
+        '<li data-page="prev" class="button">Prev</li>'
+        f'<li data-page="next" class="{next_class}">Next</li></ul></main>'
+        '<footer><div class="_1G4j5iHnSBb-ZZ_YNTiSDP">'
+        '<a href="https://apps.apple.com/app/cettire/id1607489142">'
+        "Download the CETTIRE App</a></div>"
+        '<a class="_1-PLV2tu1YxtPyRZLO7LyG" '
+        'href="https://instagram.com/cettire" '
+        'title="Cettire on Instagram">IG</a></footer>',
+    )
+
+
+def render_chemist_warehouse_product(product_name: str, price: float) -> str:
+    return html_page(
+        f"{product_name} | Chemist Warehouse",
+        '<main><div class="productDetail"><div class="product-name">'
+        f"<h1>{html.escape(product_name)}</h1></div>"
+        f'<div class="product__price">${price:.2f}</div></div></main>',
+    )
+
+
+# (path prefix, renderer, page query parameter, page size, price range)
+LISTINGS = {
+    UPTHERE_HOST: (
+        "/collections/sale/",
+        render_upthere_listing,
+        "page",
+        UPTHERE_PAGE_SIZE,
+        (80, 1800),
+    ),
+    SUPPLY_HOST: (
+        "/sale/",
+        render_supply_listing,
+        "p",
+        SUPPLY_PAGE_SIZE,
+        (60, 1500),
+    ),
+    CETTIRE_HOST: (
+        "/tw/collections/sale/",
+        render_cettire_listing,
+        "page",
+        CETTIRE_PAGE_SIZE,
+        (1500, 60000),
+    ),
+}
+
+# (query parameter, value) sorting a listing by sale price, high to low
+PRICE_SORT_QUERIES = {CETTIRE_HOST: ("sortBy", "price_desc")}
+
+
+class StorefrontHandler(BaseHTTPRequestHandler):
+    server_version = "MockStorefront/1.0"
+
+    @property
+    def config(self) -> StorefrontConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body: bool) -> None:
+        config = self.config
+        delay_ms = config.latency_ms + random.uniform(
+            -config.jitter_ms, config.jitter_ms
+        )
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        if random.random() < config.failure_rate:
+            self.send_content(
+                503, "text/plain", b"Service Unavailable", send_body
+            )
+            return
+
+        response = self.route()
+        if response is None:
+            self.send_content(404, "text/plain", b"Not Found", send_body)
+        else:
+            self.send_content(200, *response, send_body)
+
+    def send_content(
+        self, status: int, content_type: str, body: bytes, send_body: bool
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def route(self) -> tuple[str, bytes] | None:
+        parts = urllib.parse.urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = urllib.parse.parse_qs(parts.query)
+
+        if path.endswith(".jpg"):
+            return "image/jpeg", render_image()
+
+        if host == FX_HOST and path == "/xrt":
+            page = render_exchange_rate_page()
+        elif host == CHEMIST_WAREHOUSE_HOST and path.startswith("/buy/"):
+            slug = path.rstrip("/").rsplit("/", 1)[-1]
+            product_name = slug.replace("-", " ").title()
+            page = render_chemist_warehouse_product(product_name, 19.99)
+        elif host in LISTINGS:
+            page = self.render_listing(host, path, query)
+        else:
+            page = None
+
+        if page is None:
+            return None
+        return "text/html; charset=utf-8", page.encode("utf-8")
+
+    def render_listing(self, host: str, path: str, query: dict) -> str | None:
+        prefix, render, page_parameter, page_size, price_range = LISTINGS[host]
+        if not path.startswith(prefix) or path == prefix:
+            return None
+
+        brand = urllib.parse.unquote(path[len(prefix) :].strip("/"))
+        products = generate_products(
+            host + path,
+            brand,
+            self.config.products,
+            price_range,
+            self.config.seed,
+        )
+        sort_parameter = PRICE_SORT_QUERIES.get(host)
+        if sort_parameter and query.get(sort_parameter[0]) == [
+            sort_parameter[1]
+        ]:
+            products = sorted(
+                products, key=lambda product: product.sale_price, reverse=True
+            )
+        total_pages = page_count(len(products), page_size)
+        try:
+            page = int(query.get(page_parameter, ["1"])[0])
+        except ValueError:
+            page = 1
+        page = min(max(page, 1), total_pages)
+
+        start = (page - 1) * page_size
+        base_url = f"http://{self.headers.get('Host', '')}"
+        return render(
+            base_url, products[start : start + page_size], page, total_pages
+        )
+
+
+def create_server(
+    host: str = "127.0.0.1", port: int = 8000, config: StorefrontConfig = None
+) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StorefrontHandler)
+    server.daemon_threads = True
+    server.config = config or StorefrontConfig()
+    return server
+
+
+def start_server_thread(server: ThreadingHTTPServer) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Local HTTP server emulating the store websites"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("-p", "--port", type=int, default=8000, help="Port")
+    parser.add_argument(
+        "-n",
+        "--products",
+        type=int,
+        default=500,
+        help="Number of products of every listing",
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0, help="Response latency"
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0, help="Random latency variation"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0,
+        help="Fraction of requests answered with 503, e.g., 0.05",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the synthetic catalogs"
+    )
+    args = parser.parse_args()
+
+    config = StorefrontConfig(
+        products=args.products,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, config)
+    print(f"Mock storefront: {get_server_url(server)}")
+    print(f"Run: python3 run_scraper.py --mock-store {get_server_url(server)}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Mock storefront stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import ctypes
+import os
+import shutil
+import sys
+import threading
+import uuid
+
+import attr
+
+STAGING_SUFFIX = ".staging"
+OLD_SUFFIX = ".old-"
+
+# renameat2() flag swapping two existing paths in one step, Linux 3.15+
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+
+def get_staging_dir(folder_path: str) -> str:
+    parent, name = os.path.split(os.path.normpath(folder_path))
+    return os.path.join(parent, f".{name}{STAGING_SUFFIX}")
+
+
+def get_old_dir(folder_path: str) -> str:
+    # Every old generation of a section shares the prefix swept on start
+    parent, name = os.path.split(os.path.normpath(folder_path))
+    return os.path.join(parent, f".{name}{OLD_SUFFIX}{uuid.uuid4().hex[:8]}")
+
+
+def retire_dir(path: str, folder_path: str) -> str:
+    # Renamed first, the name is free again while the files are deleted
+    old_path = get_old_dir(folder_path)
+    os.rename(path, old_path)
+    return old_path
+
+
+def delete_in_background(old_path: str) -> threading.Thread:
+    thread = threading.Thread(
+        target=shutil.rmtree,
+        args=(old_path,),
+        kwargs={"ignore_errors": True},
+        name=f"rmtree {os.path.basename(old_path)}",
+    )
+    thread.start()
+    return thread
+
+
+def sweep_old_dirs(folder_path: str) -> list[threading.Thread]:
+    # Generations left over by a process which exited while deleting them
+    parent, name = os.path.split(os.path.normpath(folder_path))
+    if not os.path.isdir(parent):
+        return []
+    return [
+        delete_in_background(os.path.join(parent, entry))
+        for entry in os.listdir(parent)
+        if entry.startswith(f".{name}{OLD_SUFFIX}")
+    ]
+
+
+def exchange_dirs(path: str, other_path: str) -> bool:
+    if sys.platform != "linux":
+        return False
+    renameat2 = getattr(ctypes.CDLL(None, use_errno=True), "renameat2", None)
+    if renameat2 is None:
+        return False
+    # Fails with EINVAL on file systems without support, e.g., some NFS
+    return (
+        renameat2(
+            AT_FDCWD,
+            os.fsencode(path),
+            AT_FDCWD,
+            os.fsencode(other_path),
+            RENAME_EXCHANGE,
+        )
+        == 0
+    )
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class OutputGeneration:
+    # A section is scraped into a hidden sibling directory, which replaces
+    # the previous output only once the section is complete. Readers of the
+    # output directory see either the previous or the new generation.
+
+    path: str = attr.ib()
+    staging_path: str = attr.ib()
+    # Deleting the previous generations, joined by tests
+    cleanups: list[threading.Thread] = attr.ib(factory=list)
+
+    def commit(self) -> None:
+        if not os.path.isdir(self.path):
+            os.rename(self.staging_path, self.path)
+        elif exchange_dirs(self.staging_path, self.path):
+            # The previous generation is now at the staging path
+            old_path = retire_dir(self.staging_path, self.path)
+            self.cleanups.append(delete_in_background(old_path))
+        else:
+            old_path = retire_dir(self.path, self.path)
+            os.rename(self.staging_path, self.path)
+            self.cleanups.append(delete_in_background(old_path))
+        print(f"Output generation swapped in: {self.path}")
+
+
+def open_generation(
+    folder_path: str, keep_existing: bool = False
+) -> OutputGeneration | None:
+    if os.path.exists(folder_path) and not os.path.isdir(folder_path):
+        print(f"Path is not a directory: {folder_path}")
+        return None
+
+    staging_path = get_staging_dir(folder_path)
+    cleanups = sweep_old_dirs(folder_path)
+    # The staging directory of an interrupted run is kept when resuming
+    if not keep_existing and os.path.lexists(staging_path):
+        old_path = retire_dir(staging_path, folder_path)
+        cleanups.append(delete_in_background(old_path))
+
+    os.makedirs(staging_path, exist_ok=True)
+    return OutputGeneration(folder_path, staging_path, cleanups)
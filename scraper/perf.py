@@ -0,0 +1,275 @@
+import contextlib
+import csv
+import functools
+import glob
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import attr
+import numpy as np
+
+# Directory of the per-process stage timing files, inherited by pool workers.
+# Stages are not recorded when it is not set.
+PERF_DIR_ENV = "SCRAPER_PERF_DIR"
+
+# Python heap peaks are recorded per stage when it is set, see
+# start_tracemalloc()
+TRACEMALLOC_ENV = "SCRAPER_TRACEMALLOC"
+
+RECORD_FIELDS = (
+    "pid",
+    "store",
+    "section",
+    "stage",
+    "start",
+    "duration",
+    "heap_peak",
+)
+
+# Number of buffered records written at once
+FLUSH_SIZE = 256
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class StageRecord:
+    pid: int = attr.ib(converter=int)
+    store: str = attr.ib()
+    section: str = attr.ib()
+    stage: str = attr.ib()
+    # Wall clock start time and duration, in seconds
+    start: float = attr.ib(converter=float)
+    duration: float = attr.ib(converter=float)
+    # Peak of the traced Python heap during the stage, in bytes
+    heap_peak: int = attr.ib(default=0, converter=int)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class StageSummary:
+    count: int = attr.ib()
+    p50: float = attr.ib()
+    p95: float = attr.ib()
+    total: float = attr.ib()
+    heap_peak: int = attr.ib(default=0)
+
+
+# Scope of the main thread, also used by the threads it starts, e.g. the
+# fetches of the watch list. The daemon worker thread sets its own.
+_scope = {"store": "", "section": ""}
+_thread_scope = threading.local()
+_records: list[StageRecord] = []
+# Heap peaks of the running nested stages of the main thread
+_heap_peaks: list[int] = []
+
+
+def set_scope(store: str, section: str = "") -> None:
+    # Store and section of the stages recorded next in this thread
+    _thread_scope.scope = (store, section)
+    if threading.current_thread() is threading.main_thread():
+        _scope["store"] = store
+        _scope["section"] = section
+
+
+def get_scope() -> tuple[str, str]:
+    return getattr(_thread_scope, "scope", (_scope["store"], _scope["section"]))
+
+
+def is_enabled() -> bool:
+    return bool(os.environ.get(PERF_DIR_ENV))
+
+
+def start_tracemalloc() -> None:
+    if os.environ.get(TRACEMALLOC_ENV) and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def record(
+    stage_name: str, start: float, duration: float, heap_peak: int = 0
+) -> None:
+    if not is_enabled():
+        return
+
+    store, section = get_scope()
+    _records.append(
+        StageRecord(
+            os.getpid(),
+            store,
+            section,
+            stage_name,
+            start,
+            duration,
+            heap_peak,
+        )
+    )
+    if len(_records) >= FLUSH_SIZE:
+        flush()
+
+
+def _enter_heap_stage() -> None:
+    # The peak seen so far belongs to the enclosing stage
+    peak = tracemalloc.get_traced_memory()[1]
+    if _heap_peaks:
+        _heap_peaks[-1] = max(_heap_peaks[-1], peak)
+    tracemalloc.reset_peak()
+    _heap_peaks.append(0)
+
+
+def _exit_heap_stage() -> int:
+    peak = max(_heap_peaks.pop(), tracemalloc.get_traced_memory()[1])
+    if _heap_peaks:
+        _heap_peaks[-1] = max(_heap_peaks[-1], peak)
+    tracemalloc.reset_peak()
+    return peak
+
+
+@contextlib.contextmanager
+def stage(stage_name: str):
+    # The traced peak is one for the whole process, stages of other threads
+    # would reset it under the stages of the main thread
+    trace_heap = (
+        tracemalloc.is_tracing()
+        and threading.current_thread() is threading.main_thread()
+    )
+    if trace_heap:
+        _enter_heap_stage()
+
+    start = time.time()
+    start_counter = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start_counter
+        heap_peak = _exit_heap_stage() if trace_heap else 0
+        record(stage_name, start, duration, heap_peak)
+
+
+def timed(stage_name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def flush() -> None:
+    # Pool workers are not shut down cleanly, flush after every task
+    perf_dir = os.environ.get(PERF_DIR_ENV)
+    if not perf_dir or not _records:
+        _records.clear()
+        return
+
+    os.makedirs(perf_dir, exist_ok=True)
+    file_path = os.path.join(perf_dir, f"{os.getpid()}.csv")
+    with open(file_path, "a", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        for stage_record in _records:
+            writer.writerow(attr.astuple(stage_record))
+    _records.clear()
+
+
+def load_records(perf_dir: str) -> list[StageRecord]:
+    records = []
+    for file_path in sorted(glob.glob(os.path.join(perf_dir, "*.csv"))):
+        with open(file_path, newline="", encoding="utf-8") as file:
+            for row in csv.reader(file):
+                if len(row) == len(RECORD_FIELDS):
+                    records.append(StageRecord(*row))
+    return records
+
+
+def summarize(
+    records: list[StageRecord],
+) -> dict[tuple[str, str, str], StageSummary]:
+    durations = {}
+    heap_peaks = {}
+    for stage_record in records:
+        key = (stage_record.store, stage_record.section, stage_record.stage)
+        durations.setdefault(key, []).append(stage_record.duration)
+        heap_peaks[key] = max(heap_peaks.get(key, 0), stage_record.heap_peak)
+
+    summary = {}
+    for key in sorted(durations):
+        values = np.asarray(durations[key])
+        p50, p95 = np.percentile(values, [50, 95])
+        summary[key] = StageSummary(
+            len(values),
+            float(p50),
+            float(p95),
+            float(values.sum()),
+            heap_peaks[key],
+        )
+    return summary
+
+
+def display_report(summary: dict[tuple[str, str, str], StageSummary]) -> None:
+    if not summary:
+        print("No stage timings recorded")
+        return
+
+    show_heap = any(result.heap_peak for result in summary.values())
+    heap_header = f" {'Heap peak (MB)':>15}" if show_heap else ""
+    print(
+        f"{'Store':<10} {'Section':<24} {'Stage':<20} "
+        f"{'Count':>7} {'p50 (s)':>9} {'p95 (s)':>9} {'Total (s)':>10}"
+        + heap_header
+    )
+    for (store, section, stage_name), result in summary.items():
+        heap_peak = (
+            f" {result.heap_peak / 1024 / 1024:>15.1f}" if show_heap else ""
+        )
+        print(
+            f"{store or '-':<10} {section or '-':<24} {stage_name:<20} "
+            f"{result.count:>7} {result.p50:>9.3f} {result.p95:>9.3f} "
+            f"{result.total:>10.2f}" + heap_peak
+        )
+
+
+def write_chrome_trace(records: list[StageRecord], trace_path: str) -> None:
+    # Trace Event Format, opened by Perfetto or chrome://tracing,
+    # one track per process
+    events = []
+    origin = min((stage_record.start for stage_record in records), default=0)
+    main_pid = os.getpid()
+
+    for pid in sorted({stage_record.pid for stage_record in records}):
+        process_name = "main" if pid == main_pid else f"worker {pid}"
+        events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": pid,
+                "args": {"name": process_name},
+            }
+        )
+
+    for stage_record in sorted(
+        records, key=lambda item: (item.pid, item.start)
+    ):
+        events.append(
+            {
+                "name": stage_record.stage,
+                "cat": stage_record.store or "scraper",
+                "ph": "X",
+                "ts": round((stage_record.start - origin) * 1_000_000),
+                "dur": round(stage_record.duration * 1_000_000),
+                "pid": stage_record.pid,
+                "tid": stage_record.pid,
+                "args": {
+                    "store": stage_record.store,
+                    "section": stage_record.section,
+                    "heap_peak": stage_record.heap_peak,
+                },
+            }
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+    with open(trace_path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+    print(f"Chrome trace saved: {trace_path}")
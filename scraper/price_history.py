@@ -0,0 +1,307 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import attr
+
+from scraper.catalog import CatalogEntry
+from scraper.pricing import ProductPricing
+
+# Run of run_scraper.py the recorded prices belong to, set by run_scraper.py
+# and inherited by the pool workers. Prices are not recorded when it is not
+# set.
+RUN_ID_ENV = "SCRAPER_RUN_ID"
+
+# Products are stored once, every price record refers to them by id. Records
+# are clustered by product, so that the history of a product is a range
+# scan, and indexed by run for comparing runs.
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "run_id INTEGER PRIMARY KEY, started REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS products ("
+    "product_id INTEGER PRIMARY KEY, store TEXT NOT NULL, "
+    "section TEXT NOT NULL, product_url TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS prices ("
+    "product_id INTEGER NOT NULL, run_id INTEGER NOT NULL, "
+    "original_price INTEGER, sale_price INTEGER, cost INTEGER, "
+    "selling_price INTEGER, exchange_rate REAL, "
+    "PRIMARY KEY (product_id, run_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS prices_run ON prices (run_id)",
+)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class PriceRecord:
+    store: str = attr.ib()
+    section: str = attr.ib()
+    product_url: str = attr.ib()
+    # Prices as listed by the store, in the store currency
+    original_price: int = attr.ib()
+    sale_price: int = attr.ib()
+    # Landed cost and selling price, in TWD
+    cost: int = attr.ib()
+    selling_price: int = attr.ib()
+    exchange_rate: float = attr.ib()
+
+    @classmethod
+    def from_pricing(
+        cls, entry: CatalogEntry, pricing: ProductPricing
+    ) -> "PriceRecord":
+        return cls(
+            entry.store,
+            entry.section,
+            entry.product_url,
+            entry.original_price,
+            entry.sale_price,
+            pricing.cost,
+            pricing.selling_price,
+            entry.exchange_rate,
+        )
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class PricePoint:
+    run_id: int = attr.ib()
+    started: float = attr.ib()
+    original_price: int = attr.ib()
+    sale_price: int = attr.ib()
+    cost: int = attr.ib()
+    selling_price: int = attr.ib()
+    exchange_rate: float = attr.ib()
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class PriceDrop:
+    store: str = attr.ib()
+    section: str = attr.ib()
+    product_url: str = attr.ib()
+    previous_price: int = attr.ib()
+    sale_price: int = attr.ib()
+
+    @property
+    def drop_percentage(self) -> float:
+        return (1 - self.sale_price / self.previous_price) * 100
+
+
+def get_history_path(root_dir: str) -> str:
+    return os.path.join(root_dir, "output", "price_history.sqlite")
+
+
+def get_run_id() -> int | None:
+    run_id = os.environ.get(RUN_ID_ENV)
+    return int(run_id) if run_id else None
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class PriceHistory:
+    # Append-only, one record per product per run
+
+    path: str = attr.ib()
+    _connection: sqlite3.Connection = attr.ib(default=None, init=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.path)), exist_ok=True
+            )
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            # Pool workers append while the others read
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def start_run(self, started: float = None) -> int:
+        cursor = self._connect().execute(
+            "INSERT INTO runs (started) VALUES (?)",
+            (time.time() if started is None else started,),
+        )
+        return cursor.lastrowid
+
+    def get_last_run_id(self) -> int | None:
+        row = self._connect().execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def append(self, run_id: int, records: list[PriceRecord]) -> None:
+        if not records:
+            return
+
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT OR IGNORE INTO products "
+                "(store, section, product_url) VALUES (?, ?, ?)",
+                [
+                    (record.store, record.section, record.product_url)
+                    for record in records
+                ],
+            )
+            # A product seen twice in a run, e.g. a page loaded again when
+            # resuming, keeps its first record
+            connection.executemany(
+                "INSERT OR IGNORE INTO prices "
+                "SELECT product_id, ?, ?, ?, ?, ?, ? "
+                "FROM products WHERE product_url = ?",
+                [
+                    (
+                        run_id,
+                        record.original_price,
+                        record.sale_price,
+                        record.cost,
+                        record.selling_price,
+                        record.exchange_rate,
+                        record.product_url,
+                    )
+                    for record in records
+                ],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_history(self, product_url: str) -> list[PricePoint]:
+        rows = self._connect().execute(
+            "SELECT prices.run_id, runs.started, original_price, sale_price, "
+            "cost, selling_price, exchange_rate "
+            "FROM products "
+            "JOIN prices ON prices.product_id = products.product_id "
+            "JOIN runs ON runs.run_id = prices.run_id "
+            "WHERE product_url = ? ORDER BY prices.run_id",
+            (product_url,),
+        )
+        return [PricePoint(*row) for row in rows]
+
+    def get_lowest_price(self, product_url: str) -> PricePoint | None:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT prices.run_id, runs.started, original_price, "
+                "sale_price, cost, selling_price, exchange_rate "
+                "FROM products "
+                "JOIN prices ON prices.product_id = products.product_id "
+                "JOIN runs ON runs.run_id = prices.run_id "
+                "WHERE product_url = ? "
+                "ORDER BY sale_price, prices.run_id LIMIT 1",
+                (product_url,),
+            )
+            .fetchone()
+        )
+        return None if row is None else PricePoint(*row)
+
+    def get_price_drops(
+        self, run_id: int = None, store: str = None
+    ) -> list[PriceDrop]:
+        # Products whose sale price in the run is lower than the last time
+        # they were seen, the last run by default
+        if run_id is None:
+            run_id = self.get_last_run_id()
+            if run_id is None:
+                return []
+
+        query = (
+            "SELECT store, section, product_url, previous.sale_price, "
+            "current.sale_price "
+            "FROM prices AS current "
+            "JOIN products ON products.product_id = current.product_id "
+            "JOIN prices AS previous "
+            "ON previous.product_id = current.product_id "
+            "AND previous.run_id = ("
+            "SELECT MAX(run_id) FROM prices "
+            "WHERE product_id = current.product_id "
+            "AND run_id < current.run_id) "
+            "WHERE current.run_id = ? "
+            "AND current.sale_price < previous.sale_price"
+        )
+        params = [run_id]
+        if store is not None:
+            query += " AND store = ?"
+            params.append(store)
+
+        drops = [
+            PriceDrop(*row) for row in self._connect().execute(query, params)
+        ]
+        drops.sort(key=lambda drop: drop.drop_percentage, reverse=True)
+        return drops
+
+
+def record_prices(path: str, records: list[PriceRecord]) -> None:
+    run_id = get_run_id()
+    if run_id is None or not records:
+        return
+
+    with PriceHistory(path) as history:
+        history.append(run_id, records)
+
+
+def display_history(history: list[PricePoint]) -> None:
+    for point in history:
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(point.started))
+        print(
+            f"Run {point.run_id:>5} {started}  "
+            f"price {point.original_price:>7,}  sale {point.sale_price:>7,}  "
+            f"cost {point.cost:>8,} TWD  "
+            f"selling price {point.selling_price or 0:>8,} TWD"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Query the price history of the scraped products"
+    )
+    parser.add_argument(
+        "database", help="Price history, e.g., output/price_history.sqlite"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--product", metavar="URL", help="Show the history of a product"
+    )
+    group.add_argument(
+        "--lowest", metavar="URL", help="Show the lowest price of a product"
+    )
+    group.add_argument(
+        "--drops",
+        action="store_true",
+        help="List the products whose price dropped in the last run",
+    )
+    parser.add_argument("-s", "--store", help="Only list drops of a store")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    with PriceHistory(args.database) as history:
+        if args.product:
+            display_history(history.get_history(args.product))
+        elif args.lowest:
+            lowest = history.get_lowest_price(args.lowest)
+            if lowest is None:
+                print(f"No price recorded for {args.lowest}")
+            else:
+                display_history([lowest])
+        else:
+            for drop in history.get_price_drops(store=args.store):
+                print(
+                    f"{drop.store:<8} {drop.section:<24} "
+                    f"{drop.previous_price:>7,} -> {drop.sale_price:>7,} "
+                    f"(-{drop.drop_percentage:.1f}%)  {drop.product_url}"
+                )
+    print(f"Query duration: {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
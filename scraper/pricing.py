@@ -0,0 +1,190 @@
+import attr
+import numpy as np
+
+from scraper import common
+from scraper import perf
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class ProductPricing:
+    original_price: int = attr.ib()
+    sale_price: int = attr.ib()
+    cost: int = attr.ib()
+    min_profit: int = attr.ib()
+    selling_price: int = attr.ib(default=None)
+    profit: int = attr.ib(default=None)
+    profit_margin: float = attr.ib(default=None)
+
+    @property
+    def is_profitable(self) -> bool:
+        return self.profit is not None and self.profit >= self.min_profit
+
+
+@attr.s(slots=True, frozen=True, repr=True, eq=True, hash=True)
+class PricingParams:
+    # Margin on top of the spot selling exchange rate
+    fx_margin: float = attr.ib(default=1.0)
+    # Sales tax included in the store price, deducted for export orders
+    gst_rate: float = attr.ib(default=0.0)
+    shipping_fee: int = attr.ib(default=0)
+    # Shipping is free from this sale price on, None if it is never free
+    free_shipping_threshold: int = attr.ib(default=None)
+    tw_import_duty_rate: float = attr.ib(default=1.0)
+    profit_rate: float = attr.ib(default=0.068)
+    max_profit: bool = attr.ib(default=False)
+    min_profit: int = attr.ib(default=500)
+
+    def convert_price(self, price: int, exchange_rate: float) -> int:
+        return round(price * (exchange_rate * self.fx_margin))
+
+    def calculate_cost(self, sale_price: int) -> int:
+        shipping_fee = self.shipping_fee
+        if (
+            self.free_shipping_threshold is not None
+            and sale_price >= self.free_shipping_threshold
+        ):
+            shipping_fee = 0
+
+        return round(
+            ((sale_price / (1 + self.gst_rate)) + shipping_fee)
+            * self.tw_import_duty_rate
+        )
+
+    def max_profit_bound(
+        self, sale_price: int, exchange_rate: float
+    ) -> int | None:
+        # Highest profit of any product whose sale price, in the store
+        # currency, is at most sale_price. None when there is none, the
+        # max_profit selling price grows with the original price.
+        if self.max_profit:
+            return None
+
+        sale_price = self.convert_price(sale_price, exchange_rate)
+        cost = self.calculate_cost(sale_price)
+        if (
+            self.free_shipping_threshold is not None
+            and sale_price >= self.free_shipping_threshold
+        ):
+            # Cheaper products pay for the shipping
+            cost = max(
+                cost, self.calculate_cost(self.free_shipping_threshold - 1)
+            )
+
+        # The profit grows with the cost, give or take the rounding of the
+        # selling price to a multiple of 20
+        selling_price = common.calculate_profitable_price(
+            cost, self.profit_rate
+        )
+        return selling_price - cost + 19
+
+    @perf.timed("pricing")
+    def evaluate(
+        self, original_price: int, sale_price: int, exchange_rate: float
+    ) -> ProductPricing:
+        # Prices are in the store currency, the result is in TWD
+        original_price = self.convert_price(original_price, exchange_rate)
+        sale_price = self.convert_price(sale_price, exchange_rate)
+        cost = self.calculate_cost(sale_price)
+
+        results = common.calculate_profit_margin(
+            cost, original_price, self.profit_rate, self.max_profit
+        )
+        if results is None:
+            return ProductPricing(
+                original_price, sale_price, cost, self.min_profit
+            )
+
+        selling_price, profit, profit_margin = results
+        return ProductPricing(
+            original_price,
+            sale_price,
+            cost,
+            self.min_profit,
+            selling_price,
+            profit,
+            profit_margin,
+        )
+
+    def evaluate_batch(
+        self, original_price, sale_price, exchange_rate
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return evaluate_batch(
+            original_price,
+            sale_price,
+            exchange_rate,
+            **attr.asdict(self),
+        )
+
+
+def evaluate_batch(
+    original_price,
+    sale_price,
+    exchange_rate,
+    fx_margin=1.0,
+    gst_rate=0.0,
+    shipping_fee=0,
+    free_shipping_threshold=None,
+    tw_import_duty_rate=1.0,
+    profit_rate=0.068,
+    max_profit=False,
+    min_profit=500,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Vectorized PricingParams.evaluate(), prices and pricing parameters are
+    # broadcast against each other. Returns the profit of every product and
+    # a mask of the products that meet the minimum profit.
+    if free_shipping_threshold is None:
+        free_shipping_threshold = np.inf
+
+    aud_to_twd = np.asarray(exchange_rate) * np.asarray(fx_margin)
+    original_price = np.rint(np.asarray(original_price) * aud_to_twd)
+    sale_price = np.rint(np.asarray(sale_price) * aud_to_twd)
+
+    shipping_fee = np.where(
+        sale_price >= np.asarray(free_shipping_threshold), 0, shipping_fee
+    )
+    cost = np.rint(
+        ((sale_price / (1 + np.asarray(gst_rate))) + shipping_fee)
+        * np.asarray(tw_import_duty_rate)
+    )
+
+    _, profit, _, profitable = common.calculate_profit_margin_batch(
+        cost, original_price, profit_rate, max_profit
+    )
+    accepted = profitable & (profit >= np.asarray(min_profit))
+
+    return profit, accepted
+
+
+UPTHERE_PRICING = PricingParams(
+    fx_margin=1.03,
+    gst_rate=0.1,  # Goods and Services Tax (GST) in Australia is 10%
+    shipping_fee=850,
+    tw_import_duty_rate=1.16,
+    profit_rate=0.11,
+    max_profit=True,
+    min_profit=500,
+)
+
+SUPPLY_PRICING = PricingParams(
+    fx_margin=1.03,
+    shipping_fee=850,
+    tw_import_duty_rate=1.16,
+    profit_rate=0.11,
+    max_profit=True,
+    min_profit=700,
+)
+
+# Prices on the Taiwan store are already in TWD
+CETTIRE_PRICING = PricingParams(
+    shipping_fee=700,
+    free_shipping_threshold=7000,
+    profit_rate=0.068,
+    max_profit=False,
+    min_profit=500,
+)
+
+STORE_PRICING = {
+    "upthere": UPTHERE_PRICING,
+    "supply": SUPPLY_PRICING,
+    "cettire": CETTIRE_PRICING,
+}
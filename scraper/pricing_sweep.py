@@ -0,0 +1,173 @@
+import argparse
+import time
+
+import attr
+import numpy as np
+
+from scraper import catalog
+from scraper import pricing
+
+SWEEP_PARAMS = (
+    "fx_margin",
+    "gst_rate",
+    "shipping_fee",
+    "free_shipping_threshold",
+    "tw_import_duty_rate",
+    "profit_rate",
+    "max_profit",
+    "min_profit",
+)
+
+# Upper bound of the (settings x products) arrays evaluated at once
+MAX_CHUNK_ELEMENTS = 2_000_000
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class SweepResult:
+    settings: dict[str, np.ndarray] = attr.ib()
+    accepted_count: np.ndarray = attr.ib()
+    total_profit: np.ndarray = attr.ib()
+
+    def __len__(self):
+        return len(self.total_profit)
+
+    def setting(self, index: int) -> dict:
+        return {name: values[index] for name, values in self.settings.items()}
+
+    def best(self, top: int = 10) -> np.ndarray:
+        # Indices of the settings with the highest total profit
+        order = np.lexsort((-self.accepted_count, -self.total_profit))
+        return order[:top]
+
+
+def build_grid(grid: dict[str, list]) -> dict[str, np.ndarray]:
+    # Cartesian product of the parameter values, one flat array per parameter
+    for name in grid:
+        if name not in SWEEP_PARAMS:
+            raise ValueError(f"Unknown pricing parameter: '{name}'")
+
+    names = list(grid)
+    mesh = np.meshgrid(
+        *[np.asarray(grid[name], dtype=np.float64) for name in names],
+        indexing="ij",
+    )
+    return {name: values.ravel() for name, values in zip(names, mesh)}
+
+
+def sweep(
+    products: catalog.Catalog,
+    base_params: pricing.PricingParams,
+    grid: dict[str, list],
+) -> SweepResult:
+    settings = build_grid(grid)
+    settings_count = len(next(iter(settings.values()))) if settings else 1
+
+    accepted_count = np.zeros(settings_count, dtype=np.int64)
+    total_profit = np.zeros(settings_count, dtype=np.int64)
+
+    chunk_size = max(1, MAX_CHUNK_ELEMENTS // max(1, len(products)))
+    params = attr.asdict(base_params)
+
+    for start in range(0, settings_count, chunk_size):
+        end = min(start + chunk_size, settings_count)
+
+        # Settings along the first axis, products along the second one
+        for name, values in settings.items():
+            params[name] = values[start:end, np.newaxis]
+
+        profit, accepted = pricing.evaluate_batch(
+            products.original_price,
+            products.sale_price,
+            products.exchange_rate,
+            **params,
+        )
+        profit = np.atleast_2d(profit)
+        accepted = np.atleast_2d(accepted)
+
+        accepted_count[start:end] = accepted.sum(axis=1)
+        total_profit[start:end] = np.where(accepted, profit, 0).sum(axis=1)
+
+    return SweepResult(settings, accepted_count, total_profit)
+
+
+def parse_values(values: list[str]) -> list[float]:
+    # "start:stop:num" is expanded to evenly spaced values
+    result = []
+    for value in values:
+        if ":" in value:
+            start, stop, num = value.split(":")
+            result.extend(np.linspace(float(start), float(stop), int(num)))
+        else:
+            result.append(float(value))
+    return result
+
+
+def display_sweep_report(
+    result: SweepResult, baseline: SweepResult, top: int = 10
+) -> None:
+    print(
+        f"Baseline: {baseline.accepted_count[0]} products, "
+        f"total profit ${baseline.total_profit[0]:,}"
+    )
+    print(f"Top {top} of {len(result)} settings:")
+
+    for rank, index in enumerate(result.best(top), start=1):
+        setting = ", ".join(
+            f"{name}={value:g}" for name, value in result.setting(index).items()
+        )
+        print(
+            f"{rank:>3}. {result.accepted_count[index]:>6} products, "
+            f"total profit ${result.total_profit[index]:>12,}  ({setting})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Evaluate pricing parameter grids over a saved catalog"
+    )
+    parser.add_argument(
+        "catalog",
+        nargs="+",
+        help="Catalog CSV files or directories, e.g., output/catalog",
+    )
+    parser.add_argument(
+        "-s",
+        "--store",
+        required=True,
+        choices=list(pricing.STORE_PRICING),
+        help="Store whose products and default pricing are used",
+    )
+    parser.add_argument(
+        "-t", "--top", type=int, default=10, help="Number of settings to show"
+    )
+    for name in SWEEP_PARAMS:
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            dest=name,
+            nargs="+",
+            metavar="VALUE",
+            help="Values to sweep, 'start:stop:num' for a range",
+        )
+    args = parser.parse_args()
+
+    products = catalog.load_catalog(args.catalog).filter_store(args.store)
+    print(f"Loaded {len(products)} {args.store} products")
+
+    base_params = pricing.STORE_PRICING[args.store]
+    grid = {
+        name: parse_values(getattr(args, name))
+        for name in SWEEP_PARAMS
+        if getattr(args, name)
+    }
+
+    start_time = time.perf_counter()
+    baseline = sweep(products, base_params, {})
+    result = sweep(products, base_params, grid)
+    execution_time = time.perf_counter() - start_time
+
+    display_sweep_report(result, baseline, args.top)
+    print(f"Sweep duration: {execution_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import email.utils
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import attr
+
+from scraper import metrics
+
+# SQLite database shared by the pool workers, set by run_scraper.py.
+# Requests are not paced when it is not set.
+RATE_LIMIT_DB_ENV = "SCRAPER_RATE_LIMIT_DB"
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class RateLimitPolicy:
+    # Requests per second of every host
+    initial_rate: float = attr.ib(default=2.0)
+    min_rate: float = attr.ib(default=0.2)
+    max_rate: float = attr.ib(default=20.0)
+    # Requests that can be sent at once after an idle period
+    burst: float = attr.ib(default=4.0)
+    # Additive increase after a fast response, multiplicative decrease
+    # after a throttled or slow one
+    increase: float = attr.ib(default=0.1)
+    decrease: float = attr.ib(default=0.5)
+    slow_decrease: float = attr.ib(default=0.9)
+    # A response is slow when its latency exceeds the fastest latency
+    # average seen for the host by this factor
+    latency_factor: float = attr.ib(default=3.0)
+    latency_smoothing: float = attr.ib(default=0.2)
+    # Pause when throttled without a Retry-After header
+    default_backoff_sec: float = attr.ib(default=5.0)
+
+
+def get_host(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc
+
+
+def parse_retry_after(value: str | None, now: float) -> float | None:
+    # Seconds to wait, from a delay in seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_time.timestamp() - now)
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class RateLimiter:
+    # Token bucket per host, kept in SQLite so that every process shares it
+
+    db_path: str = attr.ib()
+    policy: RateLimitPolicy = attr.ib(factory=RateLimitPolicy)
+    _connection: sqlite3.Connection = attr.ib(default=None, init=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.db_path, timeout=30, isolation_level=None
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "host TEXT PRIMARY KEY, rate REAL, tokens REAL, "
+                "updated REAL, blocked_until REAL, "
+                "latency REAL, min_latency REAL)"
+            )
+        return self._connection
+
+    def _load(self, connection: sqlite3.Connection, host: str, now: float):
+        row = connection.execute(
+            "SELECT rate, tokens, updated, blocked_until, latency, min_latency "
+            "FROM buckets WHERE host = ?",
+            (host,),
+        ).fetchone()
+        if row is None:
+            row = (self.policy.initial_rate, self.policy.burst, now, 0, 0, 0)
+            connection.execute(
+                "INSERT INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (host, *row),
+            )
+        return list(row)
+
+    def acquire(self, host: str) -> float:
+        # Blocks until a request to the host is allowed, returns the wait time
+        connection = self._connect()
+        waited = 0.0
+        while True:
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                rate, tokens, updated, blocked_until, _, _ = self._load(
+                    connection, host, now
+                )
+                tokens = min(self.policy.burst, tokens + (now - updated) * rate)
+                if now < blocked_until:
+                    wait_sec = blocked_until - now
+                elif tokens >= 1:
+                    tokens -= 1
+                    wait_sec = 0
+                else:
+                    wait_sec = (1 - tokens) / rate
+                connection.execute(
+                    "UPDATE buckets SET tokens = ?, updated = ? WHERE host = ?",
+                    (tokens, now, host),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+            if not wait_sec:
+                return waited
+            time.sleep(wait_sec)
+            waited += wait_sec
+
+    def report(
+        self,
+        host: str,
+        latency: float,
+        status_code: int | None = None,
+        retry_after: str | None = None,
+    ) -> float:
+        # Adapts the rate of the host to the response, returns the new rate
+        policy = self.policy
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rate, _, _, blocked_until, average, fastest = self._load(
+                connection, host, now
+            )
+            average = (
+                latency
+                if not average
+                else average + policy.latency_smoothing * (latency - average)
+            )
+            fastest = min(fastest, average) if fastest else average
+
+            if status_code in THROTTLE_STATUS_CODES:
+                rate *= policy.decrease
+                delay = parse_retry_after(retry_after, now)
+                if delay is None:
+                    delay = policy.default_backoff_sec
+                blocked_until = max(blocked_until, now + delay)
+                metrics.inc(metrics.THROTTLED, host=host)
+            elif average > fastest * policy.latency_factor:
+                rate *= policy.slow_decrease
+            else:
+                rate += policy.increase
+            rate = min(policy.max_rate, max(policy.min_rate, rate))
+
+            connection.execute(
+                "UPDATE buckets SET rate = ?, blocked_until = ?, "
+                "latency = ?, min_latency = ? WHERE host = ?",
+                (rate, blocked_until, average, fastest, host),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return rate
+
+    def rates(self) -> dict[str, float]:
+        rows = self._connect().execute("SELECT host, rate FROM buckets")
+        return {host: rate for host, rate in rows}
+
+
+# SQLite connections must not be shared with forked pool workers, nor
+# between threads
+_local = threading.local()
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    db_path = os.environ.get(RATE_LIMIT_DB_ENV)
+    if not db_path:
+        return None
+
+    limiter = getattr(_local, "limiter", None)
+    if (
+        getattr(_local, "pid", None) != os.getpid()
+        or limiter is None
+        or limiter.db_path != db_path
+    ):
+        limiter = RateLimiter(db_path)
+        _local.pid = os.getpid()
+        _local.limiter = limiter
+    return limiter
+
+
+def acquire(url: str) -> None:
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.acquire(get_host(url))
+
+
+def report(
+    url: str,
+    latency: float,
+    status_code: int | None = None,
+    retry_after: str | None = None,
+) -> None:
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.report(get_host(url), latency, status_code, retry_after)
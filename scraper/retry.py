@@ -0,0 +1,209 @@
+import random
+import time
+from http.client import IncompleteRead as HTTPIncompleteRead
+from typing import Callable, TypeVar
+
+import attr
+import requests
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+from urllib3.exceptions import IncompleteRead, ProtocolError
+
+from scraper import metrics
+
+T = TypeVar("T")
+
+DRIVER_CREATE = "driver_create"
+IMAGE_DOWNLOAD = "image_download"
+PAGE_LOAD = "page_load"
+STATIC_FETCH = "static_fetch"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_transient_http_error(e: Exception) -> bool:
+    # Client errors will fail again, except for throttling
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        status_code = e.response.status_code
+        return status_code >= 500 or status_code in (408, 429)
+    return True
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class RetryPolicy:
+    max_attempts: int = attr.ib(default=3)
+    # Exponential backoff with full jitter, the delay before retry n is
+    # drawn from [0, min(max_delay_sec, base_delay_sec * multiplier ** n)]
+    base_delay_sec: float = attr.ib(default=1.0)
+    max_delay_sec: float = attr.ib(default=30.0)
+    multiplier: float = attr.ib(default=2.0)
+    retry_on: tuple[type[BaseException], ...] = attr.ib(default=(Exception,))
+    retry_if: Callable[[Exception], bool] = attr.ib(default=None)
+    # Retries allowed in a process, besides a share of the calls, so that a
+    # failing dependency is not hammered with retries
+    budget_min_retries: int = attr.ib(default=10)
+    budget_ratio: float = attr.ib(default=0.2)
+    # Consecutive calls of the same key failing with retryable errors before
+    # the circuit opens, and how long calls fail fast before one is let
+    # through again. Permanent errors, e.g. 404, say nothing about the host.
+    failure_threshold: int = attr.ib(default=5)
+    reset_timeout_sec: float = attr.ib(default=60.0)
+
+    def get_delay(self, retry: int) -> float:
+        ceiling = min(
+            self.max_delay_sec, self.base_delay_sec * self.multiplier**retry
+        )
+        return random.uniform(0, ceiling)
+
+    def is_retryable(self, e: Exception) -> bool:
+        if not isinstance(e, self.retry_on):
+            return False
+        return self.retry_if is None or self.retry_if(e)
+
+
+POLICIES = {
+    DRIVER_CREATE: RetryPolicy(
+        max_attempts=3,
+        base_delay_sec=3,
+        retry_on=(WebDriverException, requests.exceptions.ConnectionError),
+        failure_threshold=6,
+    ),
+    IMAGE_DOWNLOAD: RetryPolicy(
+        max_attempts=4,
+        retry_on=(
+            IncompleteRead,
+            HTTPIncompleteRead,
+            ProtocolError,
+            requests.exceptions.RequestException,
+        ),
+        retry_if=is_transient_http_error,
+    ),
+    PAGE_LOAD: RetryPolicy(
+        max_attempts=3,
+        base_delay_sec=2,
+        retry_on=(
+            TimeoutException,
+            NoSuchElementException,
+            StaleElementReferenceException,
+            WebDriverException,
+        ),
+    ),
+    STATIC_FETCH: RetryPolicy(
+        max_attempts=3,
+        retry_on=(requests.exceptions.RequestException,),
+        retry_if=is_transient_http_error,
+    ),
+}
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class RetryBudget:
+    calls: int = attr.ib(default=0)
+    retries: int = attr.ib(default=0)
+
+    def can_retry(self, policy: RetryPolicy) -> bool:
+        return (
+            self.retries
+            < policy.budget_min_retries + policy.budget_ratio * self.calls
+        )
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class CircuitBreaker:
+    failure_threshold: int = attr.ib(default=5)
+    reset_timeout_sec: float = attr.ib(default=60.0)
+    failures: int = attr.ib(default=0)
+    opened_at: float = attr.ib(default=None)
+
+    @property
+    def is_open(self) -> bool:
+        # Half-open once the timeout has passed, a single failure opens it
+        # again
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at < self.reset_timeout_sec
+        )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+# Per process, pool workers start with their own
+_budgets: dict[str, RetryBudget] = {}
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def get_budget(operation: str) -> RetryBudget:
+    return _budgets.setdefault(operation, RetryBudget())
+
+
+def get_breaker(operation: str, key: str = "") -> CircuitBreaker:
+    breaker = _breakers.get((operation, key))
+    if breaker is None:
+        policy = POLICIES[operation]
+        breaker = CircuitBreaker(
+            policy.failure_threshold, policy.reset_timeout_sec
+        )
+        _breakers[(operation, key)] = breaker
+    return breaker
+
+
+def reset() -> None:
+    _budgets.clear()
+    _breakers.clear()
+
+
+def call(operation: str, func: Callable[[], T], key: str = "") -> T:
+    # Runs func with the retry policy of the operation, key separates the
+    # circuit breakers, e.g. per host
+    policy = POLICIES[operation]
+    budget = get_budget(operation)
+    breaker = get_breaker(operation, key)
+    budget.calls += 1
+
+    retry = 0
+    while True:
+        if breaker.is_open:
+            metrics.inc(metrics.FAILURES, operation=operation)
+            raise CircuitOpenError(
+                f"Too many failures of {operation} {key}".rstrip()
+            )
+
+        try:
+            result = func()
+        except Exception as e:
+            retry += 1
+            if not policy.is_retryable(e):
+                metrics.inc(metrics.FAILURES, operation=operation)
+                raise
+            if retry >= policy.max_attempts or not budget.can_retry(policy):
+                # One failure per call, however many attempts it made
+                breaker.record_failure()
+                metrics.inc(metrics.FAILURES, operation=operation)
+                raise
+
+            delay = policy.get_delay(retry - 1)
+            print(
+                f"{operation} failed({type(e).__name__}): {e}. "
+                f"attempt {retry}/{policy.max_attempts}, "
+                f"retrying in {delay:.1f}s..."
+            )
+            budget.retries += 1
+            metrics.inc(metrics.RETRIES, operation=operation)
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -0,0 +1,343 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+
+import attr
+
+# Schedule of the sale pages, set by run_scraper.py and inherited by the pool
+# workers. Visits are not recorded when it is not set.
+REVISIT_DB_ENV = "SCRAPER_REVISIT_DB"
+
+DAY_SEC = 24 * 60 * 60
+MIN_INTERVAL_SEC = 60 * 60
+MAX_INTERVAL_SEC = 7 * DAY_SEC
+# Older visits count less, so that a brand going on sale is noticed
+DECAY = 0.9
+# Changes per day of a page visited once, before its own rate is known
+PRIOR_RATE = 1.0
+# Pages that never changed are still visited now and then
+MIN_RATE = 0.01
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS pages ("
+    "url TEXT PRIMARY KEY, store TEXT NOT NULL, last_visit REAL, "
+    "interval REAL, visits REAL NOT NULL DEFAULT 0, "
+    "changes REAL NOT NULL DEFAULT 0, observed REAL NOT NULL DEFAULT 0, "
+    "content_hash TEXT, snapshot TEXT)",
+    "CREATE TABLE IF NOT EXISTS visits ("
+    "url TEXT NOT NULL, visited REAL NOT NULL, "
+    "new_products INTEGER NOT NULL, price_changes INTEGER NOT NULL, "
+    "removed_products INTEGER NOT NULL, unchanged INTEGER NOT NULL)",
+)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class PageVisit:
+    url: str = attr.ib()
+    visited: float = attr.ib()
+    new_products: int = attr.ib()
+    price_changes: int = attr.ib()
+    removed_products: int = attr.ib()
+    # Same content hash as the previous visit
+    unchanged: bool = attr.ib()
+
+    @property
+    def changed(self) -> bool:
+        # Sold out products are no new deals
+        return bool(self.new_products or self.price_changes)
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class PageStats:
+    url: str = attr.ib()
+    store: str = attr.ib()
+    last_visit: float = attr.ib()
+    interval: float = attr.ib()
+    # Decayed counts of the visits after the first one, of those which found
+    # changes, and of the seconds between them
+    visits: float = attr.ib()
+    changes: float = attr.ib()
+    observed: float = attr.ib()
+
+    @property
+    def change_rate(self) -> float | None:
+        # Changes per day. A visit only tells whether the page changed, not
+        # how many times, hence the estimator for Poisson changes from
+        # Cho and Garcia-Molina.
+        if self.visits <= 0 or self.observed <= 0:
+            return None
+        mean_interval_days = self.observed / self.visits / DAY_SEC
+        unchanged_ratio = (self.visits - self.changes + 0.5) / (
+            self.visits + 0.5
+        )
+        return -math.log(unchanged_ratio) / mean_interval_days
+
+
+def get_schedule_path(root_dir: str) -> str:
+    return os.path.join(root_dir, "output", "revisit.sqlite")
+
+
+def read_snapshot(catalog_path: str) -> dict[str, int]:
+    # Sale price of every product on a page, from its catalog
+    snapshot = {}
+    with open(catalog_path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            snapshot[row["product_url"]] = int(row["sale_price"])
+    return snapshot
+
+
+def hash_snapshot(snapshot: dict[str, int]) -> str:
+    content = json.dumps(sorted(snapshot.items()), separators=(",", ":"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def assign_intervals(
+    rates: dict[str, float], budget_per_day: float
+) -> dict[str, float]:
+    # Visits per day proportional to the square root of the change rate,
+    # the usual compromise between freshness and chasing pages that change
+    # faster than they can be visited, scaled to the budget
+    if not rates:
+        return {}
+
+    weights = {
+        url: math.sqrt(max(rate, MIN_RATE)) for url, rate in rates.items()
+    }
+    min_frequency = DAY_SEC / MAX_INTERVAL_SEC
+    max_frequency = DAY_SEC / MIN_INTERVAL_SEC
+
+    def frequencies(scale: float) -> dict[str, float]:
+        return {
+            url: min(max(scale * weight, min_frequency), max_frequency)
+            for url, weight in weights.items()
+        }
+
+    low, high = 0.0, max_frequency / min(weights.values())
+    for _ in range(50):
+        scale = (low + high) / 2
+        if sum(frequencies(scale).values()) > budget_per_day:
+            high = scale
+        else:
+            low = scale
+
+    return {
+        url: DAY_SEC / frequency for url, frequency in frequencies(low).items()
+    }
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class RevisitScheduler:
+    path: str = attr.ib()
+    _connection: sqlite3.Connection = attr.ib(default=None, init=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.path)), exist_ok=True
+            )
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+            # Pool workers record their visits while the others read
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get_stats(self, url: str) -> PageStats | None:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT url, store, last_visit, interval, visits, changes, "
+                "observed FROM pages WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+        return None if row is None else PageStats(*row)
+
+    def get_all_stats(self) -> list[PageStats]:
+        rows = self._connect().execute(
+            "SELECT url, store, last_visit, interval, visits, changes, "
+            "observed FROM pages ORDER BY store, url"
+        )
+        return [PageStats(*row) for row in rows]
+
+    def observe(
+        self, store: str, url: str, snapshot: dict[str, int], now: float = None
+    ) -> PageVisit:
+        # Compares the products of a scraped page with the previous visit
+        now = time.time() if now is None else now
+        content_hash = hash_snapshot(snapshot)
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT last_visit, visits, changes, observed, content_hash, "
+                "snapshot FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None or row[5] is None:
+                # First visit, nothing to compare with
+                visit = PageVisit(url, now, len(snapshot), 0, 0, False)
+                visits = changes = observed = 0.0
+            else:
+                last_visit, visits, changes, observed, last_hash, previous = row
+                previous = json.loads(previous)
+                visit = PageVisit(
+                    url,
+                    now,
+                    sum(1 for product in snapshot if product not in previous),
+                    sum(
+                        1
+                        for product, price in snapshot.items()
+                        if product in previous and previous[product] != price
+                    ),
+                    sum(1 for product in previous if product not in snapshot),
+                    content_hash == last_hash,
+                )
+                visits = visits * DECAY + 1
+                changes = changes * DECAY + visit.changed
+                observed = observed * DECAY + max(now - last_visit, 0)
+
+            connection.execute(
+                "INSERT INTO pages (url, store, last_visit, visits, changes, "
+                "observed, content_hash, snapshot) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET store = excluded.store, "
+                "last_visit = excluded.last_visit, visits = excluded.visits, "
+                "changes = excluded.changes, observed = excluded.observed, "
+                "content_hash = excluded.content_hash, "
+                "snapshot = excluded.snapshot",
+                (
+                    url,
+                    store,
+                    now,
+                    visits,
+                    changes,
+                    observed,
+                    content_hash,
+                    json.dumps(snapshot),
+                ),
+            )
+            connection.execute(
+                "INSERT INTO visits VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    now,
+                    visit.new_products,
+                    visit.price_changes,
+                    visit.removed_products,
+                    visit.unchanged,
+                ),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return visit
+
+    def plan(
+        self,
+        store_urls: dict[str, list[str]],
+        budget_per_day: float,
+        now: float = None,
+    ) -> dict[str, list[str]]:
+        # Assigns every page its interval within the budget of page visits
+        # per day, returns the pages due per store
+        now = time.time() if now is None else now
+        stats = {}
+        for urls in store_urls.values():
+            for url in urls:
+                stats[url] = self.get_stats(url)
+
+        known_rates = sorted(
+            page.change_rate
+            for page in stats.values()
+            if page is not None and page.change_rate is not None
+        )
+        # Pages seen once are expected to change like the others
+        prior_rate = (
+            known_rates[len(known_rates) // 2] if known_rates else PRIOR_RATE
+        )
+        rates = {}
+        for url, page in stats.items():
+            rate = None if page is None else page.change_rate
+            rates[url] = prior_rate if rate is None else rate
+        intervals = assign_intervals(rates, budget_per_day)
+
+        connection = self._connect()
+        connection.executemany(
+            "UPDATE pages SET interval = ? WHERE url = ?",
+            [(interval, url) for url, interval in intervals.items()],
+        )
+
+        due_urls = {}
+        for store, urls in store_urls.items():
+            due_urls[store] = [
+                url
+                for url in urls
+                if stats[url] is None
+                or stats[url].last_visit is None
+                or now - stats[url].last_visit >= intervals[url]
+            ]
+        return due_urls
+
+
+def record_visit(store: str, url: str, catalog_path: str) -> None:
+    path = os.environ.get(REVISIT_DB_ENV)
+    if not path or not catalog_path or not os.path.exists(catalog_path):
+        return
+
+    with RevisitScheduler(path) as scheduler:
+        visit = scheduler.observe(store, url, read_snapshot(catalog_path))
+    print(
+        f"Changes since the previous visit: {visit.new_products} new, "
+        f"{visit.price_changes} price changes, "
+        f"{visit.removed_products} removed"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Show the revisit schedule of the sale pages"
+    )
+    parser.add_argument(
+        "database", help="Revisit schedule, e.g., output/revisit.sqlite"
+    )
+    args = parser.parse_args()
+
+    now = time.time()
+    with RevisitScheduler(args.database) as scheduler:
+        for page in scheduler.get_all_stats():
+            rate = page.change_rate
+            line = f"{page.store:<8} changes/day "
+            line += "     ?" if rate is None else f"{rate:>6.2f}"
+            if page.interval is not None:
+                next_visit = page.last_visit + page.interval - now
+                line += (
+                    f"  interval {page.interval / 3600:>6.1f} h"
+                    f"  next in {max(next_visit, 0) / 3600:>6.1f} h"
+                )
+            print(f"{line}  {page.url}")
+
+
+if __name__ == "__main__":
+    main()
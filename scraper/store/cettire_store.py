@@ -1,5 +1,4 @@
 import os
-import shutil
 import time
 import urllib.parse
 
@@ -11,18 +10,34 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from scraper import catalog
 from scraper import common
 from scraper import image_editor
+from scraper import journal
+from scraper import metrics
+from scraper import output_generation
+from scraper import perf
+from scraper import price_history
+from scraper import retry
 from scraper.chrome_driver import WebDriverAction
 from scraper.exceptions import ElementNotFound, InvalidInputError
 from scraper.image_editor import ImageProcessingError
+from scraper.pricing import CETTIRE_PRICING
+from scraper.store import sorted_listing
+from scraper.store.product_extractor import ProductNode, walk_product
 from scraper.store.store_info import OutputInfo, ProductInfo
 
+STORE_URL = "https://www.cettire.com"
+SALE_PATH = "/tw/collections/sale/"
+# Listings sorted by sale price, high to low, for stopping early
+PRICE_SORT_QUERY = "sortBy=price_desc"
+
 
 def gen_store_sale_url(brand: str, category: str = "") -> str:
     if brand:
         url = (
-            "https://www.cettire.com/tw/collections/sale/"
+            common.get_site_url(STORE_URL)
+            + SALE_PATH
             + urllib.parse.quote(brand)
         )
 
@@ -72,10 +87,54 @@ def product_price_parser(price_string: str) -> int | None:
     return None
 
 
+PRODUCT_ELEMENTS = {
+    ("a", ""),
+    ("img", "_3P4L7mmfV3qp3D432lVyQu"),
+    ("div", "_1tt3LMOZ50TX6rWCuwNDjK"),
+    ("div", "_1EqhXd6FUIED0ndyLYSncV"),
+    ("span", "_2Jxa7Rj1Kswy2fPVXbctjY"),
+    ("s", "E0_8CVj5Lnq3QKTQFJFQU"),
+}
+
+
+def parse_product_details(node: ProductNode) -> tuple[list[str], str, str]:
+    # Find the first image URL
+    try:
+        image_urls = [node.first("img", "_3P4L7mmfV3qp3D432lVyQu")["src"]]
+    except (AttributeError, TypeError):
+        print("Image source not found")
+        raise
+
+    # Find the brand
+    try:
+        brand = node.first("div", "_1tt3LMOZ50TX6rWCuwNDjK").text.strip()
+    except (AttributeError, TypeError):
+        print("Brand not found")
+        raise
+
+    # Find the title
+    try:
+        title = (
+            node.first("div", "_1EqhXd6FUIED0ndyLYSncV")
+            .text.strip()
+            .replace('"', "'")
+        )
+        if brand in title:
+            title = title.replace(brand, "").strip()
+    except (AttributeError, TypeError):
+        print("Title not found")
+        raise
+
+    return image_urls, brand, title
+
+
+@perf.timed("process_page")
 def product_info_processor(
     page_source, output_info: OutputInfo, exchange_rate: float
 ):
-    soup = BeautifulSoup(page_source, "html.parser")
+    metrics.inc(metrics.PAGES)
+    with perf.stage("parse"):
+        soup = BeautifulSoup(page_source, "html.parser")
 
     product_element_class = "_8T7q2GDqmgeWgJYhbInA1"
     product_elements = soup.find_all("div", class_=product_element_class)
@@ -84,85 +143,73 @@ def product_info_processor(
         print("Product info not found")
         raise ElementNotFound("Product info not found")
 
-    for element in product_elements:
-        anchor_element = element.find("a")
-        product_url = "https://www.cettire.com" + anchor_element["href"]
-
-        # Find the first image URL
-        image_urls = []
-        image1_element = element.find("img", class_="_3P4L7mmfV3qp3D432lVyQu")
-        try:
-            image_urls.append(image1_element["src"])
-        except (AttributeError, TypeError):
-            print("Image source not found")
-            raise
-
-        # Find the brand
-        brand_element = element.find("div", class_="_1tt3LMOZ50TX6rWCuwNDjK")
-        try:
-            brand = brand_element.text.strip()
-        except (AttributeError, TypeError):
-            print("Brand not found")
-            raise
+    catalog_entries = []
+    price_records = []
+    store_url = common.get_site_url(STORE_URL)
 
-        # Find the title
-        title_element = element.find("div", class_="_1EqhXd6FUIED0ndyLYSncV")
-        try:
-            title = title_element.text.strip().replace('"', "'")
-            if brand in title:
-                title = title.replace(brand, "").strip()
-        except (AttributeError, TypeError):
-            print("Title not found")
-            raise
+    for element in product_elements:
+        node = walk_product(element, PRODUCT_ELEMENTS)
+        product_url = store_url + node.first("a", "")["href"]
 
         # Find the sale price
-        sale_price_element = element.find(
-            "span", class_="_2Jxa7Rj1Kswy2fPVXbctjY"
-        )
         try:
-            sale_price = sale_price_element.text.strip()
+            sale_price = node.first(
+                "span", "_2Jxa7Rj1Kswy2fPVXbctjY"
+            ).text.strip()
         except (AttributeError, TypeError):
             print("Sale Price not found")
             raise
 
         # Find the regular price
-        original_price_element = element.find(
-            "s", class_="E0_8CVj5Lnq3QKTQFJFQU"
-        )
         try:
-            original_price = original_price_element.text.strip()
+            original_price = node.first(
+                "s", "E0_8CVj5Lnq3QKTQFJFQU"
+            ).text.strip()
         except (AttributeError, TypeError):
             original_price = sale_price  # Regular Price not found
 
         # Parse price string to int
-        original_price = round(
-            product_price_parser(original_price) * exchange_rate
+        original_price = product_price_parser(original_price)
+        sale_price = product_price_parser(sale_price)
+        catalog_entries.append(
+            catalog.CatalogEntry(
+                output_info.store_name,
+                output_info.group,
+                product_url,
+                original_price,
+                sale_price,
+                exchange_rate,
+            )
         )
-        sale_price = round(product_price_parser(sale_price) * exchange_rate)
-
-        shipping_fee = 700 if sale_price < 7000 else 0
-        cost = sale_price + shipping_fee
-
-        results = common.calculate_profit_margin(cost, original_price)
-        if results is None:
-            continue  # unprofitable
+        metrics.inc(metrics.PRODUCTS_SEEN)
 
-        selling_price, profit, profit_margin = results
+        pricing = CETTIRE_PRICING.evaluate(
+            original_price, sale_price, exchange_rate
+        )
+        price_records.append(
+            price_history.PriceRecord.from_pricing(catalog_entries[-1], pricing)
+        )
+        if not pricing.is_profitable:
+            continue
 
-        if profit < 500:
+        if output_info.is_rendered(product_url):
             continue
 
+        # Only the accepted products are worth the other fields
+        image_urls, brand, title = parse_product_details(node)
+
         output_info.product_count += 1
+        metrics.inc(metrics.PRODUCTS_ACCEPTED)
         product_info = ProductInfo(
             index=output_info.product_count,
             brand=brand,
             title=title,
-            original_price=original_price,
-            sale_price=sale_price,
-            cost=cost,
-            selling_price=selling_price,
-            profit=profit,
-            profit_margin=profit_margin,
+            original_price=pricing.original_price,
+            sale_price=pricing.sale_price,
+            cost=pricing.cost,
+            selling_price=pricing.selling_price,
+            profit=pricing.profit,
+            profit_margin=pricing.profit_margin,
             image_urls=image_urls,
             product_url=product_url,
         )
@@ -184,9 +231,11 @@ def product_info_processor(
                     product_info.image_insert_text,
                     product_info.image_strikethrough_line_index,
                     product_info.image_strikethrough_text,
+                    output_info.image_max_width,
                 )
 
             product_info.product_info_logging(output_info.output_dir)
+            output_info.mark_rendered(product_url)
         except (
             InvalidInputError,
             HTTPError,
@@ -194,11 +243,32 @@ def product_info_processor(
             FileNotFoundError,
             OSError,
             ImageProcessingError,
+            retry.CircuitOpenError,
         ) as e:
             print(f"Product image processing failed: {e}")
             raise
 
+    if output_info.catalog_path:
+        catalog.append_catalog_entries(
+            output_info.catalog_path, catalog_entries
+        )
+    output_info.record_prices(price_records)
+    output_info.add_listed_prices(
+        [entry.sale_price for entry in catalog_entries]
+    )
+
+
+def is_next_button_active(page_source) -> bool:
+    soup = BeautifulSoup(page_source, "html.parser")
+    next_button = soup.find("li", attrs={"data-page": "next"})
+    return (
+        False
+        if next_button and "button-disabled" in next_button.get("class", [])
+        else True
+    )
 
+
+@perf.timed("wait_for_page_load")
 def wait_for_page_load(driver: webdriver, timeout=10):
     WebDriverAction.scroll_page_by_step(driver)
     # wait for the website to fully load
@@ -278,35 +348,39 @@ def start_scraping(
     output_info: OutputInfo,
     exchange_rate: float,
 ):
-    def is_next_button_active(page_source) -> bool:
-        soup = BeautifulSoup(page_source, "html.parser")
-        next_button = soup.find("li", attrs={"data-page": "next"})
-        return (
-            False
-            if next_button and "button-disabled" in next_button.get("class", [])
-            else True
+    # When resuming, the last scraped page is loaded again only to find out
+    # whether there is a next page
+    total_pages = max(1, output_info.next_page - 1)
+
+    if sorted_listing.is_enabled():
+        url = sorted_listing.sort_url(url, PRICE_SORT_QUERY)
+        output_info.sorted_listing = sorted_listing.SortedListing(
+            CETTIRE_PRICING, exchange_rate
         )
 
-    total_pages = 1
-
-    driver.get(url)
-    wait_for_page_load(driver)
-    product_info_processor(driver.page_source, output_info, exchange_rate)
-    if not is_next_button_active(driver.page_source):
-        return total_pages
-
-    total_pages = 2
     while True:
-        if "?" in url:
-            new_url = url + f"&page={total_pages}"
+        if total_pages == 1:
+            page_url = url
+        elif "?" in url:
+            page_url = url + f"&page={total_pages}"
         else:
-            new_url = url + f"?page={total_pages}"
+            page_url = url + f"?page={total_pages}"
 
-        driver.get(new_url)
-        wait_for_page_load(driver)
-        product_info_processor(driver.page_source, output_info, exchange_rate)
+        WebDriverAction.load_page(driver, page_url, wait_for_page_load)
+        if total_pages >= output_info.next_page:
+            product_info_processor(
+                driver.page_source, output_info, exchange_rate
+            )
+            output_info.complete_page(total_pages)
         if not is_next_button_active(driver.page_source):
             return total_pages
+        if output_info.can_stop_paginating:
+            print(
+                "No product on the next pages can meet the minimum profit, "
+                f"stop at page {total_pages}"
+            )
+            metrics.inc(metrics.EARLY_STOPS)
+            return total_pages
         total_pages += 1
 
 
@@ -317,7 +391,7 @@ def web_scraper(
         return False
 
     store_name = "cettire"
-    store_url_prefix = "https://www.cettire.com/tw"
+    store_url_prefix = common.get_site_url(STORE_URL) + "/tw"
 
     if not url.startswith(store_url_prefix):
         print(
@@ -335,28 +409,35 @@ def web_scraper(
 
     section = get_brand_name_from_url(url)
     print(f"Section: {section}")
+    perf.set_scope(store_name, section)
 
-    folder_path = os.path.join(root_dir, "output", store_name, section)
-
-    # Clean up the old output directory
-    if os.path.exists(folder_path):
-        if os.path.isdir(folder_path):
-            shutil.rmtree(folder_path)
-        else:
-            print(f"Path is not a directory: {folder_path}")
-            return False
+    journal_entry = journal.open_entry(root_dir, url)
+    if journal_entry.completed:
+        print(f"Already scraped, skip: {url}")
+        return True
 
-    os.makedirs(folder_path)
+    folder_path = os.path.join(root_dir, "output", store_name, section)
+    generation = output_generation.open_generation(
+        folder_path, keep_existing=journal_entry.has_progress
+    )
+    if generation is None:
+        return False
 
     product_image_bg_color = (255, 255, 255)  # default is white
     output_info = OutputInfo(
         store_name=store_name,
         group=section,
-        output_dir=folder_path,
+        output_dir=generation.staging_path,
         font_path=font_path,
         image_background_color=product_image_bg_color,
+        catalog_path=catalog.get_catalog_path(root_dir, store_name, section),
+        price_history_path=price_history.get_history_path(root_dir),
+        product_count=journal_entry.product_count,
+        journal_entry=journal_entry,
     )
     output_info.display_info()
+    if not journal_entry.has_progress:
+        catalog.reset_catalog(output_info.catalog_path)
     result = True
 
     try:
@@ -366,6 +447,9 @@ def web_scraper(
             f"\nTotal pages: {total_pages}\n"
             f"Total valid products: {output_info.product_count}"
         )
+        generation.commit()
+        journal_entry.complete()
+        output_info.record_visit(url)
 
     except TimeoutException:
         print("Element waiting timeout error")
@@ -381,6 +465,7 @@ def web_scraper(
 
     if not output_info.product_count:
         common.delete_empty_folders(folder_path)
+        common.delete_empty_folders(generation.staging_path)
 
     print(
         "------------------------------------------------------------------------\n"
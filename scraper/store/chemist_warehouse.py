@@ -1,13 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import attr
 import requests
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from scraper import common
+from scraper import perf
+from scraper.chrome_driver import WebDriverAction
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
 
+STORE_URL = "https://www.chemistwarehouse.com.au"
+
+# Products at or below this price are worth reselling
+PROFITABLE_MAX_PRICE_TWD = 650
+
+
+def parse_product_page(page_source) -> tuple[str | None, float | None]:
+    soup = BeautifulSoup(page_source, 'html.parser')
+
+    product_name = None
+    product_name_element = soup.find('div', class_='product-name')
+    if product_name_element and product_name_element.h1:
+        product_name = product_name_element.h1.text.strip()
+
+    product_price = None
+    price_element = soup.find(class_="product__price")
+    if price_element:
+        try:
+            product_price = float(price_element.text.strip().replace('$', '').replace(',', ''))
+        except ValueError:
+            pass
+
+    return product_name, product_price
+
+
+@perf.timed("wait_for_page_load")
 def wait_for_page_load(driver: webdriver, timeout=10):
     try:
         WebDriverWait(driver, timeout).until(
@@ -19,7 +50,7 @@ def wait_for_page_load(driver: webdriver, timeout=10):
 
 def web_scraper(driver: webdriver, url: str, root_dir: str, font_path: str) -> bool:
     store_name = "chemist warehouse"
-    store_url_prefix = "https://www.chemistwarehouse.com.au"
+    store_url_prefix = common.get_site_url(STORE_URL)
 
     if not url.startswith(store_url_prefix):
         print(f"URL is valid, but it does not belong to the {store_name} store website.")
@@ -38,24 +69,18 @@ def web_scraper(driver: webdriver, url: str, root_dir: str, font_path: str) -> b
     result = True
 
     try:
-        driver.get(url)
-        wait_for_page_load(driver)
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        WebDriverAction.load_page(driver, url, wait_for_page_load)
+        product_name, product_price_aud = parse_product_page(driver.page_source)
 
-        product_name_element = soup.find('div', class_='product-name')
-        if product_name_element:
-            product_name = product_name_element.h1.text.strip()
+        if product_name:
             print(f"Product name: {product_name}")
         else:
             print("Product name not found")
 
-        price_element = soup.find(class_="product__price")
-        if price_element:
-            product_price = price_element.text
-            product_price_aud = float(product_price.strip().replace('$', ''))
+        if product_price_aud is not None:
             product_price_twd = round(product_price_aud * exchange_rate)
             print(f"Product Price: {product_price_aud:,} AUD ({product_price_twd:,} TWD)", end=" ")
-            if product_price_twd <= 650:
+            if product_price_twd <= PROFITABLE_MAX_PRICE_TWD:
                 print(f"[ Profitable ]")
             else:
                 print(f"[ Not Profitable ]")
@@ -74,3 +99,95 @@ def web_scraper(driver: webdriver, url: str, root_dir: str, font_path: str) -> b
 
     print("------------------------------------------------------------------------\n")
     return result
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class WatchResult:
+    url: str = attr.ib()
+    product_name: str = attr.ib(default=None)
+    price_aud: float = attr.ib(default=None)
+    price_twd: int = attr.ib(default=None)
+    error: str = attr.ib(default=None)
+
+    @property
+    def is_profitable(self) -> bool:
+        return self.price_twd is not None and self.price_twd <= PROFITABLE_MAX_PRICE_TWD
+
+
+def read_watch_list(file_path: str) -> list[str]:
+    # One product URL per line, blank lines and '#' comments are skipped
+    with open(file_path, encoding="utf-8") as file:
+        lines = (line.strip() for line in file)
+        return [common.get_site_url(line) for line in lines if line and not line.startswith("#")]
+
+
+def check_product(url: str, exchange_rate: float) -> WatchResult:
+    try:
+        product_name, price_aud = parse_product_page(common.get_static_html_content(url))
+    except Exception as e:
+        return WatchResult(url, error=f"{type(e).__name__}: {e}")
+
+    if price_aud is None:
+        return WatchResult(url, product_name, error="Product Price not found")
+    return WatchResult(url, product_name, price_aud, round(price_aud * exchange_rate))
+
+
+def watch_products(urls: list[str], exchange_rate: float, max_workers: int = 8) -> list[WatchResult]:
+    # The product pages are fetched without Chrome, concurrently, all priced
+    # with the same exchange rate snapshot. Requests are still paced per host.
+    perf.set_scope("chemist", "watch list")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda url: check_product(url, exchange_rate), urls))
+
+
+def format_watch_table(results: list[WatchResult]) -> str:
+    lines = [f"{'AUD':>9} {'TWD':>7}  {'Profit':<6}  Product"]
+    for result in results:
+        if result.error:
+            lines.append(f"{'-':>9} {'-':>7}  {'?':<6}  {result.url} ({result.error})")
+            continue
+        flag = "yes" if result.is_profitable else "no"
+        lines.append(
+            f"{result.price_aud:>9,.2f} {result.price_twd:>7,}  {flag:<6}  "
+            f"{result.product_name or result.url}"
+        )
+    return "\n".join(lines)
+
+
+def check_product_url(url: str) -> bool:
+    # Price check of a single product, without Chrome
+    try:
+        exchange_rate = common.get_aud_exchange_rate()
+    except Exception as e:
+        print(f"Error occurred during get_aud_exchange_rate(): {e}")
+        return False
+
+    result = check_product(url, exchange_rate)
+    print(format_watch_table([result]))
+    return result.error is None
+
+
+def watch_list_scraper(watch_list_path: str, max_workers: int = 8) -> bool:
+    try:
+        urls = read_watch_list(watch_list_path)
+    except OSError as e:
+        print(f"Unable to read the watch list: {e}")
+        return False
+
+    try:
+        exchange_rate = common.get_aud_exchange_rate()
+    except Exception as e:
+        print(f"Error occurred during get_aud_exchange_rate(): {e}")
+        print("Unable to find the exchange rate for Australian Dollar (AUD)")
+        return False
+
+    print(f"Spot selling rate for Australian Dollar (AUD): {exchange_rate}")
+    print(f"Watch list: {len(urls)} products")
+
+    results = watch_products(urls, exchange_rate, max_workers)
+    print(format_watch_table(results))
+
+    profitable = sum(result.is_profitable for result in results)
+    failed = sum(result.error is not None for result in results)
+    print(f"Profitable: {profitable}, not profitable: {len(results) - profitable - failed}, failed: {failed}")
+    return not failed
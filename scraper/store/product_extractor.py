@@ -0,0 +1,46 @@
+import attr
+from bs4 import Tag
+
+# (tag name, class name) of an element
+ElementKey = tuple[str, str]
+
+
+@attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
+class ProductNode:
+    # Elements of a product container, grouped by tag and class in a single
+    # walk, instead of a subtree search per field
+    container: Tag = attr.ib()
+    elements: dict[ElementKey, list[Tag]] = attr.ib()
+    # Matched elements in document order
+    ordered: list[tuple[ElementKey, Tag]] = attr.ib()
+
+    def first(self, name: str, class_name: str) -> Tag | None:
+        elements = self.elements.get((name, class_name))
+        return elements[0] if elements else None
+
+    def all(self, name: str, class_name: str) -> list[Tag]:
+        return self.elements.get((name, class_name), [])
+
+
+def walk_product(container: Tag, keys: set[ElementKey]) -> ProductNode:
+    # Keys with an empty class name match any element of the tag
+    elements = {}
+    ordered = []
+    for element in container.descendants:
+        name = element.name
+        if name is None:
+            continue  # Text
+
+        matched = [
+            (name, class_name)
+            for class_name in element.attrs.get("class", ())
+            if (name, class_name) in keys
+        ]
+        if (name, "") in keys:
+            matched.append((name, ""))
+
+        for key in matched:
+            elements.setdefault(key, []).append(element)
+            ordered.append((key, element))
+
+    return ProductNode(container, elements, ordered)
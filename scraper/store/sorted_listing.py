@@ -0,0 +1,58 @@
+import os
+import urllib.parse
+
+import attr
+
+from scraper.pricing import PricingParams
+
+# Set by run_scraper.py and inherited by the pool workers, listings are
+# walked to their last page when it is not set
+SORTED_PAGINATION_ENV = "SCRAPER_SORTED_PAGINATION"
+
+
+def is_enabled() -> bool:
+    return bool(os.environ.get(SORTED_PAGINATION_ENV))
+
+
+def sort_url(url: str, sort_query: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    query = f"{parts.query}&{sort_query}" if parts.query else sort_query
+    return urllib.parse.urlunsplit(parts._replace(query=query))
+
+
+@attr.s(slots=True, frozen=False, repr=False, eq=False, hash=False)
+class SortedListing:
+    # Pages of a listing sorted by sale price, high to low. Once a page ends
+    # with a price at which no product can meet the minimum profit, neither
+    # can any product of the following pages.
+
+    pricing: PricingParams = attr.ib()
+    exchange_rate: float = attr.ib()
+    # Lowest sale price seen so far
+    last_price: int = attr.ib(default=None)
+    # Cleared when the store ignored the sort order, all pages are walked
+    is_sorted: bool = attr.ib(default=True)
+
+    def add_page(self, sale_prices: list[int]) -> None:
+        if not sale_prices:
+            return
+
+        if self.last_price is not None:
+            sale_prices = [self.last_price, *sale_prices]
+        if any(
+            price < next_price
+            for price, next_price in zip(sale_prices, sale_prices[1:])
+        ):
+            if self.is_sorted:
+                print("Listing is not sorted by price, walk all pages")
+            self.is_sorted = False
+        self.last_price = min(sale_prices)
+
+    @property
+    def can_stop(self) -> bool:
+        if not self.is_sorted or self.last_price is None:
+            return False
+        bound = self.pricing.max_profit_bound(
+            self.last_price, self.exchange_rate
+        )
+        return bound is not None and bound < self.pricing.min_profit
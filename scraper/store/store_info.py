@@ -1,12 +1,20 @@
 import logging
 import os
+import time
 from typing import Callable
 
 import attr
 from selenium import webdriver
 
+from scraper import metrics
+from scraper import perf
+from scraper import price_history
+from scraper import revisit
 from scraper.chrome_driver import ChromeDriver, ChromeDriverError
 from scraper.common import calculate_discount_percentage
+from scraper.image_editor import IG_STORY_MAX_WIDTH
+from scraper.journal import JournalEntry
+from scraper.store.sorted_listing import SortedListing
 
 
 class StoreWebScraper:
@@ -17,19 +25,33 @@ class StoreWebScraper:
         root_dir: str,
         font_path: str,
         headless=True,
+        store_name: str = "",
+        keep_driver: bool = False,
     ):
         self.__web_scraper = web_scraper_func
         self.chrome_driver = chrome_driver
         self.root_dir = root_dir
         self.font_path = font_path
         self.headless = headless
+        self.store_name = store_name
+        # The browser is kept open for the next task, e.g. in the daemon
+        self.keep_driver = keep_driver
 
     def execute_scraper(self, url: str):
+        perf.set_scope(self.store_name)
+        perf.start_tracemalloc()
+        start_time = time.perf_counter()
+        result = False
         try:
-            driver = self.chrome_driver.create(headless=self.headless)
-            return self.__web_scraper(
-                driver, url, self.root_dir, self.font_path
-            )
+            with perf.stage("execute_scraper"):
+                if self.keep_driver and self.chrome_driver.is_alive():
+                    driver = self.chrome_driver.driver
+                else:
+                    driver = self.chrome_driver.create(headless=self.headless)
+                result = self.__web_scraper(
+                    driver, url, self.root_dir, self.font_path
+                )
+                return result
         except ChromeDriverError as e:
             print(f"ChromeDriverError: {e}")
             return False
@@ -43,7 +65,14 @@ class StoreWebScraper:
             print("Received KeyboardInterrupt, exit scraper")
             return False
         finally:
-            self.chrome_driver.quit()
+            if not self.keep_driver:
+                self.chrome_driver.quit()
+            metrics.inc(metrics.TASK_SECONDS, time.perf_counter() - start_time)
+            metrics.inc(
+                metrics.TASKS, result="success" if result else "failure"
+            )
+            metrics.flush()
+            perf.flush()
 
 
 @attr.s(slots=True, frozen=True, repr=False, eq=False, hash=False)
@@ -164,6 +193,49 @@ class OutputInfo:
     font_path: str = attr.ib()
     product_count: int = attr.ib(default=0)
     image_background_color: tuple[int, int, int] = attr.ib(default=None)
+    image_max_width: int = attr.ib(default=IG_STORY_MAX_WIDTH)
+    catalog_path: str = attr.ib(default=None)
+    price_history_path: str = attr.ib(default=None)
+    journal_entry: JournalEntry = attr.ib(default=None)
+    # Set when the listing is walked in price order, to stop early
+    sorted_listing: SortedListing = attr.ib(default=None)
+
+    @property
+    def next_page(self) -> int:
+        # First page not scraped yet, when resuming
+        if self.journal_entry is None:
+            return 1
+        return self.journal_entry.last_page + 1
+
+    def is_rendered(self, product_url: str) -> bool:
+        return (
+            self.journal_entry is not None
+            and self.journal_entry.is_rendered(product_url)
+        )
+
+    def mark_rendered(self, product_url: str) -> None:
+        if self.journal_entry is not None:
+            self.journal_entry.mark_rendered(product_url, self.product_count)
+
+    def complete_page(self, page: int) -> None:
+        if self.journal_entry is not None:
+            self.journal_entry.complete_page(page, self.product_count)
+
+    def record_prices(self, records: list[price_history.PriceRecord]) -> None:
+        if self.price_history_path:
+            price_history.record_prices(self.price_history_path, records)
+
+    def add_listed_prices(self, sale_prices: list[int]) -> None:
+        if self.sorted_listing is not None:
+            self.sorted_listing.add_page(sale_prices)
+
+    @property
+    def can_stop_paginating(self) -> bool:
+        return self.sorted_listing is not None and self.sorted_listing.can_stop
+
+    def record_visit(self, url: str) -> None:
+        # All products of the page are in its catalog once it is scraped
+        revisit.record_visit(self.store_name, url, self.catalog_path)
 
     def display_info(self):
         print("Store name:", self.store_name)
@@ -171,3 +243,6 @@ class OutputInfo:
         print("Output directory:", self.output_dir)
         print("Font path:", self.font_path)
         print("Image background color:", self.image_background_color)
+        print("Image max width:", self.image_max_width)
+        print("Catalog path:", self.catalog_path)
+        print("Price history path:", self.price_history_path)
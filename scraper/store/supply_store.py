@@ -1,5 +1,4 @@
 import os
-import shutil
 
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException, HTTPError
@@ -9,13 +8,31 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from scraper import catalog
 from scraper import common
 from scraper import image_editor
+from scraper import journal
+from scraper import metrics
+from scraper import output_generation
+from scraper import perf
+from scraper import price_history
+from scraper import retry
 from scraper.chrome_driver import WebDriverAction
 from scraper.exceptions import ElementNotFound, InvalidInputError
 from scraper.image_editor import ImageProcessingError
+from scraper.pricing import SUPPLY_PRICING
+from scraper.store.product_extractor import ProductNode, walk_product
 from scraper.store.store_info import OutputInfo, ProductInfo
 
+STORE_URL = "https://www.supplystore.com.au"
+SALE_PATH = "/sale/"
+
+
+def gen_store_sale_url(section: str) -> str:
+    if section:
+        return common.get_site_url(STORE_URL) + SALE_PATH + section
+    return ""
+
 
 def product_price_parser(price_string: str) -> int | None:
     if price_string is not None:
@@ -23,10 +40,67 @@ def product_price_parser(price_string: str) -> int | None:
     return None
 
 
+PRODUCT_ELEMENTS = {
+    ("img", "object-contain"),
+    ("div", "product-itme-brand"),
+    ("div", "product-item-name"),
+    ("a", "product-item-link"),
+    ("span", "price-label"),
+    ("span", "price"),
+}
+
+
+def parse_product_prices(node: ProductNode) -> tuple[str | None, str | None]:
+    # The price following the "As low as" label is the sale price, the one
+    # following "Regular Price" the original price
+    prices = {}
+    label = None
+    for key, element in node.ordered:
+        if key == ("span", "price-label"):
+            label = element.text.strip()
+        elif key == ("span", "price") and label is not None:
+            prices.setdefault(label, element.text.strip())
+            label = None
+    return prices.get("As low as"), prices.get("Regular Price")
+
+
+def parse_product_details(node: ProductNode) -> tuple[list[str], str, str]:
+    try:
+        image_urls = [node.first("img", "object-contain")["src"]]
+    except (AttributeError, TypeError):
+        print("Image source not found")
+        raise
+
+    # Find the brand
+    try:
+        brand = node.first("div", "product-itme-brand").text.strip()
+    except (AttributeError, TypeError):
+        print("Brand not found")
+        raise
+
+    # Find the title
+    try:
+        title = (
+            node.first("div", "product-item-name")
+            .text.strip()
+            .replace('"', "'")
+        )
+        if brand in title:
+            title = title.replace(brand, "").strip()
+    except (AttributeError, TypeError):
+        print("Title not found")
+        raise
+
+    return image_urls, brand, title
+
+
+@perf.timed("process_page")
 def product_info_processor(
     page_source, output_info: OutputInfo, exchange_rate: float
 ):
-    soup = BeautifulSoup(page_source, "html.parser")
+    metrics.inc(metrics.PAGES)
+    with perf.stage("parse"):
+        soup = BeautifulSoup(page_source, "html.parser")
     product_grid_section = soup.find("section", class_="list-section")
 
     if product_grid_section is None:
@@ -34,95 +108,66 @@ def product_info_processor(
         raise ElementNotFound("Product info not found")
 
     product_subtitles = product_grid_section.find_all("form", method="post")
+    catalog_entries = []
+    price_records = []
 
     for subtitle in product_subtitles:
-        image_urls = []
-        image_element = subtitle.find("img", class_="object-contain")
+        node = walk_product(subtitle, PRODUCT_ELEMENTS)
         try:
-            image_urls.append(image_element["src"])
-        except (AttributeError, TypeError):
-            print("Image source not found")
-            raise
-
-        # Find the brand
-        brand_element = subtitle.find("div", class_="product-itme-brand")
-        try:
-            brand = brand_element.text.strip()
-        except (AttributeError, TypeError):
-            print("Brand not found")
-            raise
-
-        # Find the title and link
-        title_element = subtitle.find("div", class_="product-item-name")
-        try:
-            title = title_element.text.strip().replace('"', "'")
-            if brand in title:
-                title = title.replace(brand, "").strip()
-
-            anchor_element = title_element.find("a", class_="product-item-link")
-            product_url = anchor_element["href"]
+            product_url = node.first("a", "product-item-link")["href"]
         except (AttributeError, TypeError):
             print("Title not found")
             raise
 
-        # Find the sale price
-        sale_price_element = subtitle.find(
-            "span", class_="price-label", string="As low as"
-        )
-        try:
-            sale_price = sale_price_element.find_next(
-                "span", class_="price"
-            ).text.strip()
-        except (AttributeError, TypeError):
+        sale_price, original_price = parse_product_prices(node)
+        if sale_price is None:
             print("Sale Price not found")
-            raise
-
-        # Find the regular price
-        original_price_element = subtitle.find(
-            "span", class_="price-label", string="Regular Price"
-        )
-        try:
-            original_price = original_price_element.find_next(
-                "span", class_="price"
-            ).text.strip()
-        except (AttributeError, TypeError):
+            raise ElementNotFound("Sale Price not found")
+        if original_price is None:
             original_price = sale_price  # Regular Price not found
 
-        margin = 1.03
-        aud_to_twd = exchange_rate * margin
-
         # Parse price string to int
-        original_price = round(
-            product_price_parser(original_price) * aud_to_twd
+        original_price = product_price_parser(original_price)
+        sale_price = product_price_parser(sale_price)
+        catalog_entries.append(
+            catalog.CatalogEntry(
+                output_info.store_name,
+                output_info.group,
+                product_url,
+                original_price,
+                sale_price,
+                exchange_rate,
+            )
         )
-        sale_price = round(product_price_parser(sale_price) * aud_to_twd)
-
-        shipping_fee = 850
-        tw_import_duty_rate = 1.16
-        cost = round((sale_price + shipping_fee) * tw_import_duty_rate)
+        metrics.inc(metrics.PRODUCTS_SEEN)
 
-        results = common.calculate_profit_margin(
-            cost, original_price, 0.11, True
+        pricing = SUPPLY_PRICING.evaluate(
+            original_price, sale_price, exchange_rate
         )
-        if results is None:
-            continue  # unprofitable
-
-        selling_price, profit, profit_margin = results
+        price_records.append(
+            price_history.PriceRecord.from_pricing(catalog_entries[-1], pricing)
+        )
+        if not pricing.is_profitable:
+            continue
 
-        if profit < 700:
+        if output_info.is_rendered(product_url):
             continue
 
+        # Only the accepted products are worth the other fields
+        image_urls, brand, title = parse_product_details(node)
+
         output_info.product_count += 1
+        metrics.inc(metrics.PRODUCTS_ACCEPTED)
         product_info = ProductInfo(
             index=output_info.product_count,
             brand=brand,
             title=title,
-            original_price=original_price,
-            sale_price=sale_price,
-            cost=cost,
-            selling_price=selling_price,
-            profit=profit,
-            profit_margin=profit_margin,
+            original_price=pricing.original_price,
+            sale_price=pricing.sale_price,
+            cost=pricing.cost,
+            selling_price=pricing.selling_price,
+            profit=pricing.profit,
+            profit_margin=pricing.profit_margin,
             image_urls=image_urls,
             product_url=product_url,
         )
@@ -144,9 +189,11 @@ def product_info_processor(
                     product_info.image_insert_text,
                     product_info.image_strikethrough_line_index,
                     product_info.image_strikethrough_text,
+                    output_info.image_max_width,
                 )
 
             product_info.product_info_logging(output_info.output_dir)
+            output_info.mark_rendered(product_url)
         except (
             InvalidInputError,
             HTTPError,
@@ -154,11 +201,47 @@ def product_info_processor(
             FileNotFoundError,
             OSError,
             ImageProcessingError,
+            retry.CircuitOpenError,
         ) as e:
             print(f"Product image processing failed: {e}")
             raise
 
+    if output_info.catalog_path:
+        catalog.append_catalog_entries(
+            output_info.catalog_path, catalog_entries
+        )
+    output_info.record_prices(price_records)
+
+
+def parse_max_page(page_source, max_pages: int = 1) -> int:
+    # Parsing HTML using BeautifulSoup
+    soup = BeautifulSoup(page_source, "html.parser")
+
+    # Find all <span> elements containing page numbers
+    span_elements = soup.find_all("span", class_="sr-only label")
+
+    # Iterate through all <span> elements, extract page numbers, and add them to the page list
+    for span_element in span_elements:
+        try:
+            # Check if the <span> tag represents a page,
+            # then get the text of the next <span> tag, which is the page number
+            if span_element.text.strip() == "Page":
+                page_number = int(span_element.find_next("span").text)
+                max_pages = max(max_pages, page_number)
+
+            elif span_element.text.strip() == "You're currently reading page":
+                page_number = int(
+                    span_element.find_next("span", class_="line-through").text
+                )
+                max_pages = max(max_pages, page_number)
+
+        except ValueError:
+            pass
 
+    return max_pages
+
+
+@perf.timed("wait_for_page_load")
 def wait_for_page_load(driver: webdriver, timeout=10):
     WebDriverAction.scroll_page_by_step(driver)
     # wait for the website to fully load
@@ -181,15 +264,11 @@ def start_scraping(
     exchange_rate: float,
     total_pages: int,
 ):
-    driver.get(url)
-    wait_for_page_load(driver)
-    product_info_processor(driver.page_source, output_info, exchange_rate)
-
-    for page in range(2, total_pages + 1):
-        new_url = url + f"?p={page}"
-        driver.get(new_url)
-        wait_for_page_load(driver)
+    for page in range(output_info.next_page, total_pages + 1):
+        page_url = url if page == 1 else url + f"?p={page}"
+        WebDriverAction.load_page(driver, page_url, wait_for_page_load)
         product_info_processor(driver.page_source, output_info, exchange_rate)
+        output_info.complete_page(page)
 
 
 def web_scraper(
@@ -199,7 +278,7 @@ def web_scraper(
         return False
 
     store_name = "supply"
-    store_url_prefix = "https://www.supplystore.com.au"
+    store_url_prefix = common.get_site_url(STORE_URL)
 
     if not url.startswith(store_url_prefix):
         print(
@@ -224,73 +303,52 @@ def web_scraper(
 
     section = url.split("/")[-1]
     print(f"Section: {section}")
+    perf.set_scope(store_name, section)
 
-    folder_path = os.path.join(root_dir, "output", store_name, section)
-
-    # Clean up the old output directory
-    if os.path.exists(folder_path):
-        if os.path.isdir(folder_path):
-            shutil.rmtree(folder_path)
-        else:
-            print(f"Path is not a directory: {folder_path}")
-            return False
+    journal_entry = journal.open_entry(root_dir, url)
+    if journal_entry.completed:
+        print(f"Already scraped, skip: {url}")
+        return True
 
-    os.makedirs(folder_path)
+    folder_path = os.path.join(root_dir, "output", store_name, section)
+    generation = output_generation.open_generation(
+        folder_path, keep_existing=journal_entry.has_progress
+    )
+    if generation is None:
+        return False
 
     product_image_bg_color = (255, 255, 255)  # default is white
     output_info = OutputInfo(
         store_name=store_name,
         group=section,
-        output_dir=folder_path,
+        output_dir=generation.staging_path,
         font_path=font_path,
         image_background_color=product_image_bg_color,
+        catalog_path=catalog.get_catalog_path(root_dir, store_name, section),
+        price_history_path=price_history.get_history_path(root_dir),
+        product_count=journal_entry.product_count,
+        journal_entry=journal_entry,
     )
     output_info.display_info()
+    if not journal_entry.has_progress:
+        catalog.reset_catalog(output_info.catalog_path)
 
     result = True
 
     try:
-        driver.get(url)
-        wait_for_page_load(driver)
+        WebDriverAction.load_page(driver, url, wait_for_page_load)
 
         total_pages = max_pages = 1
 
         while True:
-            # Parsing HTML using BeautifulSoup
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-
-            # Find all <span> elements containing page numbers
-            span_elements = soup.find_all("span", class_="sr-only label")
-
-            # Iterate through all <span> elements, extract page numbers, and add them to the page list
-            for span_element in span_elements:
-                try:
-                    # Check if the <span> tag represents a page,
-                    # then get the text of the next <span> tag, which is the page number
-                    if span_element.text.strip() == "Page":
-                        page_number = int(span_element.find_next("span").text)
-                        max_pages = max(max_pages, page_number)
-
-                    elif (
-                        span_element.text.strip()
-                        == "You're currently reading page"
-                    ):
-                        page_number = int(
-                            span_element.find_next(
-                                "span", class_="line-through"
-                            ).text
-                        )
-                        max_pages = max(max_pages, page_number)
-
-                except ValueError:
-                    pass
+            max_pages = parse_max_page(driver.page_source, max_pages)
 
             if max_pages == total_pages:
                 break
 
             total_pages = max(total_pages, max_pages)
             new_url = url + f"?p={max_pages}"
-            driver.get(new_url)
+            WebDriverAction.navigate(driver, new_url)
 
         start_scraping(driver, url, output_info, exchange_rate, total_pages)
 
@@ -298,6 +356,9 @@ def web_scraper(
             f"\nTotal pages: {total_pages}\n"
             f"Total valid products: {output_info.product_count}"
         )
+        generation.commit()
+        journal_entry.complete()
+        output_info.record_visit(url)
 
     except TimeoutException:
         print("Element waiting timeout error")
@@ -313,6 +374,7 @@ def web_scraper(
 
     if not output_info.product_count:
         common.delete_empty_folders(folder_path)
+        common.delete_empty_folders(generation.staging_path)
 
     print(
         "------------------------------------------------------------------------\n"
@@ -1,5 +1,4 @@
 import os
-import shutil
 import time
 import urllib.parse
 
@@ -15,18 +14,32 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.ui import WebDriverWait
 
+from scraper import catalog
 from scraper import common
 from scraper import image_editor
+from scraper import journal
+from scraper import metrics
+from scraper import output_generation
+from scraper import perf
+from scraper import price_history
+from scraper import retry
 from scraper.chrome_driver import WebDriverAction
 from scraper.exceptions import ElementNotFound, InvalidInputError
 from scraper.image_editor import ImageProcessingError
+from scraper.pricing import UPTHERE_PRICING
+from scraper.store.product_extractor import ProductNode, walk_product
 from scraper.store.store_info import OutputInfo, ProductInfo
 
+STORE_URL = "https://uptherestore.com"
+SALE_PATH = "/collections/sale/"
+
 
 def gen_store_sale_url(brand: str) -> str:
     if brand:
-        url = "https://uptherestore.com/collections/sale/" + urllib.parse.quote(
-            brand
+        url = (
+            common.get_site_url(STORE_URL)
+            + SALE_PATH
+            + urllib.parse.quote(brand)
         )
         return url
     return ""
@@ -41,10 +54,35 @@ def product_price_parser(price_string: str) -> int | None:
     return None
 
 
+PRODUCT_ELEMENTS = {
+    ("span", "product__sold-out"),
+    ("div", "product__subtitle"),
+    ("div", "product__title"),
+    ("del", "price__amount"),
+    ("ins", "price__amount"),
+    ("img", ""),
+}
+
+
+def parse_product_names(node: ProductNode) -> tuple[str, str]:
+    brand = (
+        node.first("div", "product__subtitle")
+        .find("span")
+        .contents[0]
+        .strip()
+        .split("\n")[0]
+    )
+    title = node.first("div", "product__title").text.strip().replace('"', "'")
+    return brand, title
+
+
+@perf.timed("process_page")
 def product_info_processor(
     page_source, output_info: OutputInfo, exchange_rate: float
 ):
-    soup = BeautifulSoup(page_source, "html.parser")
+    metrics.inc(metrics.PAGES)
+    with perf.stage("parse"):
+        soup = BeautifulSoup(page_source, "html.parser")
 
     # find <section class="product-grid">
     # find_all <a class="product" or class="product__swap"
@@ -56,33 +94,25 @@ def product_info_processor(
         common.save_html_to_file(page_source, "fail_page_source.html")
         raise ElementNotFound("Product info not found")
 
+    catalog_entries = []
+    price_records = []
+    store_url = common.get_site_url(STORE_URL)
+
     for idx, container in enumerate(product_containers, start=1):
-        sold_out_element = container.find("span", class_="product__sold-out")
-        if sold_out_element is not None:
+        node = walk_product(container, PRODUCT_ELEMENTS)
+        if node.first("span", "product__sold-out") is not None:
             continue
 
-        product_url = "https://uptherestore.com" + container["href"]
-
-        brand = (
-            container.find("div", class_="product__subtitle")
-            .find("span")
-            .contents[0]
-            .strip()
-            .split("\n")[0]
-        )
-        title = (
-            container.find("div", class_="product__title")
-            .text.strip()
-            .replace('"', "'")
-        )
+        product_url = store_url + container["href"]
 
         # Normal price
-        # normal_price_element = container.find("span", class_="price__amount")
+        # normal_price_element = node.first("span", "price__amount")
 
-        original_price_element = container.find("del", class_="price__amount")
-        sale_price_element = container.find("ins", class_="price__amount")
+        original_price_element = node.first("del", "price__amount")
+        sale_price_element = node.first("ins", "price__amount")
 
         if original_price_element is None or sale_price_element is None:
+            brand, title = parse_product_names(node)
             print(
                 f"\n[ Info ] Product ID.{idx}: "
                 f"'{brand} - {title}' is not on sale"
@@ -92,58 +122,52 @@ def product_info_processor(
         original_price = original_price_element.text.strip()
         sale_price = sale_price_element.text.strip()
 
-        # print(
-        #     f"No.{idx}: {brand} - {title}\n"
-        #     f"price: {original_price}\n"
-        #     f"sale:  {sale_price}"
-        # )
-
-        image_urls = []
-        images = container.find_all("img")
-        for index, img in enumerate(images, start=1):
-            image_url = "https:" + img["src"]
-            # print(f"image url {index}: {image_url}")
-            image_urls.append(image_url)
-
-        margin = 1.03
-        aud_to_twd = exchange_rate * margin
-
         # Parse price string to int
-        original_price = round(
-            product_price_parser(original_price) * aud_to_twd
-        )
-        sale_price = round(product_price_parser(sale_price) * aud_to_twd)
-
-        shipping_fee = 850
-        tw_import_duty_rate = 1.16
-        aus_gst_rate = 0.1  # Goods and Services Tax (GST) in Australia is 10%
-        cost = round(
-            ((sale_price / (1 + aus_gst_rate)) + shipping_fee)
-            * tw_import_duty_rate
+        original_price = product_price_parser(original_price)
+        sale_price = product_price_parser(sale_price)
+        catalog_entries.append(
+            catalog.CatalogEntry(
+                output_info.store_name,
+                output_info.group,
+                product_url,
+                original_price,
+                sale_price,
+                exchange_rate,
+            )
         )
+        metrics.inc(metrics.PRODUCTS_SEEN)
 
-        results = common.calculate_profit_margin(
-            cost, original_price, 0.11, True
+        pricing = UPTHERE_PRICING.evaluate(
+            original_price, sale_price, exchange_rate
         )
-        if results is None:
-            continue  # unprofitable
-
-        selling_price, profit, profit_margin = results
+        price_records.append(
+            price_history.PriceRecord.from_pricing(catalog_entries[-1], pricing)
+        )
+        if not pricing.is_profitable:
+            continue
 
-        if profit < 500:
+        if output_info.is_rendered(product_url):
             continue
 
+        # Only the accepted products are worth the other fields
+        brand, title = parse_product_names(node)
+        image_urls = [
+            urllib.parse.urljoin(store_url, img["src"])
+            for img in node.all("img", "")
+        ]
+
         output_info.product_count += 1
+        metrics.inc(metrics.PRODUCTS_ACCEPTED)
         product_info = ProductInfo(
             index=output_info.product_count,
             brand=brand,
             title=title,
-            original_price=original_price,
-            sale_price=sale_price,
-            cost=cost,
-            selling_price=selling_price,
-            profit=profit,
-            profit_margin=profit_margin,
+            original_price=pricing.original_price,
+            sale_price=pricing.sale_price,
+            cost=pricing.cost,
+            selling_price=pricing.selling_price,
+            profit=pricing.profit,
+            profit_margin=pricing.profit_margin,
             image_urls=image_urls,
             product_url=product_url,
         )
@@ -165,19 +189,53 @@ def product_info_processor(
                     product_info.image_insert_text,
                     product_info.image_strikethrough_line_index,
                     product_info.image_strikethrough_text,
+                    output_info.image_max_width,
                 )
 
             product_info.product_info_logging(output_info.output_dir)
+            output_info.mark_rendered(product_url)
 
         except (
             InvalidInputError,
             OSError,
             ImageProcessingError,
+            retry.CircuitOpenError,
         ) as e:
             print(f"Product image processing failed({type(e).__name__}): {e}")
             raise
 
+    if output_info.catalog_path:
+        catalog.append_catalog_entries(
+            output_info.catalog_path, catalog_entries
+        )
+    output_info.record_prices(price_records)
+
+
+def parse_total_pages(html_content) -> int | None:
+    soup = BeautifulSoup(html_content, "html.parser")
+    # Find the pagination section on the webpage
+    pagination_element = soup.select_one("div.paging")
+
+    total_pages = None
+    if pagination_element is None:
+        # Only one page
+        total_pages = 1
+    elif len(pagination_element) > 0:
+        li_elements = pagination_element.find_all("li")
+
+        last_li_with_a = None
+        for li in reversed(li_elements):
+            if li.find("a"):
+                last_li_with_a = li
+                break
+
+        if last_li_with_a:
+            total_pages = int(last_li_with_a.find("a").text.strip())
+
+    return total_pages
+
 
+@perf.timed("wait_for_page_load")
 def wait_for_page_load(driver: webdriver, timeout=10):
     WebDriverAction.scroll_page_by_step(driver)
 
@@ -229,15 +287,11 @@ def start_scraping(
     exchange_rate: float,
     total_pages: int,
 ):
-    driver.get(url)
-    wait_for_page_load(driver)
-    product_info_processor(driver.page_source, output_info, exchange_rate)
-
-    for page in range(2, total_pages + 1):
-        new_url = url + f"?page={page}"
-        driver.get(new_url)
-        wait_for_page_load(driver)
+    for page in range(output_info.next_page, total_pages + 1):
+        page_url = url if page == 1 else url + f"?page={page}"
+        WebDriverAction.load_page(driver, page_url, wait_for_page_load)
         product_info_processor(driver.page_source, output_info, exchange_rate)
+        output_info.complete_page(page)
 
 
 def web_scraper(
@@ -247,7 +301,7 @@ def web_scraper(
         return False
 
     store_name = "upthere"
-    store_url_prefix = "https://uptherestore.com"
+    store_url_prefix = common.get_site_url(STORE_URL)
 
     if not url.startswith(store_url_prefix):
         print(
@@ -273,18 +327,19 @@ def web_scraper(
 
     section = url.split("/")[-1]
     print(f"Section: {section}")
+    perf.set_scope(store_name, section)
 
-    folder_path = os.path.join(root_dir, "output", store_name, section)
-
-    # Clean up the old output directory
-    if os.path.exists(folder_path):
-        if os.path.isdir(folder_path):
-            shutil.rmtree(folder_path)
-        else:
-            print(f"Path is not a directory: {folder_path}")
-            return False
+    journal_entry = journal.open_entry(root_dir, url)
+    if journal_entry.completed:
+        print(f"Already scraped, skip: {url}")
+        return True
 
-    os.makedirs(folder_path)
+    folder_path = os.path.join(root_dir, "output", store_name, section)
+    generation = output_generation.open_generation(
+        folder_path, keep_existing=journal_entry.has_progress
+    )
+    if generation is None:
+        return False
 
     product_image_bg_color = (
         238,
@@ -294,36 +349,23 @@ def web_scraper(
     output_info = OutputInfo(
         store_name=store_name,
         group=section,
-        output_dir=folder_path,
+        output_dir=generation.staging_path,
         font_path=font_path,
         image_background_color=product_image_bg_color,
+        catalog_path=catalog.get_catalog_path(root_dir, store_name, section),
+        price_history_path=price_history.get_history_path(root_dir),
+        product_count=journal_entry.product_count,
+        journal_entry=journal_entry,
     )
     output_info.display_info()
+    if not journal_entry.has_progress:
+        catalog.reset_catalog(output_info.catalog_path)
 
     result = True
 
     try:
         html_content = common.get_static_html_content(url)
-
-        soup = BeautifulSoup(html_content, "html.parser")
-        # Find the pagination section on the webpage
-        pagination_element = soup.select_one("div.paging")
-
-        total_pages = None
-        if pagination_element is None:
-            # Only one page
-            total_pages = 1
-        elif len(pagination_element) > 0:
-            li_elements = pagination_element.find_all("li")
-
-            last_li_with_a = None
-            for li in reversed(li_elements):
-                if li.find("a"):
-                    last_li_with_a = li
-                    break
-
-            if last_li_with_a:
-                total_pages = int(last_li_with_a.find("a").text.strip())
+        total_pages = parse_total_pages(html_content)
 
         if total_pages is None:
             print(
@@ -339,6 +381,9 @@ def web_scraper(
             f"\nTotal pages: {total_pages}\n"
             f"Total valid products: {output_info.product_count}"
         )
+        generation.commit()
+        journal_entry.complete()
+        output_info.record_visit(url)
 
     except (TimeoutException, NoSuchElementException):
         print("Element waiting timeout error")
@@ -358,6 +403,7 @@ def web_scraper(
 
     if not output_info.product_count:
         common.delete_empty_folders(folder_path)
+        common.delete_empty_folders(generation.staging_path)
 
     print(
         "------------------------------------"
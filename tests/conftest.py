@@ -0,0 +1,19 @@
+import pytest
+
+from scraper import common
+from scraper import image_editor
+
+
+@pytest.fixture
+def stub_image_pipeline(monkeypatch):
+    # Product images are neither downloaded nor rendered
+    downloads = []
+    monkeypatch.setattr(
+        common,
+        "download_image_from_url",
+        lambda url, output_path, *args, **kwargs: downloads.append(url),
+    )
+    monkeypatch.setattr(
+        image_editor, "ig_story_image_processing", lambda *args, **kwargs: None
+    )
+    return downloads
@@ -0,0 +1,32 @@
+import os
+
+import requests
+
+fixtures_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures"
+)
+
+EXCHANGE_RATE_PAGE = """
+<table><tbody><tr>
+<td class="currency"><div class="visible-phone print_hide">
+Australian Dollar (AUD)</div></td>
+<td data-table="Spot Selling">20.61</td>
+</tr></tbody></table>
+"""
+
+
+def make_response(url: str, content: str, status_code: int = 200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "OK" if status_code == 200 else "Not Found"
+    response.encoding = "utf-8"
+    response.url = url
+    response._content = content.encode("utf-8")
+    response._content_consumed = True
+    return response
+
+
+def load_page(store_name: str, page_name: str) -> str:
+    page_path = os.path.join(fixtures_path, "pages", store_name, page_name)
+    with open(page_path, encoding="utf-8") as file:
+        return file.read()
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+import requests
+
+from scraper import cassette
+from scraper import common
+from scraper.cassette import RECORD, REPLAY, Cassette
+from scraper.store import cettire_store
+from scraper.store import upthere_store
+from tests.helpers import EXCHANGE_RATE_PAGE, load_page, make_response
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    yield os.path.join(str(tmp_path), "cassette.zip")
+    cassette.activate(None)
+
+
+def test_replay_http_response(cassette_path):
+    url = "https://www.example.com/page"
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    recording.record_response("GET", url, make_response(url, "<p>hi</p>"))
+    recording.record_response("HEAD", url, make_response(url, "", 404))
+    recording.finalize()
+
+    cassette.activate(Cassette(REPLAY, cassette_path))
+
+    assert common.get_static_html_content(url) == "<p>hi</p>"
+    assert common.check_url_validity(url) is False
+    with pytest.raises(requests.exceptions.ConnectionError):
+        common.get_static_html_content("https://www.example.com/other")
+
+
+def test_replay_driver_page_sources(cassette_path):
+    url = "https://www.cettire.com/tw/collections/sale/Loewe"
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    recording.record_page_source(url, "<p>first</p>")
+    recording.record_page_source(url, "<p>second</p>")
+    recording.finalize()
+
+    driver = cassette.ReplayDriver(Cassette(REPLAY, cassette_path))
+    driver.get(url)
+    assert driver.page_source == "<p>first</p>"
+    assert driver.page_source == "<p>second</p>"
+    assert driver.page_source == "<p>second</p>"
+
+
+@pytest.mark.parametrize(
+    "store_module, store_name",
+    [(upthere_store, "upthere"), (cettire_store, "cettire")],
+)
+def test_replay_driver_wait_for_page_load(
+    cassette_path, store_module, store_name
+):
+    url = f"https://www.example.com/{store_name}"
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    recording.record_page_source(url, load_page(store_name, "listing.html"))
+    recording.finalize()
+
+    driver = cassette.ReplayDriver(Cassette(REPLAY, cassette_path))
+    driver.get(url)
+    store_module.wait_for_page_load(driver, timeout=1)
+
+
+def test_replay_web_scraper(tmp_path, cassette_path, stub_image_pipeline):
+    url = upthere_store.gen_store_sale_url("Needles")
+    exchange_rate_url = "https://rate.bot.com.tw/xrt?Lang=en-US"
+    page_source = load_page("upthere", "single_page.html")
+
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    recording.record_response("HEAD", url, make_response(url, ""))
+    recording.record_response("GET", url, make_response(url, page_source))
+    recording.record_response(
+        "GET",
+        exchange_rate_url,
+        make_response(exchange_rate_url, EXCHANGE_RATE_PAGE),
+    )
+    recording.record_page_source(url, page_source)
+    recording.finalize()
+
+    replay = Cassette(REPLAY, cassette_path)
+    cassette.activate(replay)
+    driver = cassette.ReplayDriver(replay)
+
+    assert upthere_store.web_scraper(driver, url, str(tmp_path), "")
+
+    list_path = os.path.join(
+        str(tmp_path), "output", "upthere", "Needles", "list.txt"
+    )
+    with open(list_path, encoding="utf-8") as file:
+        assert file.read().count("[ Product No.") == 5
@@ -1,9 +1,12 @@
 import os
 
+import numpy as np
 import pytest
 from PIL import Image
 
 from scraper import common
+from scraper.exceptions import ImageTooLarge
+from tests.helpers import make_response
 
 
 @pytest.mark.parametrize(
@@ -41,6 +44,52 @@ def test_calculate_profitable_price():
         assert (profit / cost) >= profit_rate
 
 
+@pytest.mark.parametrize(
+    "profit_rate, max_profit", [(0.068, False), (0.11, True), (0.08, True)]
+)
+def test_calculate_profit_margin_batch(profit_rate, max_profit):
+    rng = np.random.default_rng(0)
+    costs = np.arange(0, 40000, 7)
+    original_prices = costs + rng.integers(-2000, 20000, costs.size)
+
+    selling_prices, profits, profit_margins, profitable = (
+        common.calculate_profit_margin_batch(
+            costs, original_prices, profit_rate, max_profit
+        )
+    )
+
+    for index, (cost, original_price) in enumerate(
+        zip(costs.tolist(), original_prices.tolist())
+    ):
+        results = common.calculate_profit_margin(
+            cost, original_price, profit_rate, max_profit
+        )
+        if results is None:
+            assert not profitable[index]
+            continue
+
+        assert profitable[index]
+        assert results == (
+            selling_prices[index],
+            profits[index],
+            profit_margins[index],
+        )
+
+
+def test_calculate_profitable_price_batch_without_original_price():
+    profit_rate = 0.08
+    costs = np.arange(2000, 20000)
+    selling_prices, profitable = common.calculate_profitable_price_batch(
+        costs, profit_rate
+    )
+
+    assert profitable.all()
+    assert selling_prices.tolist() == [
+        common.calculate_profitable_price(cost, profit_rate)
+        for cost in costs.tolist()
+    ]
+
+
 @pytest.mark.parametrize(
     "url, expected_result",
     [
@@ -75,6 +124,35 @@ def test_download_product_img(tmp_path):
         assert download_image == golden_image
 
 
+def test_download_streamed(tmp_path, monkeypatch):
+    url = "https://uptherestore.com/cdn/shop/products/image.jpg"
+    output_path = os.path.join(str(tmp_path), "image.jpg")
+    calls = []
+
+    def send_request(method, request_url, **kwargs):
+        calls.append(kwargs)
+        return make_response(request_url, "x" * 1000)
+
+    monkeypatch.setattr(common, "send_request", send_request)
+    monkeypatch.setattr(common, "IMAGE_CHUNK_BYTES", 64)
+    common.download_image_from_url(url, output_path)
+
+    assert calls[0]["stream"] is True
+    assert calls[0]["timeout"] == (
+        common.IMAGE_CONNECT_TIMEOUT_SEC,
+        common.IMAGE_READ_TIMEOUT_SEC,
+    )
+    assert os.listdir(str(tmp_path)) == ["image.jpg"]
+    assert os.path.getsize(output_path) == 1000
+
+    # Too large images are neither retried nor left behind
+    os.remove(output_path)
+    with pytest.raises(ImageTooLarge):
+        common.download_image_from_url(url, output_path, max_bytes=999)
+    assert len(calls) == 2
+    assert not os.listdir(str(tmp_path))
+
+
 def test_abort_scraping_msg():
     input_str = "Hi, I'm a string. *-+=^%/"
     expect = f"\nAbort scraping: {input_str}\n"
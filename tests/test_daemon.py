@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from scraper import daemon
+
+STORE_URL = "https://uptherestore.com/collections/sale/"
+
+
+@pytest.fixture
+def scraper_daemon():
+    started = threading.Event()
+
+    def scrape_url(url):
+        started.wait(5)
+        print(f"Scraping {url}")
+        return not url.endswith("broken")
+
+    scraper_daemon = daemon.ScraperDaemon(
+        {
+            "upthere": daemon.StoreTarget(
+                "upthere",
+                STORE_URL,
+                lambda: [STORE_URL + "Needles", STORE_URL + "Nike"],
+                scrape_url,
+            )
+        }
+    )
+    server = daemon.create_server(scraper_daemon, port=0)
+    scraper_daemon.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield scraper_daemon, f"http://127.0.0.1:{server.server_port}", started
+    server.shutdown()
+    server.server_close()
+    scraper_daemon.stop()
+
+
+def test_submit_jobs(scraper_daemon):
+    scraper_daemon, url, started = scraper_daemon
+    assert requests.get(url + "/health").json()["stores"] == ["upthere"]
+
+    response = requests.post(url + "/jobs", json={"store": "upthere"})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == daemon.QUEUED
+    assert len(job["urls"]) == 2
+
+    # Only the output of the worker thread belongs to the job
+    while scraper_daemon.jobs[job["id"]].status != daemon.RUNNING:
+        time.sleep(0.01)
+    print("Output of another thread")
+
+    # Events are streamed while the job runs
+    started.set()
+    with requests.get(
+        f"{url}/jobs/{job['id']}/events", stream=True, timeout=10
+    ) as response:
+        events = [json.loads(line) for line in response.iter_lines()]
+    assert {"event": "log", "line": f"Scraping {STORE_URL}Nike"} in events
+    assert events[-1] == {"event": "finished", "status": daemon.DONE}
+    assert {"event": "log", "line": "Output of another thread"} not in events
+
+    job = requests.get(f"{url}/jobs/{job['id']}").json()
+    assert job["results"] == {
+        STORE_URL + "Needles": True,
+        STORE_URL + "Nike": True,
+    }
+
+    job = requests.post(
+        url + "/jobs", json={"url": STORE_URL + "broken"}
+    ).json()
+    assert job["urls"] == [STORE_URL + "broken"]
+    scraper_daemon.stop()
+    assert scraper_daemon.jobs[job["id"]].status == daemon.FAILED
+
+
+def test_invalid_jobs(scraper_daemon):
+    _, url, _ = scraper_daemon
+    for request in [
+        {},
+        {"store": "supply"},
+        {"url": "https://example.com/"},
+        # Products of the stores scraped by sale page
+        {"url": "https://uptherestore.com/products/needles-track-pant"},
+    ]:
+        response = requests.post(url + "/jobs", json=request)
+        assert response.status_code == 400
+    assert requests.get(url + "/jobs/42").status_code == 404
+    assert not requests.get(url + "/jobs").json()
+
+
+def test_parse_address():
+    assert daemon.parse_address("8765") == ("127.0.0.1", 8765)
+    assert daemon.parse_address("0.0.0.0:80") == ("0.0.0.0", 80)
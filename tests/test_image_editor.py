@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from scraper import image_editor
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+font_path = os.path.join(
+    os.path.dirname(tests_path), "fonts", "SourceSerifPro-SemiBold.ttf"
+)
+
+
+def test_font_cache_hit_and_miss():
+    image_editor.clear_font_cache()
+
+    font = image_editor.load_font(font_path, 40)
+    assert image_editor.load_font(font_path, 40) is font
+    assert image_editor.load_font(font_path, 41) is not font
+
+    info = image_editor.font_cache_info()["font"]
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def test_font_cache_missing_font(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        image_editor.load_font(os.path.join(str(tmp_path), "none.ttf"), 40)
+
+
+def test_text_length_cache():
+    image_editor.clear_font_cache()
+
+    text = "$12,345"
+    length = image_editor.get_text_length(font_path, 40, text)
+    assert length == image_editor.get_text_length(font_path, 40, text)
+    assert length == image_editor.load_font(font_path, 40).getlength(text)
+
+    info = image_editor.font_cache_info()["text_length"]
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_add_text_to_image_reuses_font(tmp_path):
+    image_editor.clear_font_cache()
+
+    for index in range(3):
+        image_path = os.path.join(str(tmp_path), f"{index}.jpg")
+        Image.new("RGB", (400, 700)).save(image_path, dpi=(300, 300))
+        image_editor.add_text_to_image_with_strikethrough(
+            image_path,
+            image_path,
+            font_path,
+            "A\nB\n$1,000\n$800",
+            14,
+            (13, 96),
+            2,
+            "$1,000",
+        )
+
+    info = image_editor.font_cache_info()["font"]
+    assert info.misses == 1
+
+
+def test_text_layer_matches_draw(tmp_path):
+    image_editor.clear_font_cache()
+
+    text = "Needles\nTrack Pant\n$1,234   45% off\n$980\n"
+    position = (35, 140)
+    image = Image.new("RGB", (1080, 1920), (238, 240, 242))
+
+    # Text and strikethrough drawn directly onto the image
+    expected = image.copy()
+    font = image_editor.load_font(font_path, 37)
+    draw = ImageDraw.Draw(expected)
+    draw.text(position, text, font=font, fill=(0, 0, 0), spacing=4)
+    start_y = position[1] + (37 + 4) * 2 + 37 // 2
+    end_x = position[0] + font.getlength("$1,234")
+    draw.line(
+        [(position[0], start_y), (end_x, start_y)], fill=(0, 0, 0), width=5
+    )
+
+    # Rendered once for both images of a product
+    for index in range(2):
+        image_path = os.path.join(str(tmp_path), f"{index}.png")
+        image.save(image_path)
+        image_editor.add_text_to_image_with_strikethrough(
+            image_path, image_path, font_path, text, 37, position, 2, "$1,234"
+        )
+        with Image.open(image_path) as result:
+            assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+    info = image_editor.font_cache_info()["text_layer"]
+    assert (info.hits, info.misses) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "image_size, max_width, expected_size",
+    [
+        ((3000, 4500), 1080, (1080, 1920)),
+        ((4000, 3000), 1080, (1080, 1920)),
+        ((600, 900), 1080, (800, 1422)),
+        ((3000, 4500), None, (3000, 5333)),
+    ],
+)
+def test_resize_for_ig_story_max_width(
+    tmp_path, image_size, max_width, expected_size
+):
+    image_path = os.path.join(str(tmp_path), "product.jpg")
+    Image.new("RGB", image_size, (0, 0, 0)).save(image_path)
+
+    new_size = image_editor.resize_for_ig_story(
+        image_path, (255, 255, 255), max_width
+    )
+    assert new_size == expected_size
+
+    with Image.open(image_path) as image:
+        assert image.size == expected_size
+        # The product image stays centered on the story background
+        width, height = image.size
+        assert image.getpixel((width // 2, height // 2)) == (0, 0, 0)
+        assert image.getpixel((width // 2, 0)) == (255, 255, 255)
+
+
+@pytest.mark.parametrize("encoder_name", list(image_editor.IMAGE_ENCODERS))
+def test_ig_story_image_formats(tmp_path, monkeypatch, encoder_name):
+    encoder = image_editor.IMAGE_ENCODERS[encoder_name]
+    if not encoder.is_available:
+        pytest.skip(f"{encoder.image_format} not supported by Pillow")
+    monkeypatch.setenv(image_editor.IMAGE_FORMAT_ENV, encoder_name)
+
+    image_path = os.path.join(str(tmp_path), "product.jpg")
+    Image.new("RGB", (600, 900), (0, 0, 0)).save(image_path)
+
+    story_path = image_editor.ig_story_image_processing(
+        image_path, (255, 255, 255), font_path, "AESOP\n$ 59.00", 1, "$ 59.00"
+    )
+    assert os.listdir(str(tmp_path)) == [f"product{encoder.extension}"]
+    with Image.open(story_path) as image:
+        assert (image.format, image.size) == (encoder.image_format, (800, 1422))
+        # The DPI of the downloaded image is kept, not raised to 300
+        assert "dpi" not in image.info
+
+
+def test_change_file_extension():
+    path = os.path.join("output", "001-1 - Aesop - Film.jpg Tote.jpg")
+    assert image_editor.change_file_extension(path, ".webp") == os.path.join(
+        "output", "001-1 - Aesop - Film.jpg Tote.webp"
+    )
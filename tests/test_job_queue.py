@@ -0,0 +1,119 @@
+import os
+import threading
+
+import pytest
+
+from scraper import job_queue
+from scraper.daemon import StoreTarget
+from scraper.job_queue import (
+    DONE,
+    FAILED,
+    LEASED,
+    PENDING,
+    MemoryJobQueue,
+    SQLiteJobQueue,
+)
+
+STORE_URL = "https://www.cettire.com/collections/sale/"
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def make_queue(request, tmp_path):
+    def make_queue(**kwargs):
+        if request.param == "memory":
+            return MemoryJobQueue(**kwargs)
+        return SQLiteJobQueue(
+            os.path.join(str(tmp_path), "jobs.sqlite"), **kwargs
+        )
+
+    return make_queue
+
+
+def test_leases(make_queue, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_queue.time, "time", lambda: now[0])
+
+    queue = make_queue(lease_sec=60, max_attempts=2)
+    assert queue.enqueue("cettire", [STORE_URL + "a", STORE_URL + "b"]) == 2
+    assert queue.enqueue("cettire", [STORE_URL + "a"]) == 0
+
+    job = queue.lease("node-1")
+    assert (job.url, job.attempts, job.worker) == (STORE_URL + "a", 1, "node-1")
+    other = queue.lease("node-2")
+    assert other.url == STORE_URL + "b"
+    assert queue.lease("node-2") is None
+    assert queue.counts() == {LEASED: 2}
+
+    # node-1 keeps its lease, node-2 died and its job is taken over
+    now[0] += 40
+    assert queue.heartbeat(job)
+    now[0] += 40
+    retried = queue.lease("node-1")
+    assert (retried.url, retried.attempts) == (STORE_URL + "b", 2)
+    assert not queue.complete(other)
+    assert queue.complete(job, "nodes/node-1")
+
+    # Out of attempts
+    assert queue.fail(retried, "Scraper failed")
+    assert queue.counts() == {DONE: 1, FAILED: 1}
+    assert [job.error for job in queue.get_jobs(FAILED)] == ["Scraper failed"]
+    assert queue.is_drained()
+
+    # Finished jobs are queued again
+    assert queue.enqueue("cettire", [STORE_URL + "a", STORE_URL + "b"]) == 2
+    assert queue.counts() == {PENDING: 2}
+
+
+def test_run_workers(make_queue):
+    queue = make_queue()
+    urls = [f"{STORE_URL}{index}" for index in range(20)]
+    queue.enqueue("cettire", urls)
+    queue.enqueue("unknown", ["https://example.com/"])
+
+    scraped = []
+    attempts = {}
+    lock = threading.Lock()
+
+    def scrape_url(url):
+        with lock:
+            attempts[url] = attempts.get(url, 0) + 1
+            scraped.append(url)
+        # Fails once, then succeeds
+        return not url.endswith("7") or attempts[url] > 1
+
+    targets = {"cettire": StoreTarget("cettire", STORE_URL, list, scrape_url)}
+    workers = [
+        threading.Thread(
+            target=job_queue.run_worker,
+            args=(queue, targets, f"node-{index}"),
+            kwargs={"output_dir": f"nodes/node-{index}", "poll_sec": 0.01},
+        )
+        for index in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert sorted(set(scraped)) == sorted(urls)
+    assert len(scraped) == len(urls) + 2
+    assert queue.counts() == {DONE: 20, FAILED: 1}
+    assert queue.get_jobs(FAILED)[0].error == "Unknown store: unknown"
+
+
+def test_worker_lost_lease(make_queue, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_queue.time, "time", lambda: now[0])
+    queue = make_queue(lease_sec=60)
+    queue.enqueue("cettire", [STORE_URL + "a"])
+
+    def scrape_url(url):
+        # Too slow, the job is retried and finished by another worker
+        now[0] += 120
+        queue.complete(queue.lease("node-2"), "nodes/node-2")
+        return True
+
+    targets = {"cettire": StoreTarget("cettire", STORE_URL, list, scrape_url)}
+    finished = job_queue.run_worker(queue, targets, "node-1", poll_sec=0.01)
+    assert finished == {DONE: 0, FAILED: 0}
+    assert [job.worker for job in queue.get_jobs(DONE)] == ["node-2"]
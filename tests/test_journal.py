@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from scraper import cassette
+from scraper import image_editor
+from scraper import journal
+from scraper import output_generation
+from scraper.cassette import RECORD, REPLAY, Cassette
+from scraper.image_editor import ImageProcessingError
+from scraper.store import upthere_store
+from tests.helpers import EXCHANGE_RATE_PAGE, load_page, make_response
+
+
+@pytest.fixture
+def replay_driver(tmp_path):
+    url = upthere_store.gen_store_sale_url("Needles")
+    exchange_rate_url = "https://rate.bot.com.tw/xrt?Lang=en-US"
+    page_source = load_page("upthere", "single_page.html")
+    cassette_path = os.path.join(str(tmp_path), "cassette.zip")
+
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    recording.record_response("HEAD", url, make_response(url, ""))
+    recording.record_response("GET", url, make_response(url, page_source))
+    recording.record_response(
+        "GET",
+        exchange_rate_url,
+        make_response(exchange_rate_url, EXCHANGE_RATE_PAGE),
+    )
+    recording.record_page_source(url, page_source)
+    recording.finalize()
+
+    replay = Cassette(REPLAY, cassette_path)
+    cassette.activate(replay)
+    yield cassette.ReplayDriver(replay)
+    cassette.activate(None)
+
+
+def test_entry_round_trip(tmp_path, monkeypatch):
+    url = "https://uptherestore.com/collections/sale/Needles"
+    root_dir = str(tmp_path)
+
+    entry = journal.open_entry(root_dir, url)
+    assert not entry.has_progress
+    entry.complete_page(2, 7)
+    entry.mark_rendered("/products/a", 8)
+
+    monkeypatch.delenv(journal.RESUME_ENV, raising=False)
+    assert not journal.open_entry(root_dir, url).has_progress
+
+    monkeypatch.setenv(journal.RESUME_ENV, "1")
+    entry = journal.open_entry(root_dir, url)
+    assert (entry.last_page, entry.product_count) == (2, 8)
+    assert entry.is_rendered("/products/a")
+    assert not entry.completed
+
+    journal.reset_journal(root_dir)
+    assert not journal.open_entry(root_dir, url).has_progress
+
+
+def test_resume_web_scraper(
+    tmp_path, monkeypatch, replay_driver, stub_image_pipeline
+):
+    url = upthere_store.gen_store_sale_url("Needles")
+    root_dir = str(tmp_path)
+    list_path = os.path.join(
+        root_dir, "output", "upthere", "Needles", "list.txt"
+    )
+
+    # Interrupted while rendering the images of the third product
+    renders = []
+
+    def failing_render(*args, **kwargs):
+        renders.append(args[0])
+        if len(renders) == 5:
+            raise ImageProcessingError("Renderer crashed")
+
+    monkeypatch.setattr(
+        image_editor, "ig_story_image_processing", failing_render
+    )
+    monkeypatch.delenv(journal.RESUME_ENV, raising=False)
+    assert not upthere_store.web_scraper(replay_driver, url, root_dir, "")
+    # The partial output stays in the staging directory
+    assert not os.path.exists(list_path)
+    staging_path = output_generation.get_staging_dir(os.path.dirname(list_path))
+    with open(os.path.join(staging_path, "list.txt"), encoding="utf-8") as file:
+        assert file.read().count("[ Product No.") == 2
+
+    monkeypatch.setattr(
+        image_editor, "ig_story_image_processing", lambda *args, **kwargs: None
+    )
+    monkeypatch.setenv(journal.RESUME_ENV, "1")
+    stub_image_pipeline.clear()
+    assert upthere_store.web_scraper(replay_driver, url, root_dir, "")
+    assert len(stub_image_pipeline) == 6
+
+    with open(list_path, encoding="utf-8") as file:
+        content = file.read()
+    assert content.count("[ Product No.") == 5
+    assert "[ Product No.005 ]" in content
+
+    # Finished sections are skipped
+    stub_image_pipeline.clear()
+    assert upthere_store.web_scraper(replay_driver, url, root_dir, "")
+    assert not stub_image_pipeline
@@ -0,0 +1,36 @@
+import csv
+import os
+import subprocess
+import sys
+
+from scraper import memory
+
+
+def test_sampler(tmp_path):
+    timeline_path = os.path.join(str(tmp_path), "memory.csv")
+    child = subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(30)"]
+    )
+    try:
+        sampler = memory.MemorySampler(
+            interval_sec=0.05, timeline_path=timeline_path
+        )
+        sampler.start()
+        sampler.sample()
+        sampler.stop()
+    finally:
+        child.kill()
+        child.wait()
+
+    main = sampler.processes[os.getpid()]
+    assert main.kind == memory.MAIN
+    assert main.samples >= 2
+    assert sampler.processes[child.pid].kind == memory.WORKER
+    assert sampler.tree_peak_rss >= main.peak_rss
+
+    with open(timeline_path, newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert {int(row["pid"]) for row in rows} >= {os.getpid(), child.pid}
+    assert all(int(row["rss"]) > 0 for row in rows)
+
+    sampler.display_report()
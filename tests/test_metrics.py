@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from scraper import metrics
+from scraper import perf
+from scraper.store import upthere_store
+from scraper.store.store_info import OutputInfo
+from tests.helpers import load_page
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    metrics_dir = os.path.join(str(tmp_path), "metrics")
+    monkeypatch.setenv(metrics.METRICS_DIR_ENV, metrics_dir)
+    yield metrics_dir
+    perf.set_scope("")
+    metrics._counters.clear()
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.delenv(metrics.METRICS_DIR_ENV, raising=False)
+    metrics.inc(metrics.PAGES)
+    assert not metrics._counters
+
+
+def test_format_textfile(metrics_dir):
+    perf.set_scope("supply", "tops")
+    metrics.inc(metrics.PAGES)
+    metrics.inc(metrics.PAGES)
+    metrics.inc(metrics.IMAGE_BYTES, 1024)
+    metrics.inc(metrics.RETRIES, operation="image_download")
+    metrics.inc(metrics.TASK_SECONDS, 1.5, store='a"b')
+    metrics.flush()
+
+    text = metrics.format_textfile(
+        metrics.load_counters(metrics_dir),
+        {"scraper_running": ("Whether a scraper run is in progress", True)},
+    )
+    assert text.splitlines() == [
+        "# HELP scraper_pages_total Listing pages processed",
+        "# TYPE scraper_pages_total counter",
+        'scraper_pages_total{store="supply"} 2',
+        "# HELP scraper_image_bytes_total "
+        "Bytes of the downloaded product images",
+        "# TYPE scraper_image_bytes_total counter",
+        'scraper_image_bytes_total{store="supply"} 1024',
+        "# HELP scraper_task_seconds_total Time spent scraping sections",
+        "# TYPE scraper_task_seconds_total counter",
+        'scraper_task_seconds_total{store="a\\"b"} 1.5',
+        "# HELP scraper_retries_total Retried operations",
+        "# TYPE scraper_retries_total counter",
+        'scraper_retries_total{operation="image_download",store="supply"} 1',
+        "# HELP scraper_running Whether a scraper run is in progress",
+        "# TYPE scraper_running gauge",
+        "scraper_running 1",
+    ]
+
+
+def test_snapshot_per_process(metrics_dir, monkeypatch):
+    metrics.inc(metrics.PAGES)
+    metrics.flush()
+
+    # A later pool worker which got the PID of the previous one
+    monkeypatch.setitem(metrics._state, "pid", -1)
+    metrics.inc(metrics.PAGES)
+    metrics.flush()
+
+    assert len(os.listdir(metrics_dir)) == 2
+    counters = metrics.load_counters(metrics_dir)
+    assert counters[(metrics.PAGES, (("store", "none"),))] == 2
+
+
+def test_exporter(tmp_path, metrics_dir, stub_image_pipeline):
+    textfile_path = os.path.join(str(tmp_path), "textfile", "scraper.prom")
+    exporter = metrics.MetricsExporter(metrics_dir, textfile_path)
+    exporter.start()
+    with open(textfile_path, encoding="utf-8") as file:
+        assert "scraper_running 1\n" in file.read()
+
+    output_info = OutputInfo(
+        store_name="upthere",
+        group="Needles",
+        output_dir=str(tmp_path),
+        font_path="",
+    )
+    perf.set_scope("upthere", "Needles")
+    upthere_store.product_info_processor(
+        load_page("upthere", "single_page.html"), output_info, 20.61
+    )
+    exporter.stop()
+
+    with open(textfile_path, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    assert 'scraper_pages_total{store="upthere"} 1' in lines
+    assert 'scraper_products_seen_total{store="upthere"} 13' in lines
+    assert 'scraper_products_accepted_total{store="upthere"} 5' in lines
+    assert "scraper_running 0" in lines
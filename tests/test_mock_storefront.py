@@ -0,0 +1,274 @@
+import os
+import socket
+import urllib.parse
+
+import pytest
+import requests
+
+from scraper import catalog
+from scraper import common
+from scraper import journal
+from scraper import mock_storefront
+from scraper.cassette import RECORD, REPLAY, Cassette, ReplayDriver
+from scraper.pricing import CETTIRE_PRICING
+from scraper.store import cettire_store
+from scraper.store import chemist_warehouse
+from scraper.store import supply_store
+from scraper.store import upthere_store
+from scraper.store.sorted_listing import SortedListing, sort_url
+from scraper.store.store_info import OutputInfo
+
+PRODUCT_COUNT = 100
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+font_path = os.path.join(
+    os.path.dirname(tests_path), "fonts", "SourceSerifPro-SemiBold.ttf"
+)
+
+
+@pytest.fixture
+def mock_store_url(monkeypatch):
+    server = mock_storefront.create_server(
+        port=0,
+        config=mock_storefront.StorefrontConfig(products=PRODUCT_COUNT),
+    )
+    mock_storefront.start_server_thread(server)
+    server_url = mock_storefront.get_server_url(server)
+    monkeypatch.setenv(common.MOCK_STORE_URL_ENV, server_url)
+    yield server_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_site_url(monkeypatch):
+    url = "https://www.cettire.com/tw/collections/sale/Loewe?page=2"
+    monkeypatch.delenv(common.MOCK_STORE_URL_ENV, raising=False)
+    assert common.get_site_url(url) == url
+
+    monkeypatch.setenv(common.MOCK_STORE_URL_ENV, "http://127.0.0.1:8000/")
+    assert common.get_site_url(url) == (
+        "http://127.0.0.1:8000/www.cettire.com/tw/collections/sale/Loewe?page=2"
+    )
+
+
+def test_exchange_rate(mock_store_url):
+    assert (
+        common.get_aud_exchange_rate() == mock_storefront.AUD_SPOT_SELLING_RATE
+    )
+
+
+def test_url_validity(mock_store_url):
+    assert common.check_url_validity(
+        upthere_store.gen_store_sale_url("Needles")
+    )
+    assert not common.check_url_validity(mock_store_url + "/unknown.com/")
+
+
+def test_pagination(mock_store_url):
+    upthere_url = upthere_store.gen_store_sale_url("Needles")
+    assert upthere_store.parse_total_pages(
+        common.get_static_html_content(upthere_url)
+    ) == -(-PRODUCT_COUNT // mock_storefront.UPTHERE_PAGE_SIZE)
+
+    supply_url = supply_store.gen_store_sale_url("tops")
+    assert (
+        supply_store.parse_max_page(common.get_static_html_content(supply_url))
+        == 3
+    )
+    assert supply_store.parse_max_page(
+        common.get_static_html_content(supply_url + "?p=3")
+    ) == -(-PRODUCT_COUNT // mock_storefront.SUPPLY_PAGE_SIZE)
+
+    cettire_url = cettire_store.gen_store_sale_url("Loewe")
+    assert cettire_store.is_next_button_active(
+        common.get_static_html_content(cettire_url)
+    )
+    assert not cettire_store.is_next_button_active(
+        common.get_static_html_content(cettire_url + "?page=3")
+    )
+
+
+@pytest.mark.parametrize(
+    "store_module, store_name, url, page_size",
+    [
+        (
+            upthere_store,
+            "upthere",
+            upthere_store.gen_store_sale_url("Needles") + "?page=2",
+            mock_storefront.UPTHERE_PAGE_SIZE,
+        ),
+        (
+            supply_store,
+            "supply",
+            supply_store.gen_store_sale_url("tops"),
+            mock_storefront.SUPPLY_PAGE_SIZE,
+        ),
+        (
+            cettire_store,
+            "cettire",
+            cettire_store.gen_store_sale_url("Loewe"),
+            mock_storefront.CETTIRE_PAGE_SIZE,
+        ),
+    ],
+)
+def test_product_info_processor(
+    tmp_path,
+    stub_image_pipeline,
+    mock_store_url,
+    store_module,
+    store_name,
+    url,
+    page_size,
+):
+    output_info = OutputInfo(
+        store_name=store_name,
+        group="sale",
+        output_dir=str(tmp_path),
+        font_path="",
+        catalog_path=os.path.join(str(tmp_path), "catalog.csv"),
+    )
+    catalog.reset_catalog(output_info.catalog_path)
+
+    page_source = common.get_static_html_content(common.get_site_url(url))
+    store_module.product_info_processor(page_source, output_info, 20.61)
+
+    assert len(catalog.load_catalog([output_info.catalog_path])) == page_size
+    for image_url in stub_image_pipeline:
+        assert image_url.startswith(mock_store_url)
+        assert requests.get(image_url).headers["Content-Type"] == "image/jpeg"
+
+
+def test_sorted_pagination(tmp_path, stub_image_pipeline, mock_store_url):
+    def crawl(url: str, listing: SortedListing | None) -> tuple[int, set]:
+        # Pagination of cettire_store.start_scraping without the browser
+        output_info = OutputInfo(
+            store_name="cettire",
+            group="Loewe",
+            output_dir=str(tmp_path),
+            font_path="",
+            catalog_path=os.path.join(str(tmp_path), "catalog.csv"),
+            sorted_listing=listing,
+        )
+        catalog.reset_catalog(output_info.catalog_path)
+        page = 1
+        while True:
+            page_url = url if page == 1 else f"{url}&page={page}"
+            page_source = common.get_static_html_content(page_url)
+            cettire_store.product_info_processor(page_source, output_info, 1)
+            if not cettire_store.is_next_button_active(page_source):
+                break
+            if output_info.can_stop_paginating:
+                break
+            page += 1
+
+        entries = catalog.load_catalog([output_info.catalog_path])
+        _, accepted = CETTIRE_PRICING.evaluate_batch(
+            entries.original_price, entries.sale_price, 1
+        )
+        return page, set(entries.product_url[accepted])
+
+    url = cettire_store.gen_store_sale_url("Loewe", "Bags")
+    full_pages, full_accepted = crawl(url, None)
+    # Walked to the end when the listing is not sorted
+    assert crawl(url, SortedListing(CETTIRE_PRICING, 1)) == (
+        full_pages,
+        full_accepted,
+    )
+
+    sorted_url = sort_url(url, cettire_store.PRICE_SORT_QUERY)
+    pages, accepted = crawl(sorted_url, SortedListing(CETTIRE_PRICING, 1))
+    assert pages < full_pages
+    assert accepted == full_accepted
+
+
+def test_web_scraper(tmp_path, monkeypatch, mock_store_url):
+    # A whole section, with the listing pages served to the scraper by a
+    # replay driver in place of Chrome, and the exchange rate, URL check and
+    # product images requested from the mock storefront
+    monkeypatch.delenv(journal.RESUME_ENV, raising=False)
+    url = upthere_store.gen_store_sale_url("Needles")
+    total_pages = upthere_store.parse_total_pages(
+        common.get_static_html_content(url)
+    )
+
+    cassette_path = os.path.join(str(tmp_path), "pages.zip")
+    recording = Cassette(RECORD, cassette_path)
+    recording.start()
+    for page in range(1, total_pages + 1):
+        page_url = url if page == 1 else url + f"?page={page}"
+        recording.record_page_source(
+            page_url, common.get_static_html_content(page_url)
+        )
+    recording.finalize()
+    driver = ReplayDriver(Cassette(REPLAY, cassette_path))
+
+    root_dir = str(tmp_path)
+    assert upthere_store.web_scraper(driver, url, root_dir, font_path)
+
+    catalog_path = catalog.get_catalog_path(root_dir, "upthere", "Needles")
+    assert len(catalog.load_catalog([catalog_path])) == PRODUCT_COUNT
+    output_dir = os.path.join(root_dir, "output", "upthere", "Needles")
+    files = os.listdir(output_dir)
+    assert "list.txt" in files
+    with open(os.path.join(output_dir, "list.txt"), encoding="utf-8") as file:
+        product_count = file.read().count("[ Product No.")
+    assert product_count > 0
+    assert sum(file.endswith(".jpg") for file in files) == product_count * 2
+
+
+def test_chemist_watch_list(tmp_path, mock_store_url, capsys):
+    watch_list_path = os.path.join(str(tmp_path), "watch_list.txt")
+    with open(watch_list_path, "w", encoding="utf-8") as file:
+        file.write(
+            "# Skin care\n"
+            "https://www.chemistwarehouse.com.au/buy/122444/night-cream-48g\n"
+            "\n"
+            "https://www.chemistwarehouse.com.au/buy/1/sunscreen\n"
+            "https://www.chemistwarehouse.com.au/unknown\n"
+        )
+
+    urls = chemist_warehouse.read_watch_list(watch_list_path)
+    assert len(urls) == 3 and all(
+        url.startswith(mock_store_url) for url in urls
+    )
+
+    results = chemist_warehouse.watch_products(
+        urls, mock_storefront.AUD_SPOT_SELLING_RATE
+    )
+    assert [result.product_name for result in results[:2]] == [
+        "Night Cream 48G",
+        "Sunscreen",
+    ]
+    assert results[0].price_aud == 19.99
+    assert results[0].price_twd == round(
+        19.99 * mock_storefront.AUD_SPOT_SELLING_RATE
+    )
+    assert results[0].is_profitable
+    assert results[2].error and not results[2].is_profitable
+
+    assert not chemist_warehouse.watch_list_scraper(watch_list_path)
+    output = capsys.readouterr().out
+    assert "Profitable: 2, not profitable: 0, failed: 1" in output
+
+
+def test_failure_injection(monkeypatch):
+    server = mock_storefront.create_server(
+        port=0, config=mock_storefront.StorefrontConfig(failure_rate=1)
+    )
+    mock_storefront.start_server_thread(server)
+    try:
+        url = mock_storefront.get_server_url(server) + "/rate.bot.com.tw/xrt"
+        assert requests.get(url).status_code == 503
+
+        # No body after the headers of a HEAD response
+        parts = urllib.parse.urlsplit(url)
+        with socket.create_connection((parts.hostname, parts.port)) as sock:
+            sock.sendall(f"HEAD {parts.path} HTTP/1.0\r\n\r\n".encode("ascii"))
+            response = b""
+            while data := sock.recv(4096):
+                response += data
+        assert response.startswith(b"HTTP/1.0 503")
+        assert response.endswith(b"\r\n\r\n")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from scraper import output_generation
+
+
+def join_cleanups(generation) -> None:
+    for thread in generation.cleanups:
+        thread.join()
+
+
+def write_file(folder_path: str, name: str) -> None:
+    with open(os.path.join(folder_path, name), "w", encoding="utf-8") as file:
+        file.write(name)
+
+
+@pytest.mark.parametrize("exchange", [True, False])
+def test_commit(tmp_path, monkeypatch, exchange):
+    if not exchange:
+        monkeypatch.setattr(
+            output_generation, "exchange_dirs", lambda *a: False
+        )
+    folder_path = os.path.join(str(tmp_path), "upthere", "Needles")
+
+    generation = output_generation.open_generation(folder_path)
+    write_file(generation.staging_path, "first.jpg")
+    assert not os.path.exists(folder_path)
+    generation.commit()
+    assert os.listdir(folder_path) == ["first.jpg"]
+
+    # The previous output is kept until the new generation is complete
+    generation = output_generation.open_generation(folder_path)
+    write_file(generation.staging_path, "second.jpg")
+    assert os.listdir(folder_path) == ["first.jpg"]
+    generation.commit()
+    join_cleanups(generation)
+    assert os.listdir(folder_path) == ["second.jpg"]
+    assert os.listdir(os.path.dirname(folder_path)) == ["Needles"]
+
+
+def test_open_generation(tmp_path):
+    folder_path = os.path.join(str(tmp_path), "Needles")
+
+    generation = output_generation.open_generation(folder_path)
+    write_file(generation.staging_path, "partial.jpg")
+    old_path = output_generation.get_old_dir(folder_path)
+    os.makedirs(old_path)
+
+    # Resuming continues the staging directory of the interrupted run
+    generation = output_generation.open_generation(
+        folder_path, keep_existing=True
+    )
+    assert os.listdir(generation.staging_path) == ["partial.jpg"]
+    join_cleanups(generation)
+    assert not os.path.exists(old_path)
+
+    generation = output_generation.open_generation(folder_path)
+    assert os.listdir(generation.staging_path) == []
+    join_cleanups(generation)
+    assert os.listdir(str(tmp_path)) == [".Needles.staging"]
+
+    with open(folder_path, "w", encoding="utf-8"):
+        pass
+    assert output_generation.open_generation(folder_path) is None
+
+
+@pytest.mark.parametrize("exchange", [True, False])
+def test_unfinished_deletes_are_swept(tmp_path, monkeypatch, exchange):
+    if not exchange:
+        monkeypatch.setattr(
+            output_generation, "exchange_dirs", lambda *a: False
+        )
+    folder_path = os.path.join(str(tmp_path), "Needles")
+    with monkeypatch.context() as patch:
+        # Killed before any of the old generations were deleted
+        patch.setattr(output_generation, "delete_in_background", lambda p: None)
+        for name in ["first.jpg", "second.jpg"]:
+            generation = output_generation.open_generation(folder_path)
+            write_file(generation.staging_path, name)
+            generation.commit()
+        output_generation.open_generation(folder_path)
+        output_generation.open_generation(folder_path)
+
+    leftovers = sorted(os.listdir(str(tmp_path)))
+    assert all(
+        entry.startswith(".Needles.old-")
+        for entry in leftovers
+        if entry not in ("Needles", ".Needles.staging")
+    )
+    assert len(leftovers) == 4
+
+    generation = output_generation.open_generation(folder_path)
+    join_cleanups(generation)
+    assert sorted(os.listdir(str(tmp_path))) == [".Needles.staging", "Needles"]
+    assert os.listdir(folder_path) == ["second.jpg"]
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+from scraper import perf
+from scraper.store import upthere_store
+from scraper.store.store_info import OutputInfo
+from tests.helpers import load_page
+
+
+@pytest.fixture
+def perf_dir(tmp_path, monkeypatch):
+    perf_dir = os.path.join(str(tmp_path), "perf")
+    monkeypatch.setenv(perf.PERF_DIR_ENV, perf_dir)
+    yield perf_dir
+    perf.set_scope("")
+    perf._records.clear()
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.delenv(perf.PERF_DIR_ENV, raising=False)
+    with perf.stage("navigate"):
+        pass
+    assert not perf._records
+
+
+def test_summarize(perf_dir):
+    perf.set_scope("supply", "tops")
+    for duration in (0.1, 0.2, 0.3, 0.4):
+        perf.record("navigate", 0, duration)
+
+    @perf.timed("parse")
+    def parse():
+        return 42
+
+    assert parse() == 42
+    perf.set_scope("supply", "bottoms")
+    with pytest.raises(ValueError):
+        with perf.stage("parse"):
+            raise ValueError
+    perf.flush()
+
+    records = perf.load_records(perf_dir)
+    assert len(records) == 6
+    assert {record.pid for record in records} == {os.getpid()}
+
+    summary = perf.summarize(records)
+    assert list(summary) == [
+        ("supply", "bottoms", "parse"),
+        ("supply", "tops", "navigate"),
+        ("supply", "tops", "parse"),
+    ]
+    navigate = summary[("supply", "tops", "navigate")]
+    assert navigate.count == 4
+    assert navigate.p50 == pytest.approx(0.25)
+    assert navigate.p95 == pytest.approx(0.385)
+    assert navigate.total == pytest.approx(1.0)
+
+
+def test_product_info_processor_stages(tmp_path, perf_dir, stub_image_pipeline):
+    output_info = OutputInfo(
+        store_name="upthere",
+        group="Needles",
+        output_dir=str(tmp_path),
+        font_path="",
+    )
+    perf.set_scope("upthere", "Needles")
+    upthere_store.product_info_processor(
+        load_page("upthere", "single_page.html"), output_info, 20.61
+    )
+    perf.flush()
+
+    summary = perf.summarize(perf.load_records(perf_dir))
+    assert summary[("upthere", "Needles", "process_page")].count == 1
+    assert summary[("upthere", "Needles", "parse")].count == 1
+    assert summary[("upthere", "Needles", "pricing")].count == 13
+
+
+def test_write_chrome_trace(tmp_path):
+    records = [
+        perf.StageRecord(100, "upthere", "Needles", "execute_scraper", 10, 2),
+        perf.StageRecord(100, "upthere", "Needles", "navigate", 10.5, 0.25),
+        perf.StageRecord(200, "upthere", "Nike", "execute_scraper", 11, 1),
+    ]
+    trace_path = os.path.join(str(tmp_path), "trace.json")
+    perf.write_chrome_trace(records, trace_path)
+
+    with open(trace_path, encoding="utf-8") as file:
+        events = json.load(file)["traceEvents"]
+
+    metadata = [event for event in events if event["ph"] == "M"]
+    assert [event["args"]["name"] for event in metadata] == [
+        "worker 100",
+        "worker 200",
+    ]
+
+    spans = [event for event in events if event["ph"] == "X"]
+    assert [
+        (span["pid"], span["name"], span["ts"], span["dur"]) for span in spans
+    ] == [
+        (100, "execute_scraper", 0, 2_000_000),
+        (100, "navigate", 500_000, 250_000),
+        (200, "execute_scraper", 1_000_000, 1_000_000),
+    ]
+    assert spans[2]["args"] == {
+        "store": "upthere",
+        "section": "Nike",
+        "heap_peak": 0,
+    }
+
+
+def test_heap_peak(perf_dir):
+    tracemalloc.start()
+    try:
+        with perf.stage("outer"):
+            with perf.stage("inner"):
+                inner_buffer = bytearray(4_000_000)
+            del inner_buffer
+            outer_buffer = bytearray(1_000_000)
+        del outer_buffer
+    finally:
+        tracemalloc.stop()
+
+    inner, outer = perf._records
+    assert inner.stage == "inner"
+    assert 4_000_000 <= inner.heap_peak < 5_000_000
+    assert outer.heap_peak >= inner.heap_peak
+
+
+def test_stages_of_other_threads(perf_dir):
+    perf.set_scope("chemist")
+
+    def fetch(scope):
+        if scope:
+            perf.set_scope(*scope)
+        with perf.stage("fetch_static"):
+            pass
+
+    tracemalloc.start()
+    try:
+        with perf.stage("watch_products"):
+            threads = [
+                threading.Thread(target=fetch, args=(scope,))
+                for scope in [None, ("upthere", "Needles")]
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert perf._heap_peaks == [0]
+    finally:
+        tracemalloc.stop()
+
+    assert sorted(
+        (record.store, record.section, record.heap_peak)
+        for record in perf._records[:2]
+    ) == [("chemist", "", 0), ("upthere", "Needles", 0)]
+    assert perf._records[2].heap_peak > 0
+    assert perf.get_scope() == ("chemist", "")
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from scraper import price_history
+from scraper.price_history import PriceHistory, PriceRecord
+from scraper.store import upthere_store
+from scraper.store.store_info import OutputInfo
+from tests.helpers import load_page
+
+URL = "https://uptherestore.com/products/needles-track-pant"
+
+
+def make_record(product_url: str, sale_price: int) -> PriceRecord:
+    return PriceRecord(
+        "upthere", "Needles", product_url, 400, sale_price, 0, 0, 20.61
+    )
+
+
+@pytest.fixture
+def history(tmp_path):
+    with PriceHistory(os.path.join(str(tmp_path), "history.sqlite")) as history:
+        yield history
+
+
+def test_history_queries(history):
+    other_url = URL + "-black"
+    for sale_prices in [(300, 250), (280, 250), (290, 200)]:
+        run_id = history.start_run()
+        history.append(
+            run_id,
+            [
+                make_record(URL, sale_prices[0]),
+                make_record(other_url, sale_prices[1]),
+            ],
+        )
+    # Seen again in the same run
+    history.append(run_id, [make_record(URL, 100)])
+
+    assert [point.sale_price for point in history.get_history(URL)] == [
+        300,
+        280,
+        290,
+    ]
+    assert history.get_lowest_price(URL).run_id == 2
+    assert history.get_lowest_price(URL + "-red") is None
+
+    drops = history.get_price_drops()
+    assert [(drop.product_url, drop.previous_price) for drop in drops] == [
+        (other_url, 250)
+    ]
+    assert drops[0].drop_percentage == pytest.approx(20)
+    assert [drop.sale_price for drop in history.get_price_drops(2)] == [280]
+    assert not history.get_price_drops(2, store="supply")
+
+
+def test_record_prices(tmp_path, monkeypatch, stub_image_pipeline):
+    history_path = price_history.get_history_path(str(tmp_path))
+    output_info = OutputInfo(
+        store_name="upthere",
+        group="Needles",
+        output_dir=str(tmp_path),
+        font_path="",
+        price_history_path=history_path,
+    )
+    page_source = load_page("upthere", "single_page.html")
+
+    # Not recorded outside of a run
+    monkeypatch.delenv(price_history.RUN_ID_ENV, raising=False)
+    upthere_store.product_info_processor(page_source, output_info, 20.61)
+    assert not os.path.exists(history_path)
+
+    with PriceHistory(history_path) as history:
+        run_id = history.start_run()
+    monkeypatch.setenv(price_history.RUN_ID_ENV, str(run_id))
+    upthere_store.product_info_processor(page_source, output_info, 20.61)
+
+    with PriceHistory(history_path) as history:
+        rows = history._connect().execute(
+            "SELECT COUNT(*), COUNT(selling_price) FROM prices"
+        )
+        # Every product on sale, profitable or not
+        assert rows.fetchone() == (13, 5)
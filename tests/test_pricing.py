@@ -0,0 +1,125 @@
+import attr
+import numpy as np
+import pytest
+
+from scraper import catalog
+from scraper import common
+from scraper import pricing
+from scraper import pricing_sweep
+
+
+def random_catalog(size: int, seed: int = 0) -> catalog.Catalog:
+    rng = np.random.default_rng(seed)
+    original_prices = rng.integers(50, 3000, size)
+    sale_prices = np.rint(original_prices * rng.uniform(0.3, 1.0, size))
+    return catalog.Catalog(
+        store=np.full(size, "upthere"),
+        section=np.full(size, "sale"),
+        product_url=np.array([f"/products/{i}" for i in range(size)]),
+        original_price=original_prices,
+        sale_price=sale_prices.astype(np.int64),
+        exchange_rate=rng.uniform(19.0, 22.0, size),
+    )
+
+
+def test_upthere_pricing():
+    exchange_rate = 20.5
+    original_price, sale_price = 450, 225
+    result = pricing.UPTHERE_PRICING.evaluate(
+        original_price, sale_price, exchange_rate
+    )
+
+    aud_to_twd = exchange_rate * 1.03
+    expected_original_price = round(original_price * aud_to_twd)
+    expected_sale_price = round(sale_price * aud_to_twd)
+    expected_cost = round(((expected_sale_price / 1.1) + 850) * 1.16)
+
+    assert result.original_price == expected_original_price
+    assert result.sale_price == expected_sale_price
+    assert result.cost == expected_cost
+    assert (
+        result.selling_price,
+        result.profit,
+        result.profit_margin,
+    ) == common.calculate_profit_margin(
+        expected_cost, expected_original_price, 0.11, True
+    )
+    assert result.is_profitable
+
+
+@pytest.mark.parametrize("sale_price, shipping_fee", [(6999, 700), (7000, 0)])
+def test_cettire_free_shipping(sale_price, shipping_fee):
+    result = pricing.CETTIRE_PRICING.evaluate(20000, sale_price, 1)
+    assert result.cost == sale_price + shipping_fee
+
+
+def test_max_profit_bound():
+    params = pricing.CETTIRE_PRICING
+    sale_prices = np.arange(1000, 12000, 7)
+    profits, _ = params.evaluate_batch(sale_prices * 3, sale_prices, 1)
+    # The best profit at or below every sale price
+    best_profits = np.maximum.accumulate(profits)
+    bounds = [params.max_profit_bound(int(price), 1) for price in sale_prices]
+    assert np.all(best_profits <= bounds)
+    assert np.all(np.array(bounds) - best_profits < 40)
+
+    # Grows with the original price
+    assert pricing.UPTHERE_PRICING.max_profit_bound(100, 20.5) is None
+
+
+@pytest.mark.parametrize("store_name", list(pricing.STORE_PRICING))
+def test_evaluate_batch(store_name):
+    params = pricing.STORE_PRICING[store_name]
+    products = random_catalog(3000)
+
+    profits, accepted = params.evaluate_batch(
+        products.original_price, products.sale_price, products.exchange_rate
+    )
+
+    for index in range(len(products)):
+        result = params.evaluate(
+            int(products.original_price[index]),
+            int(products.sale_price[index]),
+            float(products.exchange_rate[index]),
+        )
+        assert accepted[index] == result.is_profitable
+        if result.is_profitable:
+            assert profits[index] == result.profit
+
+
+def test_sweep():
+    products = random_catalog(500)
+    base_params = pricing.UPTHERE_PRICING
+    grid = {"profit_rate": [0.05, 0.11], "shipping_fee": [700, 850, 1000]}
+
+    result = pricing_sweep.sweep(products, base_params, grid)
+    assert len(result) == 6
+
+    for index in range(len(result)):
+        params = attr.evolve(base_params, **result.setting(index))
+        profits, accepted = params.evaluate_batch(
+            products.original_price,
+            products.sale_price,
+            products.exchange_rate,
+        )
+        assert result.accepted_count[index] == accepted.sum()
+        assert result.total_profit[index] == profits[accepted].sum()
+
+
+def test_catalog_round_trip(tmp_path):
+    catalog_path = catalog.get_catalog_path(str(tmp_path), "supply", "tops")
+    catalog.reset_catalog(catalog_path)
+    catalog.append_catalog_entries(
+        catalog_path,
+        [
+            catalog.CatalogEntry("supply", "tops", "/a", 300, 150, 20.61),
+            catalog.CatalogEntry("supply", "tops", "/b", 99, 99, 20.61),
+        ],
+    )
+
+    products = catalog.load_catalog([str(tmp_path)])
+    assert products.product_url.tolist() == ["/a", "/b"]
+    assert products.original_price.tolist() == [300, 99]
+    assert products.sale_price.tolist() == [150, 99]
+    assert products.exchange_rate.tolist() == [20.61, 20.61]
+    assert len(products.filter_store("upthere")) == 0
@@ -0,0 +1,60 @@
+import email.utils
+import os
+import time
+
+import pytest
+
+from scraper import rate_limiter
+from scraper.rate_limiter import RateLimiter, RateLimitPolicy
+
+HOST = "uptherestore.com"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return os.path.join(str(tmp_path), "rate_limiter.sqlite")
+
+
+def test_parse_retry_after():
+    now = time.time()
+    assert rate_limiter.parse_retry_after("120", now) == 120
+    assert rate_limiter.parse_retry_after(None, now) is None
+    assert rate_limiter.parse_retry_after("soon", now) is None
+
+    http_date = email.utils.formatdate(now + 30, usegmt=True)
+    assert 28 <= rate_limiter.parse_retry_after(http_date, now) <= 30
+
+
+def test_pacing(db_path):
+    limiter = RateLimiter(db_path, RateLimitPolicy(initial_rate=20, burst=1))
+    start_time = time.perf_counter()
+    for _ in range(5):
+        limiter.acquire(HOST)
+    assert time.perf_counter() - start_time >= 0.18
+
+
+def test_adapt_rate(db_path, monkeypatch):
+    policy = RateLimitPolicy(initial_rate=2, increase=0.5)
+    limiter = RateLimiter(db_path, policy)
+
+    assert limiter.report(HOST, 0.1, 200) == 2.5
+    assert limiter.report(HOST, 0.1, 429, "60") == 1.25
+
+    # Shared with the other processes, blocked for the Retry-After delay
+    other = RateLimiter(db_path, policy)
+    assert other.rates() == {HOST: 1.25}
+
+    clock = [time.time()]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: clock[0])
+    monkeypatch.setattr(
+        rate_limiter.time,
+        "sleep",
+        lambda seconds: clock.__setitem__(0, clock[0] + seconds),
+    )
+    assert 59 <= other.acquire(HOST) <= 60
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.delenv(rate_limiter.RATE_LIMIT_DB_ENV, raising=False)
+    assert rate_limiter.get_rate_limiter() is None
+    rate_limiter.acquire(f"https://{HOST}/collections/sale")
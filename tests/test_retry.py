@@ -0,0 +1,129 @@
+import pytest
+import requests
+from selenium.common.exceptions import TimeoutException
+
+from scraper import retry
+from scraper.chrome_driver import WebDriverAction
+from tests.helpers import make_response
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry.time, "sleep", delays.append)
+    retry.reset()
+    yield delays
+    retry.reset()
+
+
+def failing(errors):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return len(calls)
+
+    return func
+
+
+def http_error(status_code):
+    url = "https://uptherestore.com/image.jpg"
+    return requests.exceptions.HTTPError(
+        response=make_response(url, "", status_code)
+    )
+
+
+def test_backoff_delay():
+    policy = retry.RetryPolicy(base_delay_sec=1, max_delay_sec=5)
+    for attempt, ceiling in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+        delays = [policy.get_delay(attempt) for _ in range(50)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+def test_retry_transient_errors(no_sleep):
+    errors = [http_error(503), requests.exceptions.ConnectionError()]
+    assert retry.call(retry.IMAGE_DOWNLOAD, failing(errors)) == 3
+    assert len(no_sleep) == 2
+
+    # Client errors are not retried
+    with pytest.raises(requests.exceptions.HTTPError):
+        retry.call(retry.IMAGE_DOWNLOAD, failing([http_error(404)]))
+    assert len(no_sleep) == 2
+
+    errors = [TimeoutException()] * 3
+    with pytest.raises(TimeoutException):
+        retry.call(retry.PAGE_LOAD, failing(errors))
+    assert len(no_sleep) == 4
+
+
+def test_retry_budget(monkeypatch):
+    monkeypatch.setitem(
+        retry.POLICIES,
+        retry.STATIC_FETCH,
+        retry.RetryPolicy(
+            max_attempts=10,
+            budget_min_retries=2,
+            budget_ratio=0,
+            failure_threshold=100,
+        ),
+    )
+    errors = [ValueError()] * 5
+    with pytest.raises(ValueError):
+        retry.call(retry.STATIC_FETCH, failing(errors))
+    assert retry.get_budget(retry.STATIC_FETCH).retries == 2
+
+
+def test_circuit_breaker():
+    breaker = retry.get_breaker(retry.PAGE_LOAD, "uptherestore.com")
+    # A page out of retries does not open it before the others are tried
+    for _ in range(breaker.failure_threshold):
+        assert not breaker.is_open
+        errors = [TimeoutException()] * 3
+        with pytest.raises(TimeoutException):
+            retry.call(retry.PAGE_LOAD, failing(errors), key="uptherestore.com")
+        assert not errors
+    # Opens after the fifth failed call in a row
+    assert breaker.is_open
+
+    with pytest.raises(retry.CircuitOpenError):
+        retry.call(retry.PAGE_LOAD, failing([]), key="uptherestore.com")
+    # Other hosts are not affected
+    assert retry.call(retry.PAGE_LOAD, failing([]), key="supplystore.com.au")
+
+    breaker.opened_at -= breaker.reset_timeout_sec
+    assert retry.call(retry.PAGE_LOAD, failing([]), key="uptherestore.com")
+    assert not breaker.is_open and not breaker.failures
+
+
+def test_permanent_errors_keep_circuit_closed():
+    breaker = retry.get_breaker(retry.IMAGE_DOWNLOAD, "uptherestore.com")
+    for _ in range(breaker.failure_threshold + 1):
+        with pytest.raises(requests.exceptions.HTTPError):
+            retry.call(
+                retry.IMAGE_DOWNLOAD,
+                failing([http_error(404)]),
+                key="uptherestore.com",
+            )
+    assert not breaker.is_open and not breaker.failures
+    assert retry.call(retry.IMAGE_DOWNLOAD, failing([]), key="uptherestore.com")
+
+
+def test_load_page_retries_single_page():
+    class Driver:
+        visited = []
+
+        def get(self, url):
+            self.visited.append(url)
+
+    waits = [TimeoutException()]
+
+    def wait_for_page_load(driver):
+        if waits:
+            raise waits.pop(0)
+
+    url = "https://uptherestore.com/collections/sale/Needles?page=2"
+    WebDriverAction.load_page(Driver(), url, wait_for_page_load)
+    assert Driver.visited == [url, url]
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from scraper import catalog
+from scraper import revisit
+from scraper.revisit import DAY_SEC, RevisitScheduler
+from scraper.store.store_info import OutputInfo
+
+URL = "https://uptherestore.com/collections/sale/"
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    with RevisitScheduler(os.path.join(str(tmp_path), "revisit.sqlite")) as s:
+        yield s
+
+
+def test_observe(scheduler):
+    url = URL + "Needles"
+    visit = scheduler.observe("upthere", url, {"a": 100, "b": 200}, now=0)
+    assert (visit.new_products, visit.changed) == (2, True)
+    assert scheduler.get_stats(url).change_rate is None
+
+    visit = scheduler.observe("upthere", url, {"a": 100, "b": 200}, now=DAY_SEC)
+    assert visit.unchanged and not visit.changed
+
+    visit = scheduler.observe(
+        "upthere", url, {"a": 90, "c": 300}, now=DAY_SEC * 2
+    )
+    assert (visit.new_products, visit.price_changes) == (1, 1)
+    assert visit.removed_products == 1
+    assert not visit.unchanged
+
+    stats = scheduler.get_stats(url)
+    assert stats.visits == pytest.approx(1.9)
+    assert stats.changes == pytest.approx(1)
+    assert 0 < stats.change_rate < 2
+
+
+def test_plan(scheduler):
+    hot_url, stale_url, new_url = URL + "Nike", URL + "Viberg", URL + "Satta"
+    for day in range(10):
+        now = day * DAY_SEC
+        scheduler.observe("upthere", hot_url, {"a": 100 - day}, now=now)
+        scheduler.observe("upthere", stale_url, {"a": 100}, now=now)
+
+    now = 10 * DAY_SEC
+    due_urls = scheduler.plan(
+        {"upthere": [hot_url, stale_url, new_url]}, 3, now=now
+    )
+    assert due_urls == {"upthere": [hot_url, new_url]}
+
+    hot = scheduler.get_stats(hot_url)
+    stale = scheduler.get_stats(stale_url)
+    assert hot.interval < DAY_SEC < stale.interval
+    assert hot.interval >= revisit.MIN_INTERVAL_SEC
+    assert stale.interval <= revisit.MAX_INTERVAL_SEC
+    # Within the budget of page visits per day
+    intervals = revisit.assign_intervals({"a": 5, "b": 0.1, "c": 1}, 3)
+    assert sum(DAY_SEC / interval for interval in intervals.values()) <= 3.001
+
+
+def test_record_visit(tmp_path, monkeypatch):
+    catalog_path = catalog.get_catalog_path(str(tmp_path), "upthere", "Nike")
+    catalog.reset_catalog(catalog_path)
+    catalog.append_catalog_entries(
+        catalog_path,
+        [catalog.CatalogEntry("upthere", "Nike", "a", 200, 150, 20.61)],
+    )
+    output_info = OutputInfo(
+        store_name="upthere",
+        group="Nike",
+        output_dir=str(tmp_path),
+        font_path="",
+        catalog_path=catalog_path,
+    )
+    schedule_path = revisit.get_schedule_path(str(tmp_path))
+
+    # Not recorded without a schedule
+    monkeypatch.delenv(revisit.REVISIT_DB_ENV, raising=False)
+    output_info.record_visit(URL + "Nike")
+    assert not os.path.exists(schedule_path)
+
+    monkeypatch.setenv(revisit.REVISIT_DB_ENV, schedule_path)
+    output_info.record_visit(URL + "Nike")
+    with RevisitScheduler(schedule_path) as scheduler:
+        assert scheduler.get_stats(URL + "Nike").store == "upthere"
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper import catalog
+from scraper.store import cettire_store
+from scraper.store import supply_store
+from scraper.store import upthere_store
+from scraper.store.product_extractor import walk_product
+from scraper.store.store_info import OutputInfo
+from tests.helpers import load_page
+
+AUD_EXCHANGE_RATE = 20.61
+
+
+@pytest.mark.parametrize(
+    "store_module, store_name, page_name, exchange_rate, "
+    "expected_products, expected_catalog_size",
+    [
+        (upthere_store, "upthere", "listing.html", AUD_EXCHANGE_RATE, 22, 41),
+        (
+            upthere_store,
+            "upthere",
+            "single_page.html",
+            AUD_EXCHANGE_RATE,
+            5,
+            13,
+        ),
+        (supply_store, "supply", "listing.html", AUD_EXCHANGE_RATE, 12, 36),
+        (supply_store, "supply", "last_page.html", AUD_EXCHANGE_RATE, 1, 11),
+        (cettire_store, "cettire", "listing.html", 1, 42, 48),
+        (cettire_store, "cettire", "last_page.html", 1, 22, 23),
+    ],
+)
+def test_product_info_processor(
+    tmp_path,
+    stub_image_pipeline,
+    store_module,
+    store_name,
+    page_name,
+    exchange_rate,
+    expected_products,
+    expected_catalog_size,
+):
+    output_info = OutputInfo(
+        store_name=store_name,
+        group="sale",
+        output_dir=str(tmp_path),
+        font_path="",
+        catalog_path=os.path.join(str(tmp_path), "catalog.csv"),
+    )
+    catalog.reset_catalog(output_info.catalog_path)
+
+    store_module.product_info_processor(
+        load_page(store_name, page_name), output_info, exchange_rate
+    )
+
+    assert output_info.product_count == expected_products
+    assert len(stub_image_pipeline) >= expected_products
+    assert (
+        len(catalog.load_catalog([output_info.catalog_path]))
+        == expected_catalog_size
+    )
+
+    with open(os.path.join(str(tmp_path), "list.txt"), encoding="utf-8") as f:
+        assert f.read().count("[ Product No.") == expected_products
+
+
+@pytest.mark.parametrize(
+    "page_name, expected_pages", [("listing.html", 5), ("single_page.html", 1)]
+)
+def test_upthere_parse_total_pages(page_name, expected_pages):
+    html_content = load_page("upthere", page_name)
+    assert upthere_store.parse_total_pages(html_content) == expected_pages
+
+
+@pytest.mark.parametrize(
+    "page_name, expected_pages", [("listing.html", 3), ("last_page.html", 6)]
+)
+def test_supply_parse_max_page(page_name, expected_pages):
+    page_source = load_page("supply", page_name)
+    assert supply_store.parse_max_page(page_source) == expected_pages
+
+
+@pytest.mark.parametrize(
+    "page_name, expected_result",
+    [("listing.html", True), ("last_page.html", False)],
+)
+def test_cettire_is_next_button_active(page_name, expected_result):
+    page_source = load_page("cettire", page_name)
+    assert cettire_store.is_next_button_active(page_source) == expected_result
+
+
+def test_walk_product():
+    soup = BeautifulSoup(
+        '<form><a class="product-item-link x" href="/tee">Tee</a>'
+        '<div><span class="price-label">Regular Price</span>'
+        '<span class="price">$120.00</span></div>'
+        '<span class="price-label">As low as</span>'
+        '<span><span class="price">$1,080.50</span></span></form>',
+        "html.parser",
+    )
+    node = walk_product(soup.form, supply_store.PRODUCT_ELEMENTS | {("a", "")})
+
+    assert node.first("a", "product-item-link")["href"] == "/tee"
+    assert node.first("a", "") is node.first("a", "product-item-link")
+    assert len(node.all("span", "price")) == 2
+    assert node.first("img", "object-contain") is None
+    assert supply_store.parse_product_prices(node) == ("$1,080.50", "$120.00")